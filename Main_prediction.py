@@ -1,67 +1,156 @@
+import tempfile
+import time
+
 import streamlit as st
-import pandas as pd
-import joblib
+
+from churn import instrument, model_store, startup
+from churn.features import INPUT_RANGES, RAW_FEATURE_COLUMNS, build_input_frame, churn_labels
+from churn.paths import MODEL_PATH
+
+# Heavy imports (pandas, plotly, the explanation / what-if / batch code) happen where a feature first needs them.
 
 # ========== PAGE CONFIG ==========
 st.set_page_config(page_title="Telecom Churn Prediction", layout="wide")
 st.title(" TELECOM CUSTOMER CHURN PREDICTION APP")
+instrument.start_run("prediction")
+# Opens the model, imports the figure code and loads the shared dataset in a background thread once the
+# form is drawn, while it is filled in (in the foreground, before the form, with CHURN_STARTUP=eager)
+startup.warm_up(MODEL_PATH)
+
 
-MODEL_PATH = "model/Telecome_Churn_Prediction.joblib"
+def load_forest():
+    # Cached per process; the compiled forest is memory-mapped and shared between replicas.
+    # Waits for the warm-up thread if it is still opening the model.
+    with instrument.timed("model_load"):
+        return model_store.load_forest(MODEL_PATH)
 
-# Load trained model
-model = joblib.load(MODEL_PATH)
 
 st.markdown("Use this page to predict whether a telecom customer will **churn or stay** based on their details.")
 
 # ========== INPUT SECTION ==========
 col1, col2 = st.columns(2)
 with col1:
-    international_plan = st.selectbox("International Plan", ["No", "Yes"])
-    voice_mail_plan = st.selectbox("Voice Mail Plan", ["No", "Yes"])
-    account_length = st.slider("Account Length", 1, 243, 120)
-    number_vmail_messages = st.slider("Number of Voice Mail Messages", 0, 51, 10)
+    international_plan = st.selectbox("International Plan", INPUT_RANGES["International_plan"])
+    voice_mail_plan = st.selectbox("Voice Mail Plan", INPUT_RANGES["Voice_mail_plan"])
+    account_length = st.slider("Account Length", *INPUT_RANGES["Account_length"], 120)
+    number_vmail_messages = st.slider("Number of Voice Mail Messages", *INPUT_RANGES["Number_vmail_messages"], 10)
 with col2:
-    total_day_charge = st.slider("Total Day Charge", 0.0, 59.64, 30.56)
-    total_eve_charge = st.slider("Total Evening Charge", 0.0, 30.91, 17.08)
-    total_night_charge = st.slider("Total Night Charge", 1.04, 17.77, 9.04)
-    total_intl_minutes = st.slider("Total International Minutes", 0.0, 20.0, 10.0)
-    total_intl_calls = st.slider("Total International Calls", 0, 20, 4)
-    total_intl_charge = st.slider("Total International Charge", 0.0, 5.4, 2.76)
+    total_day_charge = st.slider("Total Day Charge", *INPUT_RANGES["Total_day_charge"], 30.56)
+    total_eve_charge = st.slider("Total Evening Charge", *INPUT_RANGES["Total_eve_charge"], 17.08)
+    total_night_charge = st.slider("Total Night Charge", *INPUT_RANGES["Total_night_charge"], 9.04)
+    total_intl_minutes = st.slider("Total International Minutes", *INPUT_RANGES["Total_intl_minutes"], 10.0)
+    total_intl_calls = st.slider("Total International Calls", *INPUT_RANGES["Total_intl_calls"], 4)
+    total_intl_charge = st.slider("Total International Charge", *INPUT_RANGES["Total_intl_charge"], 2.76)
 
-Total_charge = total_day_charge + total_eve_charge + total_night_charge
-st.metric("Total Charge (Auto Calculated)", f"{Total_charge:.2f}")
-
-customer_service_calls = st.slider("Customer Service Calls", 0, 9, 1)
+customer_service_calls = st.slider("Customer Service Calls", *INPUT_RANGES["Customer_service_calls"], 1)
 high_service_calls = int(customer_service_calls > 3)
 if high_service_calls:
     st.error("🚨 High number of service calls")
 else:
     st.success("✅ Normal number of service calls")
+startup.mark_first_paint()
 
 # ========== PREPARE INPUT DATA ==========
-input_data = pd.DataFrame([{
-    'Account_length': account_length,
-    'International_plan': international_plan,
-    'Voice_mail_plan': voice_mail_plan,
-    'Number_vmail_messages': number_vmail_messages,
-    'Total_day_charge': total_day_charge,
-    'Total_eve_charge': total_eve_charge,
-    'Total_night_charge': total_night_charge,
-    'Total_intl_minutes': total_intl_minutes,
-    'Total_intl_calls': total_intl_calls,
-    'Total_intl_charge': total_intl_charge,
-    'Customer_service_calls': customer_service_calls,
-    'High_service_calls': high_service_calls,
-    'Total_charge': Total_charge,
-}])
+with instrument.timed("input_frame"):
+    input_data = build_input_frame(
+        Account_length=account_length,
+        International_plan=international_plan,
+        Voice_mail_plan=voice_mail_plan,
+        Number_vmail_messages=number_vmail_messages,
+        Total_day_charge=total_day_charge,
+        Total_eve_charge=total_eve_charge,
+        Total_night_charge=total_night_charge,
+        Total_intl_minutes=total_intl_minutes,
+        Total_intl_calls=total_intl_calls,
+        Total_intl_charge=total_intl_charge,
+        Customer_service_calls=customer_service_calls,
+    )
+st.metric("Total Charge (Auto Calculated)", f"{input_data['Total_charge'].iloc[0]:.2f}")
 
 # ========== PREDICTION ==========
 if st.button("Predict Churn of Coustomer"):
-    prediction = model.predict(input_data)[0]
-    proba = model.predict_proba(input_data)[0][1]
+    from churn.explain import contribution_figure, explain_frame
+
+    forest = load_forest()
+    start = time.perf_counter()
+    with instrument.timed("predict_proba"):
+        proba = forest.predict_proba_frame(input_data)
+    from churn import drift, registry
+
+    drift.observe(input_data, proba[:, 1])  # queued for the drift monitor; binned in the background
+    # Challenger versions score the same row on background threads; only the champion's answer is shown
+    registry.shadow(input_data, proba, time.perf_counter() - start, "prediction")
+    from churn.thresholds import load_threshold
+
+    threshold = load_threshold(MODEL_PATH)  # tuned on the Threshold Tuning page; None -> 0.5
+    prediction = churn_labels(proba, threshold)[0]
+    proba = proba[0, 1]
 
     st.subheader("Prediction Result:")
     if prediction == 1:
         st.error(f"🔻 This customer is **likely to CHURN** with probability {proba:.2%}")
     else:
         st.success(f"🟢 This customer is **likely to STAY** with probability {proba:.2%}")
+    if threshold is not None:
+        st.caption(f"Flagged as churn from a probability of {threshold:.2%} (tuned operating point).")
+    startup.mark_first_prediction()
+
+    # Exact breakdown of this probability over the 13 inputs, from every tree's decision path
+    st.markdown("**Why this prediction?** Red bars push towards churn, green bars towards staying.")
+    with instrument.timed("explain"):
+        bias, contrib = explain_frame(forest, input_data)
+    with instrument.timed("figure_explain"):
+        st.plotly_chart(contribution_figure(bias, contrib.iloc[0], input_data.iloc[0]), use_container_width=True)
+
+# ========== WHAT-IF ANALYSIS ==========
+st.markdown("---")
+st.subheader("What-if Analysis")
+if st.toggle("What-if mode"):
+    st.markdown("See how this customer's churn probability would change if one or two inputs were different; every other input keeps the value set above.")
+    sweep_features = st.multiselect(
+        "Inputs to vary (one for a response curve, two for a heatmap)",
+        RAW_FEATURE_COLUMNS,
+        default=["Customer_service_calls"],
+        max_selections=2,
+        format_func=lambda c: c.replace("_", " "),
+    )
+    if sweep_features:
+        from churn.whatif import heatmap_figure, response_figure, sweep
+
+        forest = load_forest()
+        # The whole counterfactual grid is scored in one batched predict_proba call
+        with instrument.timed("whatif_sweep"):
+            result = sweep(forest, input_data, sweep_features)
+        current = input_data.iloc[0]
+        with instrument.timed("figure_whatif"):
+            if len(sweep_features) == 1:
+                fig = response_figure(result, sweep_features[0], current[sweep_features[0]])
+            else:
+                fig = heatmap_figure(result, *sweep_features, current)
+            st.plotly_chart(fig, use_container_width=True)
+
+# ========== BATCH SCORING ==========
+st.markdown("---")
+st.subheader("Batch Scoring")
+st.markdown("Upload a raw export (same columns as `churn-bigml-*.csv`) to score every customer at once.")
+
+uploaded = st.file_uploader("Customer file", type=["csv", "parquet"])
+explain = st.checkbox("Add per-input contribution columns")
+if uploaded is not None and st.button("Score File"):
+    from churn.batch import DEFAULT_CHUNKSIZE, score_file
+    from churn.thresholds import load_threshold
+
+    fmt = "parquet" if uploaded.name.endswith(".parquet") else "csv"
+    with tempfile.NamedTemporaryFile(suffix=".csv") as out:
+        with instrument.timed("pipeline_load"):
+            model = model_store.load_model(MODEL_PATH)
+        with instrument.timed("batch_score"):
+            stats = score_file(model, uploaded, out.name, chunksize=DEFAULT_CHUNKSIZE, in_fmt=fmt, out_fmt="csv",
+                               explainer=load_forest() if explain else None, monitor_drift=True, shadow=True,
+                               threshold=load_threshold(MODEL_PATH))
+        st.success(f"Scored {stats.rows:,} customers in {stats.seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/sec)")
+        with open(out.name, "rb") as f:
+            st.download_button("📥 Download Scores (CSV)", data=f.read(), file_name="churn_scores.csv")
+
+# ========== PERFORMANCE PANEL ==========
+instrument.sidebar_panel()
@@ -0,0 +1 @@
+"""Shared helpers for the Telecom Churn app (scoring, data access, analysis)."""
@@ -0,0 +1,184 @@
+"""Chunked batch scoring for bigml-style subscriber exports.
+
+Reads CSV or Parquet in fixed-size chunks, derives the engineered features with
+column arithmetic, runs one ``predict_proba`` per chunk and appends the scores to
+the output file, so memory stays bounded by ``chunksize`` whatever the input size.
+
+    python -m churn.batch data/churn-bigml-20.csv scored.csv --chunksize 100000
+    python -m churn.batch data/churn-bigml-20.csv scored.csv --shadow   # log challenger scores too
+"""
+import argparse
+import gzip
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from churn import model_store
+from churn.explain import contribution_columns
+from churn.features import churn_labels, to_model_frame
+from churn.paths import MODEL_PATH
+from churn.thresholds import load_threshold
+
+DEFAULT_CHUNKSIZE = 100_000
+PROBA_COLUMN = "Churn_probability"
+LABEL_COLUMN = "Churn_prediction"
+
+
+@dataclass
+class BatchStats:
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def _file_format(source, fmt):
+    if fmt:
+        return fmt
+    name = str(getattr(source, "name", source))
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    return "csv.gz" if name.endswith(".gz") else "csv"
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE, fmt=None):
+    """Yield DataFrame chunks from a CSV/Parquet path or file-like object."""
+    if _file_format(source, fmt) == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize)
+
+
+def score_chunk(model, chunk, explainer=None, monitor_drift=False, shadow=False, threshold=None):
+    """Score one raw chunk; returns the chunk with probability and label columns appended.
+
+    Labels flag churn at ``threshold`` (None: the default 0.5, see ``churn.thresholds``).
+
+    With ``explainer`` (a CompiledForest), per-input contribution columns are added too;
+    with ``monitor_drift`` the scored rows are handed to the drift monitor (``churn.drift``),
+    and with ``shadow`` to the registry's challengers (``churn.registry``), labels included
+    when the chunk has a ``Churn`` column. ``shadow`` may be the path ``model`` was loaded
+    from, whose threshold then labels the champion in the shadow log (True: ``MODEL_PATH``).
+    """
+    features = to_model_frame(chunk.copy())
+    start = time.perf_counter()
+    proba = model.predict_proba(features)
+    seconds = time.perf_counter() - start
+    if monitor_drift:
+        from churn import drift
+
+        drift.observe(features, proba[:, 1])
+    if shadow:
+        from churn import registry
+        from churn.dataset import as_bool
+
+        labels = as_bool(chunk["Churn"]).to_numpy() if "Churn" in chunk else None
+        model_path = MODEL_PATH if shadow is True else shadow
+        registry.shadow(features, proba, seconds, "batch", labels, model_path)
+    out = chunk
+    out[PROBA_COLUMN] = proba[:, 1]
+    out[LABEL_COLUMN] = churn_labels(proba, threshold)
+    if explainer is not None:
+        out = pd.concat([out, contribution_columns(explainer, features)], axis=1)
+    return out
+
+
+class ChunkWriter:
+    """Appends DataFrame chunks to a CSV, gzip-CSV or Parquet file (path or file-like)."""
+
+    def __init__(self, target, fmt):
+        self.target = target
+        self.fmt = fmt
+        self._parquet = None
+        self._gzip = None
+        self._first = True
+
+    def write(self, chunk):
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.target, table.schema)
+            self._parquet.write_table(table)
+        elif self.fmt == "csv.gz":
+            if self._gzip is None:
+                self._gzip = gzip.open(self.target, "wt", newline="")
+            chunk.to_csv(self._gzip, header=self._first, index=False)
+        else:
+            chunk.to_csv(self.target, mode="w" if self._first else "a", header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._gzip is not None:
+            self._gzip.close()
+
+
+def score_file(model, source, target, chunksize=DEFAULT_CHUNKSIZE, in_fmt=None, out_fmt=None, progress=None,
+               explainer=None, monitor_drift=False, shadow=False, threshold=None):
+    """Stream ``source`` through the model into ``target``; returns a BatchStats.
+
+    ``progress`` is called with the running BatchStats after every chunk;
+    ``explainer`` adds contribution columns, ``monitor_drift`` feeds the drift monitor
+    and ``shadow`` the challenger models; ``threshold`` is the churn cut-off (see ``score_chunk``).
+    """
+    stats = BatchStats()
+    writer = ChunkWriter(target, _file_format(target, out_fmt))
+    start = time.perf_counter()
+    try:
+        for chunk in iter_chunks(source, chunksize, in_fmt):
+            writer.write(score_chunk(model, chunk, explainer, monitor_drift, shadow, threshold))
+            stats.rows += len(chunk)
+            stats.chunks += 1
+            stats.seconds = time.perf_counter() - start
+            if progress is not None:
+                progress(stats)
+    finally:
+        writer.close()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-score a subscriber export with the churn model.")
+    parser.add_argument("input", help="raw bigml-style export (.csv or .parquet)")
+    parser.add_argument("output", help="scored output file (.csv or .parquet)")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="path to the saved pipeline")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows per chunk")
+    parser.add_argument("--explain", action="store_true", help="add per-input contribution columns")
+    parser.add_argument("--shadow", action="store_true", help="also score the registry's challengers and log them")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="churn cut-off (default: the one tuned for the model with churn.thresholds, else 0.5)")
+    args = parser.parse_args(argv)
+
+    model = model_store.load_model(args.model)
+    stats = score_file(
+        model,
+        args.input,
+        args.output,
+        chunksize=args.chunksize,
+        progress=lambda s: print(f"  {s.rows:,} rows scored ({s.rows_per_sec:,.0f} rows/sec)", flush=True),
+        explainer=model_store.load_forest(args.model) if args.explain else None,
+        shadow=args.shadow and args.model,
+        threshold=args.threshold if args.threshold is not None else load_threshold(args.model),
+    )
+    if args.shadow:
+        from churn import registry
+
+        registry.flush()  # the shadow threads are daemons; let them finish logging before exit
+    print(f"Scored {stats.rows:,} rows in {stats.chunks} chunks, {stats.seconds:.2f}s ({stats.rows_per_sec:,.0f} rows/sec) -> {Path(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Benchmark suite: model and page data paths on synthetic data from 3k to 10M rows.
+
+For every size, ``churn.synthetic`` writes an 80/20 pair of bigml-style CSVs
+into a temporary directory, and the suite times:
+
+- model: joblib load of the pipeline, compiled forest load (memory-mapped),
+  single-row ``predict_proba`` (p50/p99) and batch ``predict_proba`` on all rows
+  for both the pipeline and the compiled forest;
+- page 2: ``load_dataset`` from the CSVs (Arrow cache build) and from the cache;
+- page 3: the churn cube, every aggregation the page draws (rollups, box and
+  histogram summaries, the intl-users export filter) and the streaming summary
+  that replaces them for exports too large for memory.
+
+The in-memory steps run only when ``analysis_mode`` would pick memory for the
+generated files (as the pages do); the streaming summary runs at every size.
+Results go to ``data/.cache/bench/<timestamp>.json`` (or ``--out``): one
+record per (size, step) plus the library versions and git commit, so two runs
+can be compared with ``--compare``.
+
+    python -m churn.bench --sizes 3333 100000 1000000
+    python -m churn.bench --compare data/.cache/bench/before.json data/.cache/bench/after.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+
+from churn import dataset
+from churn.bitmaps import BitmapIndex, index_spec
+from churn.charts import BOX_METRICS, box_stats, histogram_stats, metric_groups
+from churn.compiled_forest import CompiledForest, compiled_path, load_or_compile
+from churn.cube import ChurnCube
+from churn.dataset import CHURN_NUM, data_columns
+from churn.exports import frame_chunks
+from churn.features import normalize_columns, to_model_frame
+from churn.paths import MODEL_PATH, ROOT
+from churn.profiler import profile_sources
+from churn.streaming import analysis_mode, iter_prepared, stream_summary
+from churn.synthetic import fit_sources, write_csv
+
+DEFAULT_SIZES = [3_333, 100_000, 1_000_000]
+BENCH_DIR = ROOT / "data" / ".cache" / "bench"
+TRAIN_SHARE = 0.8  # as the bigml 80/20 split
+SINGLE_ROW_REPEAT = 200
+REPEAT = 3
+PREDICT_CHUNKSIZE = 200_000  # bounds memory of batch predict_proba on the largest sizes
+DEFAULT_REGRESSION = 1.25  # --compare flags steps that got slower by more than this factor
+NOISE_FLOOR = 0.005  # ...and now take at least this many seconds (sub-ms steps jitter by 2x)
+
+# Page 3 aggregations on the cube, as the page builds them (name -> rollup)
+ROLLUPS = {
+    "state_churn": lambda cube: cube.rollup(["State"], "sum").sort_values(CHURN_NUM, ascending=False).head(20),
+    "intl_plan_churn": lambda cube: cube.rollup(["International_plan"]),
+    "voice_mail_plan_churn": lambda cube: cube.rollup(["Voice_mail_plan"]),
+    "service_calls_churn": lambda cube: cube.rollup(["Customer_service_calls"]),
+    "intl_plan_service_calls_churn": lambda cube: cube.rollup(["International_plan", "Customer_service_calls"]),
+    "tenure_bucket_intl_plan": lambda cube: cube.rollup(["Tenure_Bucket", "International_plan"]),
+    "tenure_bucket_voicemail": lambda cube: cube.rollup(["Tenure_Bucket", "Voice_mail_plan"]),
+}
+# A stacked cross-filter on the Analysis page (bitmap index)
+CROSSFILTER = {"State": ["WV", "MN", "NY"], "International_plan": ["Yes"], "Customer_service_calls": [4, 5, 6, 7, 8, 9]}
+
+
+# ========== TIMING ==========
+def measure(fn, repeat=REPEAT, warmup=True):
+    """Seconds per call of ``fn``: p50, p99 and min over ``repeat`` calls."""
+    if warmup:
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"p50": float(np.median(times)), "p99": float(np.percentile(times, 99)),
+            "min": float(min(times)), "repeat": repeat}
+
+
+def _record(results, size, group, step, timing, rows=None):
+    results.append({"size": size, "group": group, "step": step, "rows": rows, **timing})
+    print(f"{size:>11,}  {group:<7} {step:<44} p50 {timing['p50'] * 1e3:10.2f} ms")
+
+
+def _batched(fn, df):
+    for start in range(0, len(df), PREDICT_CHUNKSIZE):
+        fn(df.iloc[start:start + PREDICT_CHUNKSIZE])
+
+
+# ========== DATA ==========
+def generate_sources(model, n, directory, seed=0):
+    """Write ``n`` synthetic rows as an 80/20 train/test pair; returns {"train": path, "test": path}."""
+    n_train = int(round(n * TRAIN_SHARE))
+    sources = {}
+    for (name, rows), share_seed in zip((("train", n_train), ("test", n - n_train)), (0, 1)):
+        path = Path(directory) / f"synthetic-{n}-{name}.csv"
+        sources[name] = write_csv(model, path, rows, seed=(seed, share_seed))
+    return sources
+
+
+def _drop_arrow_cache(sources):
+    dataset.cache_path(sources["train"], sources["test"]).unlink(missing_ok=True)
+
+
+# ========== STEPS ==========
+def bench_model_load(results, model_path=MODEL_PATH):
+    load_or_compile(model_path)  # make sure the export exists before timing its load
+    _record(results, 0, "model", "joblib_load_pipeline", measure(lambda: joblib.load(model_path)))
+    target = compiled_path(model_path)
+    _record(results, 0, "model", "load_compiled_forest_mmap",
+            measure(lambda: CompiledForest.load(target, mmap_mode="r")))
+
+
+def bench_single_row(results, pipeline, forest, row):
+    _record(results, 1, "model", "pipeline_predict_proba",
+            measure(lambda: pipeline.predict_proba(row), SINGLE_ROW_REPEAT), rows=1)
+    _record(results, 1, "model", "forest_predict_proba",
+            measure(lambda: forest.predict_proba_frame(row), SINGLE_ROW_REPEAT), rows=1)
+
+
+def bench_batch(results, size, pipeline, forest, X, repeat):
+    _record(results, size, "model", "pipeline_predict_proba",
+            measure(lambda: _batched(pipeline.predict_proba, X), repeat, warmup=False), rows=len(X))
+    _record(results, size, "model", "forest_predict_proba",
+            measure(lambda: _batched(forest.predict_proba_frame, X), repeat, warmup=False), rows=len(X))
+
+
+def bench_memory_pages(results, size, sources, repeat):
+    train, test = sources["train"], sources["test"]
+
+    def cold():
+        _drop_arrow_cache(sources)
+        dataset._frames.clear()
+        dataset.load_dataset(train, test)
+
+    def warm():
+        dataset._frames.clear()
+        df = dataset.load_dataset(train, test)
+        dataset.split(df, "train"), dataset.split(df, "test"), data_columns(df)
+
+    _record(results, size, "pages", "load_dataset_from_csv", measure(cold, repeat, warmup=False), rows=size)
+    _record(results, size, "pages", "load_dataset_from_cache", measure(warm, repeat), rows=size)
+
+    df = dataset.load_dataset(train, test)
+    # The page caches per frame (load_cube, frame_summaries); these time the first render.
+    _record(results, size, "page3", "build_cube", measure(lambda: ChurnCube.from_frame(df), repeat), rows=size)
+    cube = ChurnCube.from_frame(df)
+    for name, rollup in ROLLUPS.items():
+        _record(results, size, "page3", name, measure(lambda: rollup(cube), repeat), rows=size)
+    for metric in BOX_METRICS:
+        def summaries():
+            groups = metric_groups(df, metric)
+            box_stats(groups), histogram_stats(groups)
+
+        _record(results, size, "page3", f"box_summaries_{metric}", measure(summaries, repeat), rows=size)
+
+    def intl_users_export():
+        for chunk in frame_chunks(df[data_columns(df)]):
+            chunk[chunk["International_plan"].astype(str).str.lower() == "yes"]
+
+    _record(results, size, "page3", "intl_users_export_filter", measure(intl_users_export, repeat), rows=size)
+    dataset._frames.clear()
+    _drop_arrow_cache(sources)
+
+
+def bench_streaming(results, size, sources, repeat):
+    holder = {}
+
+    def summarize():
+        holder["summary"] = stream_summary(sources)
+
+    _record(results, size, "stream", "stream_summary", measure(summarize, repeat, warmup=False), rows=size)
+    summary = holder["summary"]
+    for name, rollup in ROLLUPS.items():
+        _record(results, size, "stream", name, measure(lambda: rollup(summary.cube), repeat), rows=size)
+    for metric in BOX_METRICS:
+        _record(results, size, "stream", f"box_stats_{metric}",
+                measure(lambda: summary.box_stats(metric), repeat), rows=size)
+    _record(results, size, "page2", "profile_sources", measure(lambda: profile_sources(sources), repeat, warmup=False),
+            rows=size)
+    index = BitmapIndex.build(iter_prepared(sources), index_spec(profile_sources(sources)))
+    _record(results, size, "page3", "crossfilter_query", measure(lambda: index.stats(CROSSFILTER), repeat), rows=size)
+    _record(results, size, "page3", "crossfilter_breakdown_state",
+            measure(lambda: index.breakdown("State", CROSSFILTER), repeat), rows=size)
+
+
+# ========== SUITE ==========
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, repeat=REPEAT, seed=0, model_path=MODEL_PATH, workdir=None):
+    """Run every step at every size; returns the JSON-ready result document."""
+    from churn import model_store
+
+    results = []
+    started = time.perf_counter()
+    generator = fit_sources()
+    pipeline = model_store.load_model(model_path)
+    forest = model_store.load_forest(model_path)
+
+    bench_model_load(results, model_path)
+    row = to_model_frame(normalize_columns(generator.sample(1, seed=seed)))
+    bench_single_row(results, pipeline, forest, row)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for size in sizes:
+            start = time.perf_counter()
+            sources = generate_sources(generator, size, directory, seed)
+            elapsed = time.perf_counter() - start
+            _record(results, size, "data", "generate_csv", {"p50": elapsed, "p99": elapsed, "min": elapsed,
+                                                            "repeat": 1}, rows=size)
+            X = pd.concat([to_model_frame(normalize_columns(pd.read_csv(p))) for p in sources.values()],
+                          ignore_index=True)
+            bench_batch(results, size, pipeline, forest, X, repeat)
+            del X
+            if analysis_mode(sources) == "memory":
+                bench_memory_pages(results, size, sources, repeat)
+            bench_streaming(results, size, sources, repeat)
+            for path in sources.values():
+                os.remove(path)
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "sizes": list(sizes),
+            "repeat": repeat,
+            "seed": seed,
+            "seconds": time.perf_counter() - started,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "libraries": {"numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__},
+        },
+        "results": results,
+    }
+
+
+def compare(old, new, threshold=DEFAULT_REGRESSION, stat="min"):
+    """``stat`` of every (size, group, step) in both documents, with new/old ratios and a regression flag.
+
+    The minimum is the default: it is the least sensitive to other load on the machine.
+    Steps faster than ``NOISE_FLOOR`` in the new run are never flagged.
+    """
+    def frame(doc):
+        return pd.DataFrame(doc["results"]).set_index(["size", "group", "step"])[stat]
+
+    table = pd.concat({f"old_{stat}": frame(old), f"new_{stat}": frame(new)}, axis=1, join="inner")
+    table["ratio"] = table[f"new_{stat}"] / table[f"old_{stat}"]
+    table["regression"] = (table["ratio"] > threshold) & (table[f"new_{stat}"] >= NOISE_FLOOR)
+    return table.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the model and page data paths on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="total rows per run (up to 10M)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="result file (default data/.cache/bench/<timestamp>.json)")
+    parser.add_argument("--workdir", default=None, help="where to write the generated CSVs (default: system temp)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION)
+    parser.add_argument("--stat", choices=["min", "p50", "p99"], default="min", help="statistic to compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = (json.loads(Path(p).read_text()) for p in args.compare)
+        table = compare(old, new, args.threshold, args.stat)
+        print(f"old: {old['meta']['commit']}  new: {new['meta']['commit']}")
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        regressions = int(table["regression"].sum())
+        print(f"{regressions} step(s) slower than {args.threshold}x")
+        return 1 if regressions else 0
+
+    doc = run(args.sizes, args.repeat, args.seed, workdir=args.workdir)
+    out = Path(args.out) if args.out else BENCH_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2))
+    print(f"{len(doc['results'])} results in {doc['meta']['seconds']:.1f}s -> {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
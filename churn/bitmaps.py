@@ -0,0 +1,289 @@
+"""Bitmap indexes for ad-hoc cross-filtering on the Analysis page.
+
+Every filterable column gets one bitmap per value (State, plans, area code,
+service calls) or per bin (tenure buckets, quantile bins of the usage
+columns): bit ``i`` is set when row ``i`` has that value. A filter is a set of
+allowed labels per column; it is answered by OR-ing the bitmaps of the allowed
+labels within a column, AND-ing across columns and popcounting the result with
+the Churn bitmap. That costs O(rows / 64) word operations per filtered column,
+independent of how many columns exist, instead of boolean-masking the frame.
+
+Bitmaps are stored in one of two containers, like Roaring's per-block choice:
+dense ``uint64`` words, or the sorted ``uint32`` row ids when that is smaller
+(fewer set bits than ``rows / 32``, e.g. one State among 51). Counting a
+filter against a sparse bitmap only touches its row ids.
+
+Labels and bin edges come from the data profile (``churn.profiler``), so the
+index is built in the same single chunked pass in both analysis modes and its
+memory is the bitmaps only: about ``rows / 8`` bytes per dense label. A
+categorical column with more distinct values than the profile keeps exactly
+(``MAX_EXACT_VALUES``, e.g. a free-text State in a new export) is left out.
+
+    python -m churn.bitmaps --check 200      # random filters against pandas masks
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from churn.cube import TENURE_EDGES, TENURE_LABELS
+from churn.dataset import source_stamp
+from churn.profiler import load_profile
+from churn.streaming import DEFAULT_CHUNKSIZE, DEFAULT_SOURCES, iter_prepared
+
+INDEXED_COLUMNS = [
+    "State", "Area_code", "International_plan", "Voice_mail_plan", "Customer_service_calls",
+    "Account_length", "Number_vmail_messages", "Total_day_minutes", "Total_eve_minutes",
+    "Total_night_minutes", "Total_intl_minutes", "Total_intl_calls",
+]
+MAX_VALUES = 16  # numeric columns with at most this many distinct values get one bitmap per value
+N_BINS = 8  # quantile bins for the other numeric columns
+TARGET = "Churn"
+
+_POPCOUNT16 = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+# ========== WORD OPERATIONS ==========
+def popcount(words):
+    return int(_POPCOUNT16[words.view(np.uint16)].sum(dtype=np.int64))
+
+
+def pack(flags):
+    """Boolean array (length a multiple of 64) -> uint64 words, row i at bit i % 64 of word i // 64."""
+    return np.packbits(flags, bitorder="little").view(np.uint64)
+
+
+def row_ids(words):
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint32)
+
+
+def densify(ids, n_words):
+    words = np.zeros(n_words, dtype=np.uint64)
+    if len(ids):
+        word = ids >> 6
+        bits = np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64))
+        # Ids are unique, so the bits of one word are distinct and their sum is their OR.
+        starts = np.flatnonzero(np.r_[True, word[1:] != word[:-1]])
+        words[word[starts]] = np.add.reduceat(bits, starts)
+    return words
+
+
+def count_and(mask, bitmap):
+    """Rows set in both ``mask`` (dense words) and ``bitmap`` (either container)."""
+    if bitmap.dtype == np.uint32:
+        return int(((mask[bitmap >> 6] >> (bitmap & 63).astype(np.uint64)) & np.uint64(1)).sum())
+    return popcount(mask & bitmap)
+
+
+# ========== SPEC ==========
+def _bin_labels(edges):
+    labels = [f"≤ {edges[0]:g}"]
+    labels += [f"{lo:g}–{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+    return labels + [f"> {edges[-1]:g}"]
+
+
+def index_spec(profile, columns=INDEXED_COLUMNS):
+    """column -> (labels, right-closed bin edges or None) from the data profile."""
+    spec = {}
+    for name in columns:
+        if name not in profile.columns:
+            continue
+        column = profile.columns[name]
+        if column.kind == "categorical" and column.values is None:
+            # Past MAX_EXACT_VALUES the profile keeps no value list to label bitmaps with; not filterable.
+            continue
+        if name == "Account_length":
+            # The Analysis page's tenure buckets: (1, 50] New, (50, 150] Mid, above 150 Long
+            spec[name] = (["≤ 1"] + TENURE_LABELS, np.array(TENURE_EDGES[:-1], dtype=np.float64))
+        elif column.kind == "categorical" or (column.values is not None and len(column.values) <= MAX_VALUES):
+            spec[name] = (sorted(column.values), None)
+        else:
+            # Quantile bins; ties (e.g. most customers have no voice mail) collapse into one bin.
+            edges = np.unique(np.round([column.sketch.quantile(q) for q in np.linspace(0, 1, N_BINS + 1)[1:-1]], 1))
+            spec[name] = (_bin_labels(edges), edges)
+    return spec
+
+
+def codes(series, labels, edges):
+    """Label position of every row (-1 when missing or unknown)."""
+    if edges is None:
+        return pd.Categorical(series, categories=labels).codes.astype(np.int16)
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    out = np.searchsorted(edges, values, side="left").astype(np.int16)
+    out[np.isnan(values)] = -1
+    return out
+
+
+# ========== INDEX ==========
+class BitmapIndex:
+    def __init__(self, n_rows, spec, bitmaps, churn):
+        self.n_rows = n_rows
+        self.n_words = len(churn)
+        self.spec = spec  # column -> (labels, edges)
+        self.bitmaps = bitmaps  # column -> list of bitmaps, one per label
+        self.churn = churn  # dense words
+        self.all = densify(np.arange(n_rows, dtype=np.uint32), self.n_words)
+
+    @classmethod
+    def build(cls, chunks, spec):
+        """Index prepared chunks in one pass; rows are numbered in chunk order."""
+        words = {name: [[] for _ in labels] for name, (labels, _) in spec.items()}
+        churn_words = []
+        pending = {name: np.empty(0, np.int16) for name in spec}
+        pending_churn = np.empty(0, bool)
+        n_rows = 0
+
+        def flush(final):
+            nonlocal pending_churn
+            # Pack whole words only; the remainder waits for the next chunk (or is padded at the end).
+            cut = -(-len(pending_churn) // 64) * 64 if final else len(pending_churn) // 64 * 64
+            pad = cut - len(pending_churn) if final else 0
+            for name, position in pending.items():
+                block = np.concatenate([position, np.full(pad, -1, np.int16)])[:cut]
+                for label, out in enumerate(words[name]):
+                    out.append(pack(block == label))
+                pending[name] = position[cut:]
+            churn_words.append(pack(np.concatenate([pending_churn, np.zeros(pad, bool)])[:cut]))
+            pending_churn = pending_churn[cut:]
+
+        for chunk in chunks:
+            n_rows += len(chunk)
+            for name, (labels, edges) in spec.items():
+                pending[name] = np.concatenate([pending[name], codes(chunk[name], labels, edges)])
+            pending_churn = np.concatenate([pending_churn, chunk[TARGET].to_numpy(dtype=bool)])
+            flush(final=False)
+        flush(final=True)
+
+        bitmaps = {}
+        for name, per_label in words.items():
+            bitmaps[name] = []
+            for parts in per_label:
+                dense = np.concatenate(parts)
+                ones = popcount(dense)
+                # Row ids take 4 bytes per set bit, dense words 8 bytes per 64 rows.
+                bitmaps[name].append(row_ids(dense) if ones * 4 < dense.nbytes else dense)
+        return cls(n_rows, spec, bitmaps, np.concatenate(churn_words))
+
+    def labels(self, column):
+        return self.spec[column][0]
+
+    def nbytes(self):
+        return self.churn.nbytes + sum(b.nbytes for bitmaps in self.bitmaps.values() for b in bitmaps)
+
+    def mask(self, filters):
+        """Dense words of the rows matching ``filters`` ({column: allowed labels}; empty or missing = any).
+
+        Labels that do not occur in the data match no rows.
+        """
+        mask = None
+        for column, allowed in (filters or {}).items():
+            if not allowed:
+                continue
+            positions = {label: i for i, label in enumerate(self.labels(column))}
+            union = np.zeros(self.n_words, dtype=np.uint64)
+            for label in allowed:
+                if label not in positions:
+                    continue
+                bitmap = self.bitmaps[column][positions[label]]
+                union |= densify(bitmap, self.n_words) if bitmap.dtype == np.uint32 else bitmap
+            mask = union if mask is None else mask & union
+        return self.all if mask is None else mask
+
+    def stats(self, filters=None, mask=None):
+        """Rows, churners and churn rate of the filtered customers."""
+        mask = self.mask(filters) if mask is None else mask
+        rows = popcount(mask)
+        churners = popcount(mask & self.churn)
+        return {"rows": rows, "churn": churners, "rate": churners / rows if rows else np.nan}
+
+    def breakdown(self, by, filters=None, mask=None):
+        """Rows, churners and churn rate per label of ``by`` within the filtered customers."""
+        mask = self.mask(filters) if mask is None else mask
+        churned = mask & self.churn
+        records = []
+        for label, bitmap in zip(self.labels(by), self.bitmaps[by]):
+            rows = count_and(mask, bitmap)
+            churners = count_and(churned, bitmap)
+            records.append({by: str(label), "rows": rows, "churn": churners,
+                            "rate": churners / rows if rows else np.nan})
+        return pd.DataFrame(records)
+
+
+def load_index(sources=None, df=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Index of the sources, built once per process and source version.
+
+    ``df`` is the shared in-memory dataset when the page has it (indexed as one chunk);
+    otherwise the sources are read in chunks.
+    """
+    sources = sources or DEFAULT_SOURCES
+    key = source_stamp(list(sources.values()))
+    with _lock:
+        if key not in _indexes:
+            spec = index_spec(load_profile(sources))
+            chunks = [df] if df is not None else iter_prepared(sources, chunksize)
+            _indexes.clear()
+            _indexes[key] = BitmapIndex.build(chunks, spec)
+        return _indexes[key]
+
+
+# ========== CHECK ==========
+def random_filters(index, rng, max_columns=4):
+    filters = {}
+    for column in rng.choice(list(index.spec), size=rng.integers(1, max_columns + 1), replace=False):
+        labels = index.labels(column)
+        picked = rng.choice(len(labels), size=rng.integers(1, len(labels) + 1), replace=False)
+        filters[column] = [labels[i] for i in picked]
+    return filters
+
+
+def pandas_mask(df, index, filters):
+    """The same filter as a boolean mask over the frame (the per-row reference)."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, allowed in filters.items():
+        labels, edges = index.spec[column]
+        position = codes(df[column], labels, edges)
+        mask &= np.isin(position, [labels.index(label) for label in allowed])
+    return mask
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the cross-filter bitmap index and check it against pandas.")
+    parser.add_argument("--train", default=str(DEFAULT_SOURCES["train"]))
+    parser.add_argument("--test", default=str(DEFAULT_SOURCES["test"]))
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="compare N random filters with pandas")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sources = {"train": args.train, "test": args.test}
+    start = time.perf_counter()
+    index = load_index(sources, chunksize=args.chunksize)
+    print(f"{index.n_rows:,} rows, {sum(len(b) for b in index.bitmaps.values())} bitmaps, "
+          f"{index.nbytes() / 2**20:.1f} MB, built in {time.perf_counter() - start:.2f}s")
+    if not args.check:
+        return
+    df = pd.concat(iter_prepared(sources, args.chunksize), ignore_index=True)
+    rng = np.random.default_rng(args.seed)
+    bitmap_seconds, pandas_seconds = [], []
+    for _ in range(args.check):
+        filters = random_filters(index, rng)
+        start = time.perf_counter()
+        got = index.stats(filters)
+        bitmap_seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        mask = pandas_mask(df, index, filters)
+        want = {"rows": int(mask.sum()), "churn": int(df[TARGET].to_numpy()[mask].sum())}
+        pandas_seconds.append(time.perf_counter() - start)
+        if (got["rows"], got["churn"]) != (want["rows"], want["churn"]):
+            raise SystemExit(f"mismatch for {filters}: {got} vs {want}")
+    print(f"{args.check} filters match pandas; median query {np.median(bitmap_seconds) * 1e3:.2f} ms "
+          f"(bitmaps) vs {np.median(pandas_seconds) * 1e3:.2f} ms (boolean masks)")
+
+
+if __name__ == "__main__":
+    main()
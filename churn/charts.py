@@ -0,0 +1,198 @@
+"""Plotly figures built from server-side summaries instead of raw rows.
+
+``px.box(df, ...)`` serializes every value into the figure and lets the browser
+compute quartiles. Here box statistics (quartiles, whiskers, a capped outlier
+sample) and histogram bin counts are computed with NumPy and only those are sent,
+so the payload stays a few KB whatever the row count.
+
+    python -m churn.charts          # payload size / build time: raw rows vs summaries
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# Box plots on the analysis page: name -> (value column, plan column that must be "Yes" or None)
+BOX_METRICS = {
+    "Account_length": ("Account_length", None),
+    "Intl_users_Total_intl_charge": ("Total_intl_charge", "International_plan"),
+}
+MAX_OUTLIERS = 200
+HISTOGRAM_BINS = 40
+
+_lock = threading.Lock()
+_cache = {}
+
+
+# ========== SUMMARIES ==========
+def metric_groups(df, metric, by="Churn"):
+    """{group value: ndarray} for one BOX_METRICS entry."""
+    column, plan = BOX_METRICS[metric]
+    if plan is not None:
+        df = df[df[plan].astype(str).str.lower() == "yes"]
+    return {key: values.to_numpy(dtype=np.float64) for key, values in df.groupby(by)[column]}
+
+
+def _outlier_sample(outliers, cap):
+    """At most ``cap`` outliers, evenly spaced over the sorted values (extremes always kept)."""
+    outliers = np.sort(outliers)
+    if len(outliers) <= cap:
+        return outliers
+    return outliers[np.linspace(0, len(outliers) - 1, cap).round().astype(int)]
+
+
+def box_stats(groups, max_outliers=MAX_OUTLIERS):
+    """Box statistics per group, computed the way Plotly does for raw data.
+
+    Quartiles use linear interpolation (Plotly's default ``quartilemethod``) and
+    the whiskers end at the most extreme values within 1.5 IQR of the box.
+    """
+    records = []
+    for key, values in groups.items():
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            continue
+        q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        outliers = values[(values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)]
+        records.append({
+            "Churn": key,
+            "count": len(values),
+            "min": values.min(),
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "max": values.max(),
+            "lowerfence": inside.min(),
+            "upperfence": inside.max(),
+            "mean": values.mean(),
+            "n_outliers": len(outliers),
+            "outliers": _outlier_sample(outliers, max_outliers),
+        })
+    return pd.DataFrame(records)
+
+
+def histogram_stats(groups, bins=HISTOGRAM_BINS):
+    """Counts per group over shared bin edges: columns Churn, left, right, count."""
+    values = [v[~np.isnan(v)] for v in groups.values()]
+    lo = min(v.min() for v in values if len(v))
+    hi = max(v.max() for v in values if len(v))
+    edges = np.histogram_bin_edges([lo, hi], bins=bins)
+    frames = []
+    for key, v in zip(groups, values):
+        counts, _ = np.histogram(v, bins=edges)
+        frames.append(pd.DataFrame({"Churn": key, "left": edges[:-1], "right": edges[1:], "count": counts}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def frame_summaries(df, metric):
+    """(box stats, histogram) for ``metric`` on the shared frame ``df``, computed once per frame."""
+    key = (id(df), metric)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] is not df:
+            for old in [k for k, v in _cache.items() if v[0] is not df]:
+                del _cache[old]
+            groups = metric_groups(df, metric)
+            entry = _cache[key] = (df, box_stats(groups), histogram_stats(groups))
+        return entry[1], entry[2]
+
+
+# ========== FIGURES ==========
+def box_figure(stats, x="Churn", title=None, labels=None, y_label=None):
+    """Box plot from a box_stats() frame (one row per x value with q1/median/q3/fences/mean).
+
+    An ``outliers`` column, when present, is drawn as a point overlay.
+    """
+    labels = labels or {}
+    xs = stats[x].astype(str)
+    fig = go.Figure(go.Box(
+        x=xs,
+        q1=stats["q1"],
+        median=stats["median"],
+        q3=stats["q3"],
+        lowerfence=stats["lowerfence"],
+        upperfence=stats["upperfence"],
+        mean=stats["mean"],
+        boxpoints=False,
+        name=y_label or "",
+        showlegend=False,
+    ))
+    if "outliers" in stats:
+        px_, py = [], []
+        for xv, outliers in zip(xs, stats["outliers"]):
+            px_.extend([xv] * len(outliers))
+            py.extend(np.asarray(outliers).tolist())
+        if py:
+            fig.add_trace(go.Scatter(x=px_, y=py, mode="markers", name="outliers", showlegend=False,
+                                     marker={"size": 4, "color": "#636efa"}))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=y_label)
+    return fig
+
+
+def histogram_figure(hist, x="Churn", title=None, labels=None, x_label=None):
+    """Overlaid histogram bars from a histogram_stats() frame."""
+    labels = labels or {}
+    fig = go.Figure()
+    for key, bins in hist.groupby(x, sort=True):
+        fig.add_trace(go.Bar(
+            x=(bins["left"] + bins["right"]) / 2,
+            y=bins["count"],
+            width=bins["right"] - bins["left"],
+            name=f"{labels.get(x, x)} = {key}",
+            opacity=0.6,
+        ))
+    fig.update_layout(title=title, barmode="overlay", xaxis_title=x_label, yaxis_title="Customers")
+    return fig
+
+
+# ========== COMPARISON ==========
+def _payload_bytes(fig):
+    """Size of the figure JSON, which is what st.plotly_chart ships to the browser."""
+    return len(fig.to_json())
+
+
+def compare(sizes=(3_333, 100_000, 1_000_000), metric="Account_length"):
+    """Payload size and build+serialize time of px.box on raw rows vs the summary figure."""
+    import plotly.express as px
+
+    from churn.dataset import load_dataset
+
+    base = load_dataset()
+    column, plan = BOX_METRICS[metric]
+    px.box(base.head(10), x="Churn", y=column)  # warm up plotly before timing
+    results = []
+    for n in sizes:
+        df = base.sample(n, replace=n > len(base), random_state=0).reset_index(drop=True)
+
+        start = time.perf_counter()
+        rows = df if plan is None else df[df[plan].astype(str).str.lower() == "yes"]
+        raw = px.box(rows, x="Churn", y=column)
+        raw_bytes = _payload_bytes(raw)
+        raw_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        groups = metric_groups(df, metric)
+        summary = box_figure(box_stats(groups), y_label=column)
+        summary_bytes = _payload_bytes(summary)
+        summary_s = time.perf_counter() - start
+
+        results.append({"rows": n, "raw_bytes": raw_bytes, "raw_s": raw_s,
+                        "summary_bytes": summary_bytes, "summary_s": summary_s})
+    return pd.DataFrame(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare raw-row and summarized box plot payloads.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3_333, 100_000, 1_000_000])
+    parser.add_argument("--metric", choices=list(BOX_METRICS), default="Account_length")
+    args = parser.parse_args(argv)
+    print(compare(args.sizes, args.metric).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Array-compiled copy of the saved RandomForest pipeline for low-latency scoring.
+
+The export folds the ColumnTransformer into the trees: OrdinalEncoder columns are
+fed as their category codes, and every RobustScaler split ``(x - c) / s <= t`` is
+rewritten as ``x <= t_raw`` on the raw value. All trees are then concatenated into
+flat node arrays (feature, threshold, left, right, leaf value) and traversed for
+every tree and row at once, one NumPy step per tree level.
+
+Exactness: sklearn compares ``float32((x - c) / s)`` against the float64 split.
+That transform is monotone, so ``t_raw`` is chosen by bisection as the largest
+float64 with ``float32((t_raw - c) / s) <= t``; the raw test then takes the same
+branch for every finite input. Tree outputs are summed in estimator order with a
+sequential cumulative sum, as ``RandomForestClassifier.predict_proba`` does with
+``n_jobs=None``, so probabilities match the pipeline bit for bit. NaN inputs are
+not supported (the saved model was never fitted on missing values).
+
+    python -m churn.compiled_forest            # export next to the .joblib file
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from churn.features import FEATURE_COLUMNS
+from churn.paths import MODEL_PATH
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "value", "roots")
+META_FILE = "meta.json"
+# Bumped when the on-disk layout changes; older exports are recompiled. 2: intp node indices.
+FORMAT_VERSION = 2
+# Waits (seconds) before reloading when a newer export removed the one being loaded
+LOAD_RETRY_DELAYS = (0.001, 0.01, 0.1)
+
+
+def compiled_path(model_path):
+    """Where the compiled arrays for ``model_path`` are published (a symlink to the current export)."""
+    return Path(model_path).with_suffix(".forest")
+
+
+# ========== THRESHOLD FOLDING ==========
+def _ordered_keys(x):
+    """Map float64 values to int64 keys with the same ordering (for bisection over floats)."""
+    bits = x.view(np.int64)
+    return np.where(bits < 0, -(bits & np.int64(0x7FFFFFFFFFFFFFFF)), bits)
+
+
+def _from_keys(keys):
+    bits = np.where(keys < 0, (-keys) | np.int64(-0x8000000000000000), keys)
+    return bits.view(np.float64)
+
+
+def _fold_scaler_thresholds(thresholds, center, scale):
+    """Largest raw x with float32((x - center) / scale) <= threshold, elementwise."""
+    def goes_left(x):
+        return ((x - center) / scale).astype(np.float32).astype(np.float64) <= thresholds
+
+    guess = thresholds * scale + center
+    slack = (np.abs(thresholds) + 1.0) * scale * 1e-5
+    lo, hi = guess - slack, guess + slack
+    while not goes_left(lo).all():
+        lo = np.where(goes_left(lo), lo, lo - (guess - lo) * 2)
+    while goes_left(hi).any():
+        hi = np.where(goes_left(hi), hi + (hi - guess) * 2, hi)
+
+    lo_k, hi_k = _ordered_keys(lo), _ordered_keys(hi)
+    while (hi_k - lo_k > 1).any():
+        mid_k = lo_k + (hi_k - lo_k) // 2
+        left = goes_left(_from_keys(mid_k))
+        lo_k = np.where(left, mid_k, lo_k)
+        hi_k = np.where(left, hi_k, mid_k)
+    return _from_keys(lo_k)
+
+
+def _split_pipeline(pipeline):
+    """Return (ColumnTransformer, forest), skipping fit-only resampling steps."""
+    steps = [s for _, s in pipeline.steps if not hasattr(s, "fit_resample")]
+    if len(steps) != 2:
+        raise ValueError(f"Expected preprocessing + forest, got {[type(s).__name__ for s in steps]}")
+    return steps[0], steps[1]
+
+
+def _column_folding(preprocessor):
+    """For each transformed column: (raw feature index, center, scale, categories or None)."""
+    # Imported here: loading an export needs NumPy only, which keeps replica start-up light.
+    from sklearn.preprocessing import OrdinalEncoder, RobustScaler
+
+    columns = []
+    for name, transformer, cols in preprocessor.transformers_:
+        if name == "remainder" and len(cols) == 0:
+            continue
+        if isinstance(transformer, OrdinalEncoder):
+            for col, cats in zip(cols, transformer.categories_):
+                columns.append((FEATURE_COLUMNS.index(col), 0.0, 1.0, list(cats)))
+        elif isinstance(transformer, RobustScaler):
+            center = transformer.center_ if transformer.with_centering else np.zeros(len(cols))
+            scale = transformer.scale_ if transformer.with_scaling else np.ones(len(cols))
+            for col, c, s in zip(cols, center, scale):
+                columns.append((FEATURE_COLUMNS.index(col), float(c), float(s), None))
+        else:
+            raise TypeError(f"Cannot fold {type(transformer).__name__} ({name}) into tree thresholds")
+    return columns
+
+
+# ========== EVALUATOR ==========
+class CompiledForest:
+    """Flat node arrays for every tree of the forest, scored on raw feature vectors."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, categories):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.categories = categories
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        preprocessor, forest = _split_pipeline(pipeline)
+        folding = _column_folding(preprocessor)
+
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for est in forest.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(offset, offset + n, dtype=np.intp)
+
+            raw_feature = np.zeros(n, dtype=np.intp)
+            raw_threshold = np.full(n, np.inf)
+            for col, (raw_idx, c, s, cats) in enumerate(folding):
+                mask = ~is_leaf & (tree.feature == col)
+                raw_feature[mask] = raw_idx
+                if cats is None:
+                    raw_threshold[mask] = _fold_scaler_thresholds(tree.threshold[mask], c, s)
+                else:
+                    raw_threshold[mask] = tree.threshold[mask]
+
+            # Leaves point at themselves so traversal can run a fixed number of steps.
+            feature.append(raw_feature)
+            threshold.append(raw_threshold)
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp))
+            value.append(tree.value[:, 0, :].astype(np.float64))
+            roots.append(offset)
+            offset += n
+
+        categories = {FEATURE_COLUMNS[raw]: cats for raw, _, _, cats in folding if cats is not None}
+        return cls(
+            np.concatenate(feature),
+            np.concatenate(threshold),
+            np.concatenate(left),
+            np.concatenate(right),
+            np.concatenate(value),
+            np.asarray(roots, dtype=np.intp),
+            max(est.tree_.max_depth for est in forest.estimators_),
+            categories,
+        )
+
+    def encode(self, df):
+        """Raw float64 matrix in FEATURE_COLUMNS order, categoricals replaced by their codes."""
+        X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+        for j, col in enumerate(FEATURE_COLUMNS):
+            if col in self.categories:
+                values = df[col].to_numpy()
+                codes = np.full(len(df), np.nan)
+                for code, cat in enumerate(self.categories[col]):
+                    codes[values == cat] = code
+                if np.isnan(codes).any():
+                    raise ValueError(f"Unknown category in {col}: {sorted(set(values[np.isnan(codes)]))}")
+                X[:, j] = codes
+            else:
+                X[:, j] = df[col].to_numpy(dtype=np.float64)
+        return X
+
+    def apply(self, X):
+        """Leaf node index reached in every tree, shape (n_rows, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        # ndarray.take on intp indices into flat arrays is much cheaper than 2-D fancy indexing.
+        flat = X.ravel()
+        row_offset = (np.arange(len(X)) * X.shape[1])[:, None]
+        feature, threshold, left, right = (np.asarray(a) for a in (self.feature, self.threshold, self.left, self.right))
+        node = np.broadcast_to(np.asarray(self.roots), (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = flat.take(feature.take(node) + row_offset) <= threshold.take(node)
+            node = np.where(go_left, left.take(node), right.take(node))
+        return node
+
+    def predict_proba(self, X):
+        """Class probabilities for raw encoded rows (see ``encode``); equals the pipeline's output."""
+        leaf_values = np.asarray(self.value).take(self.apply(X), axis=0)  # (n_rows, n_trees, n_classes)
+        return np.cumsum(leaf_values, axis=1)[:, -1, :] / self.n_trees
+
+    def predict_proba_frame(self, df):
+        return self.predict_proba(self.encode(df))
+
+    def contributions(self, X, cls=1):
+        """Exact per-feature decomposition of ``predict_proba(X)[:, cls]``.
+
+        Each tree's output is its root value plus, for every split on the path,
+        the change in node value, credited to the split's feature (the
+        treeinterpreter decomposition). Returns ``(bias, contrib)``: the mean
+        root value and an (n_rows, n_features) matrix in FEATURE_COLUMNS order,
+        with ``bias + contrib.sum(1)`` equal to the probability up to rounding.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+        feature, threshold, left, right = (np.asarray(a) for a in (self.feature, self.threshold, self.left, self.right))
+        value = np.ascontiguousarray(np.asarray(self.value)[:, cls])
+        node = np.broadcast_to(np.asarray(self.roots), (n_rows, self.n_trees))
+        contrib = np.zeros(n_rows * n_features)
+        for _ in range(self.max_depth):
+            split_feature = feature.take(node)
+            go_left = flat.take(split_feature + row_offset) <= threshold.take(node)
+            child = np.where(go_left, left.take(node), right.take(node))
+            # Leaves point at themselves, so finished paths add zero.
+            delta = value.take(child) - value.take(node)
+            contrib += np.bincount((split_feature + row_offset).ravel(), weights=delta.ravel(), minlength=contrib.size)
+            node = child
+        bias = value.take(np.asarray(self.roots)).mean()
+        return bias, contrib.reshape(n_rows, n_features) / self.n_trees
+
+    # ========== PERSISTENCE ==========
+    def save(self, path, source=None):
+        """Write one ``.npy`` per array (memory-mappable) plus ``meta.json``.
+
+        ``source`` is the model file the arrays were compiled from; its size and
+        mtime are recorded so stale exports can be detected.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(path / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            "format": FORMAT_VERSION,
+            "max_depth": self.max_depth,
+            "categories": self.categories,
+            "features": FEATURE_COLUMNS,
+        }
+        if source is not None:
+            meta["source"] = _source_stamp(source)
+        (path / META_FILE).write_text(json.dumps(meta, indent=2))
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        path = Path(path)
+        meta = json.loads((path / META_FILE).read_text())
+        if meta["features"] != FEATURE_COLUMNS:
+            raise ValueError(f"{path} was compiled for different features: {meta['features']}")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls(**arrays, max_depth=meta["max_depth"], categories=meta["categories"])
+
+
+def _source_stamp(model_path):
+    stat = Path(model_path).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def is_stale(model_path, target=None):
+    """True when the export for ``model_path`` is missing or was compiled from another version."""
+    try:
+        meta = json.loads((Path(target or compiled_path(model_path)) / META_FILE).read_text())
+    except FileNotFoundError:
+        return True
+    return meta.get("format") != FORMAT_VERSION or meta.get("source") != _source_stamp(model_path)
+
+
+def publish(forest, model_path):
+    """Export ``forest`` for ``model_path`` and swap it in atomically; returns the export directory.
+
+    Every export gets its own directory (``<model>.forest.<ns>-<pid>``) and
+    ``<model>.forest`` is a symlink to it, replaced in one rename. Replicas
+    starting together therefore never find it missing or half-written. The
+    previous export is removed afterwards; a replica still loading from it
+    reloads (``load_published``).
+    """
+    target = compiled_path(model_path)
+    export = forest.save(target.with_name(f"{target.name}.{time.time_ns()}-{os.getpid()}"), source=model_path)
+    link = target.with_name(f"{target.name}.link{os.getpid()}")
+    try:
+        link.unlink(missing_ok=True)
+        os.symlink(export.name, link, target_is_directory=True)
+    except OSError:
+        # No symlinks here (e.g. Windows without developer mode): rename into place, with a short gap
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(export, target)
+        except OSError:
+            # Another process published first; its export is just as good.
+            shutil.rmtree(export, ignore_errors=True)
+        return target
+    if not target.is_symlink():
+        shutil.rmtree(target, ignore_errors=True)  # an export from before versioned directories
+    previous = os.readlink(target) if target.is_symlink() else None
+    os.replace(link, target)
+    if previous is not None and previous != export.name:
+        shutil.rmtree(target.parent / previous, ignore_errors=True)
+    return export
+
+
+def load_published(target, mmap_mode=None):
+    """Load the export ``target`` points to, reloading if a newer publish removes it meanwhile."""
+    for delay in LOAD_RETRY_DELAYS:
+        try:
+            return CompiledForest.load(Path(target).resolve(), mmap_mode=mmap_mode)
+        except FileNotFoundError:
+            time.sleep(delay)
+    return CompiledForest.load(Path(target).resolve(), mmap_mode=mmap_mode)
+
+
+def load_or_compile(model_path=MODEL_PATH, pipeline=None, mmap_mode=None):
+    """Load the compiled arrays for ``model_path``, exporting them first if missing or stale (see ``publish``)."""
+    target = compiled_path(model_path)
+    if is_stale(model_path, target):
+        if pipeline is None:
+            import joblib
+
+            pipeline = joblib.load(model_path)
+        publish(CompiledForest.from_pipeline(pipeline), model_path)
+    return load_published(target, mmap_mode=mmap_mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the saved pipeline to flat tree arrays.")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="path to the saved pipeline")
+    parser.add_argument("--out", help="output directory (default: <model>.forest)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    import joblib
+
+    forest = CompiledForest.from_pipeline(joblib.load(args.model))
+    out = forest.save(args.out, source=args.model) if args.out else publish(forest, args.model)
+    print(f"Compiled {forest.n_trees} trees ({len(forest.feature):,} nodes) to {out} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
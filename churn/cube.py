@@ -0,0 +1,117 @@
+"""Pre-aggregated churn cube for the Analysis & Insights page.
+
+One pass over the data groups it by the low-cardinality dimensions the page
+slices on (State, plans, service calls, tenure bucket) and keeps, per observed
+cell, the row count and the number of churners. Any churn count or rate over a
+subset of those dimensions is then a roll-up of the cells, which costs
+O(cells) instead of O(rows). Cells hold exact integer counts, so sums match the
+per-row groupby exactly and rates are the same ``sum / count`` division pandas
+does for the mean of a boolean column.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from churn.dataset import CHURN_NUM
+
+DIMENSIONS = ["State", "International_plan", "Voice_mail_plan", "Customer_service_calls", "Tenure_Bucket"]
+# Tenure edges: (1, 50] New, (50, 150] Mid, above 150 Long. The page's pd.cut used the
+# data maximum as the last edge, which puts the same rows in "Long" and leaves
+# Account_length <= 1 unbucketed, so the bins stay valid as new rows arrive.
+TENURE_EDGES = [1, 50, 150, np.inf]
+TENURE_LABELS = ["New", "Mid", "Long"]
+TENURE_DTYPE = pd.CategoricalDtype(TENURE_LABELS, ordered=True)
+
+_lock = threading.Lock()
+_cubes = {}
+
+
+def tenure_dimension(account_length):
+    return pd.cut(account_length, bins=TENURE_EDGES, labels=TENURE_LABELS).rename("Tenure_Bucket")
+
+
+class ChurnCube:
+    def __init__(self, cells):
+        self.cells = cells
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(cls._aggregate(df))
+
+    @staticmethod
+    def _aggregate(df):
+        keys = [df[d] for d in DIMENSIONS if d != "Tenure_Bucket"] + [tenure_dimension(df["Account_length"])]
+        churn = df[CHURN_NUM if CHURN_NUM in df.columns else "Churn"].astype(np.int64)
+        grouped = churn.groupby(keys, observed=True, dropna=False)
+        cells = pd.DataFrame({"count": grouped.size(), "churn": grouped.sum()}).reset_index()
+        # Grouping with dropna=False loses the bucket order; restore it so roll-ups sort New < Mid < Long.
+        cells["Tenure_Bucket"] = cells["Tenure_Bucket"].astype(TENURE_DTYPE)
+        return cells
+
+    def update(self, new_rows):
+        """Fold newly arrived rows into the cube (cost: cells + new rows)."""
+        return self.merge(ChurnCube.from_frame(new_rows))
+
+    def merge(self, other):
+        """Add another cube's cells (e.g. from another chunk or worker) into this one."""
+        new = other.cells
+        columns = {}
+        for dim in DIMENSIONS:
+            old = self.cells[dim]
+            if dim == "Tenure_Bucket":
+                columns[dim] = pd.concat([old, new[dim]], ignore_index=True)
+            elif isinstance(old.dtype, pd.CategoricalDtype):
+                # Keep categorical keys (and their sorted order) when new rows bring new values.
+                columns[dim] = pd.Series(union_categoricals(
+                    [old, new[dim].astype("category")], sort_categories=True
+                ))
+            else:
+                columns[dim] = pd.concat([old, new[dim]], ignore_index=True)
+        merged = pd.DataFrame(columns).assign(
+            count=np.concatenate([self.cells["count"], new["count"]]),
+            churn=np.concatenate([self.cells["churn"], new["churn"]]),
+        )
+        cells = merged.groupby(DIMENSIONS, observed=True, dropna=False)[["count", "churn"]].sum().reset_index()
+        cells["Tenure_Bucket"] = cells["Tenure_Bucket"].astype(TENURE_DTYPE)
+        self.cells = cells
+        return self
+
+    @property
+    def n_rows(self):
+        return int(self.cells["count"].sum())
+
+    def rollup(self, dims, value="rate", name=CHURN_NUM, where=None):
+        """Churn ``rate``, ``sum`` or ``count`` per combination of ``dims``, like
+        ``df.groupby(dims)[name].mean()/.sum()/.size()``; ``where`` maps a dimension to allowed values.
+
+        Cells with a missing tenure bucket are dropped when grouping by Tenure_Bucket,
+        as groupby drops NaN keys.
+        """
+        cells = self.cells
+        if where:
+            mask = np.ones(len(cells), dtype=bool)
+            for dim, allowed in where.items():
+                mask &= cells[dim].isin(allowed).to_numpy()
+            cells = cells[mask]
+        totals = cells.groupby(list(dims), observed=True)[["count", "churn"]].sum()
+        if value == "rate":
+            result = totals["churn"] / totals["count"]
+        elif value == "sum":
+            result = totals["churn"]
+        elif value == "count":
+            result = totals["count"]
+        else:
+            raise ValueError(f"Unknown value {value!r}; expected 'rate', 'sum' or 'count'")
+        return result.rename(name).reset_index()
+
+
+def load_cube(df):
+    """Cube for the shared dataset frame ``df``, built once per frame."""
+    with _lock:
+        entry = _cubes.get(id(df))
+        if entry is None or entry[0] is not df:
+            _cubes.clear()
+            entry = _cubes[id(df)] = (df, ChurnCube.from_frame(df))
+        return entry[1]
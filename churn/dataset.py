@@ -0,0 +1,126 @@
+"""Shared, typed view of the bigml churn data for every page.
+
+The two raw CSVs are converted once into an uncompressed Arrow IPC file under
+``data/.cache`` with compact dtypes: categoricals for State and the plan flags,
+the smallest integer type that holds each count, floats downcast only where the
+values survive the round trip, and boolean ``Churn`` / ``_churn_num`` columns.
+The file records the size and mtime of its sources and is rebuilt when they
+change. It is opened memory-mapped, and one DataFrame per process is handed to
+every page and session, so callers must treat it as read-only.
+"""
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from churn.features import normalize_columns
+from churn.paths import ROOT, TEST_PATH, TRAIN_PATH
+
+CACHE_DIR = ROOT / "data" / ".cache"
+CATEGORY_COLUMNS = ["State", "International_plan", "Voice_mail_plan"]
+CHURN_NUM = "_churn_num"
+
+_lock = threading.Lock()
+_frames = {}
+
+
+# ========== CONVERSION ==========
+def as_bool(series):
+    if series.dtype == bool:
+        return series
+    return series.astype(str).str.lower().isin(["yes", "y", "true", "1"])
+
+
+def _downcast(df):
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLUMNS:
+            df[col] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            small = series.astype(np.float32)
+            if (small.astype(np.float64) == series).all():
+                df[col] = small
+    return df
+
+
+def read_sources(train_path=TRAIN_PATH, test_path=TEST_PATH):
+    """Parse and type both CSVs; returns the merged frame and the train row count."""
+    train_df = pd.read_csv(train_path)
+    test_df = pd.read_csv(test_path)
+    df = normalize_columns(pd.concat([train_df, test_df], ignore_index=True))
+    df["Churn"] = as_bool(df["Churn"])
+    # Kept boolean (as the analysis page always had it): sums come out int64, means float64.
+    df[CHURN_NUM] = df["Churn"].copy()
+    return _downcast(df), len(train_df)
+
+
+def source_stamp(paths):
+    return ";".join(f"{Path(p).resolve()}:{os.stat(p).st_size}:{os.stat(p).st_mtime_ns}" for p in paths)
+
+
+def cache_path(train_path=TRAIN_PATH, test_path=TEST_PATH):
+    return CACHE_DIR / f"{Path(train_path).stem}+{Path(test_path).stem}.arrow"
+
+
+def build_cache(train_path=TRAIN_PATH, test_path=TEST_PATH):
+    """Convert the CSVs into the Arrow cache file (written atomically) and return its path."""
+    df, n_train = read_sources(train_path, test_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"churn.sources": source_stamp([train_path, test_path]).encode(),
+        b"churn.n_train": str(n_train).encode(),
+    })
+    target = cache_path(train_path, test_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.tmp{os.getpid()}")
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, target)
+    return target
+
+
+def _cached_table(train_path, test_path):
+    target = cache_path(train_path, test_path)
+    stamp = source_stamp([train_path, test_path]).encode()
+    if target.exists():
+        table = feather.read_table(target, memory_map=True)
+        if table.schema.metadata.get(b"churn.sources") == stamp:
+            return table
+    return feather.read_table(build_cache(train_path, test_path), memory_map=True)
+
+
+# ========== ACCESS ==========
+def load_dataset(train_path=TRAIN_PATH, test_path=TEST_PATH):
+    """Merged train + test frame, shared by every caller in the process (do not mutate).
+
+    ``df.attrs["splits"]`` holds the (start, stop) row range of each source file.
+    """
+    key = source_stamp([train_path, test_path])
+    with _lock:
+        if key not in _frames:
+            _frames.clear()
+            table = _cached_table(train_path, test_path)
+            # split_blocks lets numeric columns without nulls stay views of the mapped file.
+            df = table.to_pandas(split_blocks=True)
+            n_train = int(table.schema.metadata[b"churn.n_train"])
+            df.attrs["splits"] = {"train": (0, n_train), "test": (n_train, len(df))}
+            _frames[key] = df
+        return _frames[key]
+
+
+def split(df, name):
+    """Rows of ``df`` that came from the "train" or "test" file."""
+    start, stop = df.attrs["splits"][name]
+    return df.iloc[start:stop]
+
+
+def data_columns(df):
+    """Columns of the source files, without helper columns such as ``_churn_num``."""
+    return [c for c in df.columns if not c.startswith("_")]
+
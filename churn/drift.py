@@ -0,0 +1,356 @@
+"""Drift monitor: live scoring traffic against the training distribution.
+
+Reference histograms of the 13 model inputs and of the predicted churn
+probability are computed once from the bigml CSVs, per model and data
+version. Numeric inputs are binned at reference deciles (repeated cut points
+collapse, so ``High_service_calls`` gets two bins). The plans get one bin per
+value plus an "unseen" bin for values the reference lacks (always empty in the
+reference, so they raise PSI). The same bins are used for live traffic.
+
+All bins of all features live in one flat count vector, so observing a batch of
+scored rows is one ``bincount``. The sliding window is a ring of ``BLOCKS``
+blocks of about ``window / BLOCKS`` rows. The window total gains each batch's
+counts, and a full oldest block is subtracted as it expires. An update
+therefore costs O(rows + bins) whatever the window size. PSI and a binned KS
+statistic (largest CDF gap at the bin edges) are read from the window total
+in O(bins).
+
+The scoring service, the prediction page and page batch scoring feed the
+process's monitor through ``observe``, which only queues the batch: binning
+happens on a daemon thread, so the scoring path does not wait for it. A batch
+that fails to bin is logged via ``logging`` and counted (``failed``).
+``instrument.prometheus_text`` exports the monitor as gauges
+(``churn_drift_psi``, ``churn_drift_ks``); the Drift Monitor page shows it.
+
+    python -m churn.drift data/new-month.csv     # replay an export and print the drift table
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from churn import instrument
+from churn.dataset import source_stamp
+from churn.features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS, to_model_frame
+from churn.paths import MODEL_PATH, TEST_PATH, TRAIN_PATH
+
+REFERENCE_SOURCES = [TRAIN_PATH, TEST_PATH]
+PROBA_FEATURE = "Churn_probability"
+DECILES = np.linspace(0.1, 0.9, 9)
+DEFAULT_WINDOW = int(os.environ.get("CHURN_DRIFT_WINDOW", 5000))  # rows in the sliding window
+BLOCKS = 10
+EPSILON = 1e-4  # floor on bin shares, so empty bins keep PSI finite
+PSI_MODERATE = 0.1  # usual reading: < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+PSI_SIGNIFICANT = 0.25
+
+MAX_PENDING = 256  # scored batches waiting for the monitor thread before new ones are dropped
+UNSEEN = "unseen"  # label of each plan's bin for values not in the reference
+
+_lock = threading.Lock()
+_monitors = {}
+_pending = queue.Queue(maxsize=MAX_PENDING)
+_worker = None
+_dropped = 0
+_failed = 0
+
+logger = logging.getLogger(__name__)
+
+
+# ========== BINS ==========
+class Bins:
+    """Per-feature bin edges / categories, and the flat layout of their counts."""
+
+    def __init__(self, edges):
+        self.edges = edges  # feature -> sorted cut points (numeric) or sorted categories
+        self.features = list(edges)
+        # Numeric: one bin per gap between cut points; categorical: one per category plus the unseen bin
+        sizes = [len(e) + 1 for e in edges.values()]
+        self.offsets = dict(zip(self.features, np.cumsum([0] + sizes[:-1])))
+        self.sizes = dict(zip(self.features, sizes))
+        self.n_bins = int(sum(sizes))
+        # Numeric features (and the probability) are binned together against one edge matrix padded with +inf
+        self.numeric = [f for f in self.features if f not in CATEGORICAL_COLUMNS]
+        self._edge_matrix = np.full((len(self.numeric), max(len(edges[f]) for f in self.numeric)), np.inf)
+        for j, feature in enumerate(self.numeric):
+            self._edge_matrix[j, :len(edges[feature])] = edges[feature]
+        self._numeric_offsets = np.array([self.offsets[f] for f in self.numeric])
+
+    @classmethod
+    def from_reference(cls, frame, proba):
+        edges = {}
+        for feature in FEATURE_COLUMNS:
+            if feature in CATEGORICAL_COLUMNS:
+                edges[feature] = sorted(frame[feature].unique())
+            else:
+                edges[feature] = np.unique(np.quantile(frame[feature].to_numpy(dtype=np.float64), DECILES))
+        edges[PROBA_FEATURE] = np.unique(np.quantile(proba, DECILES))
+        return cls(edges)
+
+    def counts(self, frame, proba):
+        """Flat counts of the rows of ``frame`` (model inputs) and their probabilities."""
+        # Column by column: selecting several DataFrame columns at once costs more than the binning
+        # for the service's small batches.
+        columns = dict(frame.items())
+        # The probability is the last numeric feature (see from_reference)
+        X = np.column_stack([columns[f].to_numpy(dtype=np.float64) for f in self.numeric[:-1]]
+                            + [np.asarray(proba, dtype=np.float64)])
+        # Edges below each value, i.e. searchsorted(edges, x, side="left"), for every feature at once
+        local = (X[:, :, None] > self._edge_matrix).sum(axis=2)
+        parts = [(local + self._numeric_offsets).ravel()]
+        for feature in CATEGORICAL_COLUMNS:
+            values = columns[feature].to_numpy()
+            categories = self.edges[feature]
+            bins = np.full(len(values), self.offsets[feature] + len(categories))  # the unseen bin
+            for code, category in enumerate(categories):
+                bins[values == category] = self.offsets[feature] + code
+            parts.append(bins)
+        return np.bincount(np.concatenate(parts), minlength=self.n_bins).astype(np.int64)
+
+    def labels(self, feature):
+        edges = self.edges[feature]
+        if feature in CATEGORICAL_COLUMNS:
+            return list(edges) + [UNSEEN]
+        return ([f"≤ {edges[0]:.4g}"] + [f"{a:.4g}–{b:.4g}" for a, b in zip(edges[:-1], edges[1:])]
+                + [f"> {edges[-1]:.4g}"])
+
+
+# ========== STATISTICS ==========
+def psi(reference, live):
+    """Population stability index of two count vectors over the same bins."""
+    p = np.maximum(reference / max(reference.sum(), 1), EPSILON)
+    q = np.maximum(live / max(live.sum(), 1), EPSILON)
+    return float(((q - p) * np.log(q / p)).sum())
+
+
+def binned_ks(reference, live):
+    """Largest gap between the two empirical CDFs, evaluated at the bin edges."""
+    p = np.cumsum(reference) / max(reference.sum(), 1)
+    q = np.cumsum(live) / max(live.sum(), 1)
+    return float(np.abs(p - q).max())
+
+
+def status(value):
+    if value >= PSI_SIGNIFICANT:
+        return "significant"
+    return "moderate" if value >= PSI_MODERATE else "stable"
+
+
+# ========== MONITOR ==========
+class DriftMonitor:
+    def __init__(self, bins, reference, window=DEFAULT_WINDOW, blocks=BLOCKS):
+        self.bins = bins
+        self.reference = reference  # flat reference counts
+        self.block_rows = max(1, window // blocks)
+        self.blocks = blocks
+        self._lock = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def from_frame(cls, frame, proba, window=DEFAULT_WINDOW):
+        """Monitor with bins and reference counts from model inputs ``frame`` and their probabilities."""
+        bins = Bins.from_reference(frame, proba)
+        return cls(bins, bins.counts(frame, proba), window)
+
+    def reset(self):
+        with self._lock:
+            self.window = np.zeros(self.bins.n_bins, dtype=np.int64)
+            self._ring = deque([[0, np.zeros(self.bins.n_bins, dtype=np.int64)]])  # [rows, counts] per block
+            self.rows = 0  # rows in the window
+            self.observed = 0  # rows since start
+
+    def observe(self, frame, proba):
+        """Add scored rows (model inputs and churn probabilities) to the window."""
+        counts = self.bins.counts(frame, proba)
+        n = len(frame)
+        with self._lock:
+            block = self._ring[-1]
+            block[0] += n
+            block[1] += counts
+            self.window += counts
+            self.rows += n
+            self.observed += n
+            if block[0] >= self.block_rows:
+                self._ring.append([0, np.zeros(self.bins.n_bins, dtype=np.int64)])
+                if len(self._ring) > self.blocks:
+                    rows, expired = self._ring.popleft()
+                    self.window -= expired
+                    self.rows -= rows
+
+    def _slice(self, counts, feature):
+        start = self.bins.offsets[feature]
+        return counts[start:start + self.bins.sizes[feature]]
+
+    def histograms(self, feature):
+        """Reference and window shares per bin of ``feature``."""
+        with self._lock:
+            live = self._slice(self.window, feature).copy()
+        reference = self._slice(self.reference, feature)
+        return pd.DataFrame({
+            "bin": self.bins.labels(feature),
+            "reference": reference / max(reference.sum(), 1),
+            "live": live / max(live.sum(), 1),
+        })
+
+    def report(self):
+        """PSI, binned KS and status per feature over the current window."""
+        with self._lock:
+            window = self.window.copy()
+        records = []
+        for feature in self.bins.features:
+            reference, live = self._slice(self.reference, feature), self._slice(window, feature)
+            value = psi(reference, live) if live.sum() else np.nan
+            records.append({
+                "feature": feature,
+                "psi": value,
+                "ks": binned_ks(reference, live) if live.sum() else np.nan,
+                "status": status(value) if live.sum() else "no data",
+            })
+        return pd.DataFrame(records)
+
+    def prometheus_lines(self):
+        report = self.report().dropna(subset=["psi"])
+        lines = [
+            "# HELP churn_drift_window_rows Scored rows in the drift monitor's sliding window.",
+            "# TYPE churn_drift_window_rows gauge",
+            f"churn_drift_window_rows {self.rows}",
+            "# HELP churn_drift_psi Population stability index of the window against the training data.",
+            "# TYPE churn_drift_psi gauge",
+        ]
+        lines += [f'churn_drift_psi{{feature="{r.feature}"}} {r.psi:.6g}' for r in report.itertuples()]
+        lines += [
+            "# HELP churn_drift_ks Largest binned CDF gap of the window against the training data.",
+            "# TYPE churn_drift_ks gauge",
+        ]
+        lines += [f'churn_drift_ks{{feature="{r.feature}"}} {r.ks:.6g}' for r in report.itertuples()]
+        lines += [
+            "# HELP churn_drift_dropped_batches_total Scored batches dropped because the monitor queue was full.",
+            "# TYPE churn_drift_dropped_batches_total counter",
+            f"churn_drift_dropped_batches_total {_dropped}",
+            "# HELP churn_drift_failed_batches_total Scored batches the monitor failed to bin (see the process log).",
+            "# TYPE churn_drift_failed_batches_total counter",
+            f"churn_drift_failed_batches_total {_failed}",
+        ]
+        return lines
+
+
+def reference_monitor(model_path=MODEL_PATH, sources=None, window=DEFAULT_WINDOW):
+    """Monitor whose reference is the model's inputs and probabilities on the training CSVs."""
+    from churn import model_store
+
+    sources = sources or REFERENCE_SOURCES
+    frame = to_model_frame(pd.concat([pd.read_csv(p) for p in sources], ignore_index=True))
+    proba = model_store.load_forest(model_path).predict_proba_frame(frame)[:, 1]
+    return DriftMonitor.from_frame(frame, proba, window)
+
+
+def get_monitor(model_path=MODEL_PATH):
+    """The process's monitor for ``model_path``, built once per model and data version.
+
+    The first call also registers it with ``churn.instrument`` for ``/metrics``.
+    """
+    key = source_stamp([model_path] + REFERENCE_SOURCES)
+    with _lock:
+        if key not in _monitors:
+            # Drop the monitor of an older version of the same model
+            for old in [k for k, m in _monitors.items() if m[0] == str(model_path)]:
+                del _monitors[old]
+            _monitors[key] = (str(model_path), reference_monitor(model_path))
+        monitor = _monitors[key][1]
+    instrument.register_collector("drift", monitor.prometheus_lines)
+    return monitor
+
+
+def _drain():
+    global _failed
+    while True:
+        model_path, frame, proba = _pending.get()
+        try:
+            get_monitor(model_path).observe(frame, proba)
+        except Exception:  # never let a bad batch stop the monitor
+            logger.exception("drift monitor failed to observe a batch of %d rows", len(frame))
+            _failed += 1
+        finally:
+            _pending.task_done()
+
+
+def observe(frame, proba, model_path=MODEL_PATH):
+    """Hand scored rows to the process's monitor without waiting for them to be binned.
+
+    A daemon thread does the binning (and builds the reference on first use), so the
+    scoring path only pays for a queue put. When ``MAX_PENDING`` batches are already
+    waiting the batch is dropped and counted in ``dropped()``. ``frame`` must not be
+    modified afterwards.
+    """
+    global _worker, _dropped
+    if _worker is None or not _worker.is_alive():
+        with _lock:
+            if _worker is None or not _worker.is_alive():
+                _worker = threading.Thread(target=_drain, name="churn-drift", daemon=True)
+                _worker.start()
+    try:
+        _pending.put_nowait((model_path, frame, proba))
+    except queue.Full:
+        _dropped += 1
+
+
+def flush():
+    """Wait until every handed-over batch has been added to its monitor."""
+    _pending.join()
+
+
+def dropped():
+    return _dropped
+
+
+def failed():
+    """Batches that raised while being binned; each one is logged via ``logging``."""
+    return _failed
+
+
+# ========== REPLAY ==========
+def replay(monitor, source, model_path=MODEL_PATH, batch=64, fmt=None):
+    """Score an export and feed it to ``monitor`` in ``batch``-row updates, as live traffic would.
+
+    Returns the mean seconds per update.
+    """
+    from churn import model_store
+    from churn.batch import iter_chunks
+
+    forest = model_store.load_forest(model_path)
+    seconds, updates = 0.0, 0
+    for chunk in iter_chunks(source, 10_000, fmt):
+        frame = to_model_frame(chunk)
+        proba = forest.predict_proba_frame(frame)[:, 1]
+        for start in range(0, len(frame), batch):
+            rows = frame.iloc[start:start + batch]
+            t = time.perf_counter()
+            monitor.observe(rows, proba[start:start + batch])
+            seconds += time.perf_counter() - t
+            updates += 1
+    return seconds / max(updates, 1)
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay an export through the drift monitor.")
+    parser.add_argument("source", help="raw bigml-style export (.csv or .parquet)")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW)
+    parser.add_argument("--batch", type=int, default=64, help="rows per observed batch, like the service")
+    args = parser.parse_args(argv)
+
+    monitor = reference_monitor(args.model, window=args.window)
+    per_update = replay(monitor, args.source, args.model, args.batch)
+    print(monitor.report().to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"{monitor.observed:,} rows observed, {monitor.rows:,} in the window; "
+          f"{per_update * 1e6:.0f} µs per {args.batch}-row update")
+
+
+if __name__ == "__main__":
+    main()
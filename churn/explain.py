@@ -0,0 +1,120 @@
+"""Per-prediction explanations from the forest's decision paths.
+
+``CompiledForest.contributions`` splits every predicted churn probability into
+a bias (the average tree root value, i.e. the resampled training churn rate)
+plus one exact contribution per model input, summed over the splits each row
+passes through in every tree. The compiled trees already test raw inputs, so
+the OrdinalEncoder and RobustScaler columns map one-to-one to the 13 inputs.
+
+    python -m churn.explain --rows 1000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from churn.features import FEATURE_COLUMNS
+
+CONTRIBUTION_PREFIX = "Contribution_"
+BASELINE_COLUMN = "Churn_baseline"
+
+
+def explain_frame(forest, df):
+    """(bias, DataFrame of contributions to the churn probability, one column per model input)."""
+    bias, contrib = forest.contributions(forest.encode(df))
+    return bias, pd.DataFrame(contrib, columns=FEATURE_COLUMNS, index=df.index)
+
+
+def contribution_columns(forest, df):
+    """Columns to append to a scored batch: ``Churn_baseline`` and ``Contribution_<input>``,
+    which add up to the churn probability on every row."""
+    bias, contrib = explain_frame(forest, df)
+    return contrib.add_prefix(CONTRIBUTION_PREFIX).assign(**{BASELINE_COLUMN: bias})
+
+
+def _format_value(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".") if isinstance(value, float) else str(value)
+
+
+def contribution_figure(bias, contrib, values, top=8):
+    """Horizontal bars for one row's largest contributions, labelled with the input values."""
+    contrib = contrib.reindex(contrib.abs().sort_values(ascending=False).index)
+    shown = contrib.head(top)
+    rest = contrib.iloc[top:].sum()
+    labels = [f"{c.replace('_', ' ')} = {_format_value(values[c])}" for c in shown.index]
+    amounts = shown.tolist()
+    if len(contrib) > top:
+        labels.append(f"{len(contrib) - top} other inputs")
+        amounts.append(rest)
+    fig = go.Figure(go.Bar(
+        x=amounts[::-1],
+        y=labels[::-1],
+        orientation="h",
+        marker_color=["#d62728" if a > 0 else "#2ca02c" for a in amounts[::-1]],
+        text=[f"{a:+.1%}" for a in amounts[::-1]],
+    ))
+    fig.update_layout(
+        title=f"Baseline {bias:.1%} + contributions = {bias + contrib.sum():.1%} churn probability",
+        xaxis_title="Change in churn probability",
+        xaxis_tickformat="+.0%",
+        height=120 + 36 * len(labels),
+    )
+    return fig
+
+
+def _path_walk(pipeline, df):
+    """Reference: walk sklearn's decision paths one row and tree at a time (slow, for checking)."""
+    from churn.compiled_forest import _split_pipeline
+
+    preprocessor, forest = _split_pipeline(pipeline)
+    Xt = preprocessor.transform(df).astype(np.float32)
+    names = [c for name, _, cols in preprocessor.transformers_ if name != "remainder" for c in cols]
+    out = np.zeros((len(df), len(FEATURE_COLUMNS)))
+    for est in forest.estimators_:
+        tree = est.tree_
+        value = tree.value[:, 0, 1]
+        paths = est.decision_path(Xt)
+        for r in range(len(df)):
+            nodes = paths.indices[paths.indptr[r]:paths.indptr[r + 1]]
+            for parent, child in zip(nodes[:-1], nodes[1:]):
+                out[r, FEATURE_COLUMNS.index(names[tree.feature[parent]])] += value[child] - value[parent]
+    return out / len(forest.estimators_)
+
+
+def main(argv=None):
+    from churn import model_store
+    from churn.features import to_model_frame
+    from churn.paths import TEST_PATH
+
+    parser = argparse.ArgumentParser(description="Time and check per-prediction contributions.")
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    forest = model_store.load_forest()
+    raw = pd.read_csv(TEST_PATH)
+    df = to_model_frame(raw.sample(args.rows, replace=args.rows > len(raw), random_state=0).reset_index(drop=True))
+
+    for n in (1, args.rows):
+        explain_frame(forest, df.head(n))
+        times = []
+        for _ in range(10):
+            start = time.perf_counter()
+            explain_frame(forest, df.head(n))
+            times.append(time.perf_counter() - start)
+        print(f"{n:>7,} rows  p50 {np.median(times) * 1e3:8.2f} ms  ({np.median(times) / n * 1e3:.3f} ms/row)")
+
+    bias, contrib = explain_frame(forest, df)
+    proba = forest.predict_proba_frame(df)[:, 1]
+    print(f"max |bias + sum(contrib) - proba|: {np.abs(bias + contrib.sum(axis=1) - proba).max():.2e}")
+    sample = df.head(5)
+    start = time.perf_counter()
+    reference = _path_walk(model_store.load_model(), sample)
+    walk_ms = (time.perf_counter() - start) / len(sample) * 1e3
+    print(f"max |contrib - sklearn path walk| (5 rows): {np.abs(reference - contrib.head(5).to_numpy()).max():.2e}"
+          f"  (path walk: {walk_ms:.1f} ms/row)")
+
+
+if __name__ == "__main__":
+    main()
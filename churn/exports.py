@@ -0,0 +1,116 @@
+"""On-demand, cached exports behind the download buttons.
+
+An export is a named table (an analysis result or a slice of the dataset) that
+is only serialized when someone asks for it. The encoded file is written in
+chunks to ``data/.cache/exports`` and keyed by export name, dataset version and
+format, so every later request for the same export and data is a file read.
+Formats: plain CSV, gzip-compressed CSV and Parquet.
+
+    python -m churn.exports intl_users --format parquet
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from churn.batch import ChunkWriter
+from churn.paths import ROOT
+
+EXPORT_DIR = ROOT / "data" / ".cache" / "exports"
+DEFAULT_CHUNKSIZE = 100_000
+# format -> (file suffix, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+_lock = threading.Lock()
+_building = {}
+
+
+def dataset_version(stamp):
+    """Short, filename-safe version for a source stamp (see ``churn.dataset.source_stamp``)."""
+    return hashlib.sha1(stamp.encode()).hexdigest()[:12]
+
+
+def export_path(name, version, fmt):
+    return EXPORT_DIR / f"{name}-{version}{FORMATS[fmt][0]}"
+
+
+def frame_chunks(df, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield ``df`` in row slices so large frames are encoded a chunk at a time."""
+    if len(df) == 0:
+        yield df
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def write_export(chunks, target, fmt):
+    """Encode an iterable of DataFrame chunks into ``target`` (written atomically)."""
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.name}.tmp{os.getpid()}-{threading.get_ident()}")
+    writer = ChunkWriter(tmp, fmt)
+    try:
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        finally:
+            writer.close()
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return target
+
+
+def get_export(name, version, fmt, chunks):
+    """Path of the encoded export, building it from ``chunks()`` on first request.
+
+    ``chunks`` is a zero-argument callable returning DataFrame chunks; it is not
+    called when the export already exists for this dataset version. Concurrent
+    requests for the same export wait for a single build.
+    """
+    target = export_path(name, version, fmt)
+    if target.exists():
+        return target
+    with _lock:
+        build_lock = _building.setdefault(target, threading.Lock())
+    with build_lock:
+        if not target.exists():
+            for old in EXPORT_DIR.glob(f"{name}-*{FORMATS[fmt][0]}"):
+                old.unlink(missing_ok=True)  # earlier dataset versions
+            write_export(chunks(), target, fmt)
+    return target
+
+
+def is_ready(name, version, fmt):
+    return export_path(name, version, fmt).exists()
+
+
+def main(argv=None):
+    from churn.dataset import data_columns, load_dataset, source_stamp
+    from churn.paths import TEST_PATH, TRAIN_PATH
+
+    parser = argparse.ArgumentParser(description="Build a dataset export the way the download buttons do.")
+    parser.add_argument("name", choices=["dataset", "intl_users"])
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    args = parser.parse_args(argv)
+
+    df = load_dataset()
+    if args.name == "intl_users":
+        df = df[df["International_plan"].astype(str).str.lower() == "yes"]
+    df = df[data_columns(df)]
+    version = dataset_version(source_stamp([TRAIN_PATH, TEST_PATH]))
+
+    for label in ("build", "cached"):
+        start = time.perf_counter()
+        path = get_export(f"cli_{args.name}", version, args.format, lambda: frame_chunks(df))
+        print(f"{label}: {path} ({path.stat().st_size:,} bytes) in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
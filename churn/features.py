@@ -0,0 +1,81 @@
+import numpy as np
+
+# ========== MODEL INPUTS ==========
+# Column order the saved pipeline was fitted on (ColumnTransformer.feature_names_in_).
+FEATURE_COLUMNS = [
+    "Account_length",
+    "International_plan",
+    "Voice_mail_plan",
+    "Number_vmail_messages",
+    "Total_day_charge",
+    "Total_eve_charge",
+    "Total_night_charge",
+    "Total_intl_minutes",
+    "Total_intl_calls",
+    "Total_intl_charge",
+    "Customer_service_calls",
+    "Total_charge",
+    "High_service_calls",
+]
+
+CATEGORICAL_COLUMNS = ["International_plan", "Voice_mail_plan"]
+
+# Raw inputs the app asks for; Total_charge and High_service_calls are derived.
+RAW_FEATURE_COLUMNS = [c for c in FEATURE_COLUMNS if c not in ("Total_charge", "High_service_calls")]
+
+HIGH_SERVICE_CALLS_THRESHOLD = 3
+
+# Domain of each raw input on the prediction page: (min, max) for sliders, choices for plans.
+INPUT_RANGES = {
+    "International_plan": ["No", "Yes"],
+    "Voice_mail_plan": ["No", "Yes"],
+    "Account_length": (1, 243),
+    "Number_vmail_messages": (0, 51),
+    "Total_day_charge": (0.0, 59.64),
+    "Total_eve_charge": (0.0, 30.91),
+    "Total_night_charge": (1.04, 17.77),
+    "Total_intl_minutes": (0.0, 20.0),
+    "Total_intl_calls": (0, 20),
+    "Total_intl_charge": (0.0, 5.4),
+    "Customer_service_calls": (0, 9),
+}
+
+
+def normalize_columns(df):
+    """Rename bigml-style headers ("Account length") to the model's names ("Account_length")."""
+    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
+    return df
+
+
+def derive_features(df):
+    """Add Total_charge and High_service_calls in place, the same way the notebook built them."""
+    df["Total_charge"] = (
+        df["Total_day_charge"] + df["Total_eve_charge"] + df["Total_night_charge"] + df["Total_intl_charge"]
+    )
+    df["High_service_calls"] = (df["Customer_service_calls"] > HIGH_SERVICE_CALLS_THRESHOLD).astype(np.int64)
+    return df
+
+
+def to_model_frame(df):
+    """Normalize, derive and select the 13 model inputs from a raw export chunk."""
+    df = derive_features(normalize_columns(df))
+    return df[FEATURE_COLUMNS]
+
+
+def build_input_frame(**values):
+    """One-row model input from the raw form values (keyword names match RAW_FEATURE_COLUMNS)."""
+    import pandas as pd  # not at module level: the prediction page draws its form before pandas is loaded
+
+    df = pd.DataFrame([{c: values[c] for c in RAW_FEATURE_COLUMNS}])
+    return derive_features(df)[FEATURE_COLUMNS]
+
+
+def churn_labels(proba, threshold=None):
+    """Class labels from a predict_proba matrix.
+
+    Without ``threshold`` identical to RandomForest.predict (argmax, ties -> 0); with one,
+    churn when ``proba[:, 1] >= threshold`` (the tuned operating point, see ``churn.thresholds``).
+    """
+    if threshold is None:
+        return (proba[:, 1] > proba[:, 0]).astype(np.int64)
+    return (proba[:, 1] >= threshold).astype(np.int64)
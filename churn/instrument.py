@@ -0,0 +1,310 @@
+"""Lightweight stage timers for the app pages and the scoring service.
+
+A page calls ``start_run(page)`` at the top of every rerun and wraps its hot
+stages (model load, DataFrame construction, model calls, data loading,
+aggregations, figure building) in ``with timed("stage"):``. Each stage records
+its wall time and the change in resident memory (sampled from
+``/proc/self/statm``, ``ru_maxrss`` elsewhere). ``finish_run()`` closes the
+rerun: the breakdown can be shown with ``sidebar_panel`` and is appended as
+one JSON line to ``CHURN_METRICS_LOG`` when that is set.
+
+Every (page, stage) also keeps a rolling window of its last ``WINDOW``
+durations for percentiles, plus cumulative sums and counts. ``prometheus_text``
+renders them in the Prometheus text format; set ``CHURN_METRICS_PORT`` to serve
+``/metrics`` (and ``/metrics.json``) from a background thread of the app
+process. The scoring service exposes the same text on its own ``/metrics``.
+Other modules add gauges to it with ``register_collector``.
+Set ``CHURN_INSTRUMENT=0`` to turn the timers into no-ops.
+
+    python -m churn.instrument --log data/.cache/metrics.jsonl   # percentiles from a JSON log
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+WINDOW = 1000  # durations kept per (page, stage) for the rolling percentiles
+QUANTILES = (0.5, 0.9, 0.99)
+RUN_STAGE = "rerun"  # the whole script run, recorded by finish_run
+
+_lock = threading.Lock()
+_local = threading.local()
+_windows = {}  # (page, stage) -> deque of seconds
+_totals = {}  # (page, stage) -> [count, seconds, rss delta bytes]
+_collectors = {}  # name -> callable returning extra Prometheus text lines (e.g. churn.drift)
+_server = None
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+_statm = (None, None)  # (pid, descriptor) of /proc/self/statm, reopened after a fork
+
+
+def enabled():
+    return os.environ.get("CHURN_INSTRUMENT", "1") != "0"
+
+
+def rss_bytes():
+    """Current resident set size of the process (peak RSS where /proc is unavailable)."""
+    global _statm
+    pid, fd = _statm
+    if pid != os.getpid():
+        # Kept open: re-reading one descriptor with pread is ~5x cheaper than opening the file per sample.
+        try:
+            fd = os.open("/proc/self/statm", os.O_RDONLY)
+        except OSError:
+            fd = None
+        _statm = (os.getpid(), fd)
+    if fd is not None:
+        return int(os.pread(fd, 128, 0).split()[1]) * _PAGE_SIZE
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# ========== RECORDING ==========
+@dataclass
+class Run:
+    page: str
+    started: float = field(default_factory=time.perf_counter)
+    rss_start: int = field(default_factory=rss_bytes)
+    stages: list = field(default_factory=list)  # dicts: stage, seconds, rss_delta
+    seconds: float = None
+
+    def frame(self):
+        """This rerun's stages in order, with times in milliseconds and memory in MB."""
+        import pandas as pd
+
+        df = pd.DataFrame(self.stages, columns=["stage", "seconds", "rss_delta"])
+        return pd.DataFrame({"Stage": df["stage"], "ms": df["seconds"] * 1e3, "RSS Δ (MB)": df["rss_delta"] / 2**20})
+
+
+def observe(page, stage, seconds, rss_delta=0):
+    """Add one measurement of ``stage`` (e.g. a start-up time taken outside ``timed``)."""
+    key = (page, stage)
+    with _lock:
+        window = _windows.get(key)
+        if window is None:
+            window = _windows[key] = deque(maxlen=WINDOW)
+            _totals[key] = [0, 0.0, 0]
+        window.append(seconds)
+        totals = _totals[key]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += rss_delta
+
+
+def start_run(page):
+    """Begin a rerun of ``page`` in this thread (an unfinished previous run is dropped)."""
+    _local.run = Run(page) if enabled() else None
+    if enabled() and os.environ.get("CHURN_METRICS_PORT"):
+        serve(int(os.environ["CHURN_METRICS_PORT"]))
+    return _local.run
+
+
+def current_run():
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def timed(stage, page=None):
+    """Time the block as ``stage`` of the current run (or of ``page`` outside a run)."""
+    if not enabled():
+        yield
+        return
+    run = current_run()
+    rss = rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        rss_delta = rss_bytes() - rss
+        if run is not None and page is None:
+            run.stages.append({"stage": stage, "seconds": seconds, "rss_delta": rss_delta})
+        observe(page or (run.page if run is not None else "-"), stage, seconds, rss_delta)
+
+
+def finish_run():
+    """Close the current run: record its total and append it to ``CHURN_METRICS_LOG`` if set."""
+    run = current_run()
+    if run is None or run.seconds is not None:
+        return run
+    run.seconds = time.perf_counter() - run.started
+    observe(run.page, RUN_STAGE, run.seconds, rss_bytes() - run.rss_start)
+    log = os.environ.get("CHURN_METRICS_LOG")
+    if log:
+        line = json.dumps({
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "page": run.page,
+            "seconds": run.seconds,
+            "rss": rss_bytes(),
+            "stages": run.stages,
+        })
+        with _lock, open(log, "a") as f:
+            f.write(line + "\n")
+    return run
+
+
+# ========== REPORTING ==========
+def percentiles():
+    """Rolling percentiles (seconds) per (page, stage), with cumulative count and mean RSS change."""
+    import pandas as pd
+
+    with _lock:
+        items = [(key, np.array(window), list(_totals[key])) for key, window in _windows.items()]
+    records = []
+    for (page, stage), window, (count, total, rss) in sorted(items, key=lambda item: item[0]):
+        record = {"page": page, "stage": stage, "count": count, "mean": total / count}
+        record.update({f"p{int(q * 100)}": float(np.quantile(window, q)) for q in QUANTILES})
+        record["max"] = float(window.max())
+        record["mean_rss_delta"] = rss / count
+        records.append(record)
+    return pd.DataFrame(records, columns=["page", "stage", "count", "mean"]
+                        + [f"p{int(q * 100)}" for q in QUANTILES] + ["max", "mean_rss_delta"])
+
+
+def snapshot():
+    """JSON-ready view of every stage's percentiles and the process RSS."""
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "pid": os.getpid(),
+        "rss": rss_bytes(),
+        "window": WINDOW,
+        "stages": percentiles().to_dict("records"),
+    }
+
+
+def register_collector(name, lines):
+    """Append ``lines()`` (Prometheus text lines) to ``prometheus_text``; a name registers once."""
+    with _lock:
+        _collectors[name] = lines
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Stage latencies as a Prometheus summary (rolling quantiles, cumulative sum/count) plus RSS."""
+    lines = [
+        "# HELP churn_stage_seconds Wall time of instrumented app stages.",
+        "# TYPE churn_stage_seconds summary",
+    ]
+    with _lock:
+        items = [(key, np.array(window), list(_totals[key])) for key, window in _windows.items()]
+    for (page, stage), window, (count, total, rss) in sorted(items, key=lambda item: item[0]):
+        labels = f'page="{_label(page)}",stage="{_label(stage)}"'
+        for q in QUANTILES:
+            lines.append(f'churn_stage_seconds{{{labels},quantile="{q}"}} {np.quantile(window, q):.6g}')
+        lines.append(f"churn_stage_seconds_sum{{{labels}}} {total:.6g}")
+        lines.append(f"churn_stage_seconds_count{{{labels}}} {count}")
+    lines += [
+        "# HELP churn_stage_rss_delta_bytes Cumulative change in resident memory across instrumented stages.",
+        "# TYPE churn_stage_rss_delta_bytes gauge",
+    ]
+    for (page, stage), _, (count, total, rss) in sorted(items, key=lambda item: item[0]):
+        lines.append(f'churn_stage_rss_delta_bytes{{page="{_label(page)}",stage="{_label(stage)}"}} {rss}')
+    lines += [
+        "# HELP churn_process_resident_bytes Resident set size of the process.",
+        "# TYPE churn_process_resident_bytes gauge",
+        f"churn_process_resident_bytes {rss_bytes()}",
+    ]
+    with _lock:
+        collectors = list(_collectors.values())
+    for collect in collectors:
+        lines += collect()
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, ctype = prometheus_text().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = json.dumps(snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # keep the app's console quiet
+        pass
+
+
+def serve(port, address="127.0.0.1"):
+    """Serve /metrics and /metrics.json from a daemon thread (once per process)."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((address, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="churn-metrics", daemon=True).start()
+    return _server
+
+
+# ========== STREAMLIT ==========
+def sidebar_panel():
+    """Finish the run and, if the sidebar toggle is on, show its breakdown and the rolling percentiles."""
+    import streamlit as st
+
+    run = finish_run()
+    if run is None or not st.sidebar.toggle("Performance panel", key="perf_panel"):
+        return
+    st.sidebar.caption(f"This rerun: {run.seconds * 1e3:.1f} ms · RSS {rss_bytes() / 2**20:.0f} MB")
+    st.sidebar.dataframe(run.frame(), hide_index=True, use_container_width=True,
+                         column_config={"ms": st.column_config.NumberColumn(format="%.2f"),
+                                        "RSS Δ (MB)": st.column_config.NumberColumn(format="%.2f")})
+    stats = percentiles()
+    stats = stats[stats["page"] == run.page].drop(columns=["page", "mean_rss_delta"])
+    for col in ["mean", "p50", "p90", "p99", "max"]:
+        stats[col] = stats[col] * 1e3
+    st.sidebar.caption(f"Rolling percentiles (ms, last {WINDOW} calls per stage, this process)")
+    st.sidebar.dataframe(stats, hide_index=True, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                        for c in ["mean", "p50", "p90", "p99", "max"]})
+    st.sidebar.download_button("Metrics (JSON)", json.dumps(snapshot(), indent=2), file_name="churn_metrics.json",
+                               mime="application/json", key="perf_json")
+
+
+# ========== LOG SUMMARY ==========
+def summarize_log(path):
+    """Percentiles (ms) per (page, stage) from a ``CHURN_METRICS_LOG`` file."""
+    import pandas as pd
+
+    records = []
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            records.append({"page": run["page"], "stage": RUN_STAGE, "seconds": run["seconds"]})
+            records.extend({"page": run["page"], "stage": s["stage"], "seconds": s["seconds"]} for s in run["stages"])
+    df = pd.DataFrame(records)
+    grouped = df.groupby(["page", "stage"])["seconds"]
+    out = grouped.count().rename("count").to_frame()
+    for q in QUANTILES:
+        out[f"p{int(q * 100)}_ms"] = grouped.quantile(q) * 1e3
+    return out.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a stage timing log written with CHURN_METRICS_LOG.")
+    parser.add_argument("--log", required=True)
+    args = parser.parse_args(argv)
+    print(summarize_log(args.log).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
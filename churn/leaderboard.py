@@ -0,0 +1,415 @@
+"""Customer risk leaderboard: incremental rescoring and top-K queries.
+
+The leaderboard keeps, per customer slot, the export key (a key column, or the
+row number when the export has none), a hash of the row's State and model
+inputs, the churn probability and the customer's segment. A segment is one
+(State, International_plan, Voice_mail_plan) combination, and each segment
+keeps its customers in a sorted ``uint64`` array of
+
+    (inverted float32 probability << 32) | slot
+
+so ascending order is highest risk first, ties broken by slot. ``update``
+reads a new export in chunks, hashes every row and sends only new or changed
+rows through the model. Their old entries are removed from, and the new ones
+inserted into, the touched segments with ``searchsorted``. Customers missing
+from the export are dropped. A different model file rescores everything.
+
+A query with any filter is a union of segments. All customers are also kept in
+one global sorted array. Pages are read as follows:
+- Unfiltered: sliced straight from the global array.
+- Filtered: merged from the first ``offset + limit`` entries of each matching
+  segment, or scanned from the global array until the page is filled. The
+  scan reads about ``(offset + limit) / share`` keys, where ``share`` is the
+  filter's fraction of all customers. Whichever reads fewer keys is used, so
+  a plan filter alone no longer merges ``offset + limit`` keys from each of
+  up to 204 segments.
+
+    python -m churn.leaderboard update data/churn-bigml-80.csv data/churn-bigml-20.csv
+    python -m churn.leaderboard top --state WV --international-plan Yes --limit 20
+    python -m churn.leaderboard check        # one slot per customer, segments sorted and complete
+"""
+import argparse
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from churn.batch import DEFAULT_CHUNKSIZE, PROBA_COLUMN, iter_chunks
+from churn.dataset import CACHE_DIR, as_bool, source_stamp
+from churn.features import RAW_FEATURE_COLUMNS, normalize_columns, to_model_frame
+from churn.paths import MODEL_PATH, TEST_PATH, TRAIN_PATH
+
+LEADERBOARD_PATH = CACHE_DIR / "leaderboard.npz"
+DEFAULT_SOURCES = [TRAIN_PATH, TEST_PATH]
+FILTER_COLUMNS = ["State", "International_plan", "Voice_mail_plan"]
+HASH_COLUMNS = ["State"] + RAW_FEATURE_COLUMNS
+KEY_COLUMN = "Customer"  # result column holding the export key (or row number)
+SLOT_MASK = np.uint64(0xFFFFFFFF)
+MAX_LIMIT = 1000  # customers per page
+PLAN_VALUES = {"yes": 1, "no": 0, "true": 1, "false": 0}
+
+_lock = threading.Lock()
+_boards = {}
+
+
+def _plan_flag(name, value):
+    """1 / 0 for a plan filter given as a bool or Yes/No (true/false); ValueError otherwise."""
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    flag = PLAN_VALUES.get(str(value).strip().lower())
+    if flag is None:
+        raise ValueError(f"{name} must be Yes or No, got {value!r}")
+    return flag
+
+
+# ========== SORT KEYS ==========
+def sort_keys(proba, slots):
+    """Keys that sort highest probability first, then by slot (probabilities are in [0, 1])."""
+    score = np.asarray(proba, dtype=np.float32).view(np.uint32)  # monotonic for non-negative floats
+    return ((SLOT_MASK - score.astype(np.uint64)) << np.uint64(32)) | np.asarray(slots, dtype=np.uint64)
+
+
+def decode_keys(keys):
+    """(probabilities, slots) of sort keys."""
+    score = (SLOT_MASK - (keys >> np.uint64(32))).astype(np.uint32)
+    return score.view(np.float32), (keys & SLOT_MASK).astype(np.int64)
+
+
+def _apply(segment, removed, added):
+    """Sorted ``segment`` without the ``removed`` keys and with the ``added`` keys."""
+    if len(removed):
+        segment = np.delete(segment, np.searchsorted(segment, np.sort(removed)))
+    if len(added):
+        added = np.sort(added)
+        segment = np.insert(segment, np.searchsorted(segment, added), added)
+    return segment
+
+
+@dataclass
+class UpdateStats:
+    rows: int = 0  # rows in the export
+    rescored: int = 0  # new or changed rows sent through the model
+    added: int = 0  # customers not on the leaderboard before
+    removed: int = 0  # customers missing from the export
+    seconds: float = 0.0
+
+
+# ========== LEADERBOARD ==========
+class Leaderboard:
+    def __init__(self, key_column=None, model_stamp="", states=None, keys=None, hashes=None, proba=None,
+                 segment=None, alive=None, index=None, order=None):
+        self.key_column = key_column  # None: customers are identified by row number
+        self.model_stamp = model_stamp
+        self.states = list(states or [])
+        self.keys = keys if keys is not None else np.empty(0, np.int64)
+        self.hashes = hashes if hashes is not None else np.empty(0, np.uint64)
+        self.proba = proba if proba is not None else np.empty(0, np.float32)
+        self.segment = segment if segment is not None else np.empty(0, np.int32)
+        self.alive = alive if alive is not None else np.empty(0, bool)
+        self.index = index if index is not None else []  # segment -> sorted uint64 sort keys
+        # every live customer's sort key, sorted (all segments together)
+        self.order = order if order is not None else np.sort(np.concatenate(self.index or [np.empty(0, np.uint64)]))
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    # ---------- segments ----------
+    def _state_codes(self, states):
+        codes = pd.Categorical(states, categories=self.states).codes
+        if (codes < 0).any():
+            self.states += sorted(set(states[codes < 0].astype(str)) - set(self.states))
+            codes = pd.Categorical(states, categories=self.states).codes
+            self.index += [np.empty(0, np.uint64) for _ in range(4 * len(self.states) - len(self.index))]
+        return codes.astype(np.int32)
+
+    def _segments_of(self, chunk):
+        intl = as_bool(chunk["International_plan"]).to_numpy(dtype=np.int32)
+        voice_mail = as_bool(chunk["Voice_mail_plan"]).to_numpy(dtype=np.int32)
+        return self._state_codes(chunk["State"].astype(str).to_numpy()) * 4 + intl * 2 + voice_mail
+
+    def segments(self, states=None, international_plan=None, voice_mail_plan=None):
+        """Segment ids matching the filters (None = any; plans as "Yes"/"No" or bools)."""
+        codes = range(len(self.states)) if not states else [self.states.index(s) for s in states if s in self.states]
+        plans = [[0, 1] if p is None else [_plan_flag(name, p)]
+                 for name, p in (("international_plan", international_plan), ("voice_mail_plan", voice_mail_plan))]
+        return [c * 4 + i * 2 + v for c in codes for i in plans[0] for v in plans[1]]
+
+    # ---------- update ----------
+    def _slots(self, keys, lookup):
+        if self.key_column is None:
+            return np.where(keys < len(self.keys), keys, -1)
+        return lookup.get_indexer(keys)
+
+    def update(self, model, sources, chunksize=DEFAULT_CHUNKSIZE, model_stamp="", progress=None):
+        """Fold a new export (one or more files, in order) into the leaderboard; returns UpdateStats."""
+        stats = UpdateStats()
+        start = time.perf_counter()
+        full = model_stamp != self.model_stamp
+        n_old = len(self.keys)
+        seen = np.zeros(n_old, dtype=bool)
+        touched = np.zeros(n_old, dtype=bool)  # slots rescored by this export
+        removed, added = {}, {}  # segment -> list of sort key arrays
+        appended = []  # (keys, hashes, proba, segment) of new customers, in slot order
+        new_slots = {}  # key -> slot of the customers this export added, for keys that repeat
+        lookup = pd.Index(self.keys) if self.key_column is not None else None
+
+        def collect(target, segments, keys):
+            for seg in np.unique(segments):
+                target.setdefault(seg, []).append(keys[segments == seg])
+
+        for chunk in (c for source in sources for c in iter_chunks(source, chunksize)):
+            chunk = normalize_columns(chunk)
+            stats.rows += len(chunk)
+            if self.key_column is not None:
+                # A customer listed twice is one customer; its last row wins
+                chunk = chunk.drop_duplicates(self.key_column, keep="last")
+            keys = (chunk[self.key_column].to_numpy() if self.key_column is not None
+                    else np.arange(stats.rows - len(chunk), stats.rows, dtype=np.int64))
+            hashes = pd.util.hash_pandas_object(chunk[HASH_COLUMNS], index=False).to_numpy()
+            slots = self._slots(keys, lookup)
+            if new_slots:
+                unknown = np.flatnonzero(slots < 0)
+                slots[unknown] = [new_slots.get(k, -1) for k in keys[unknown].tolist()]
+            old = (slots >= 0) & (slots < n_old)
+            seen[slots[old]] = True
+            changed = np.ones(len(slots), dtype=bool)  # new, and repeats of customers added earlier in the export
+            if not full:
+                changed[old] = (hashes[old] != self.hashes[slots[old]]) | ~self.alive[slots[old]]
+            if not changed.any():
+                continue
+
+            rows = chunk[changed]
+            proba = model.predict_proba(to_model_frame(rows.copy()))[:, 1].astype(np.float32)
+            segments = self._segments_of(rows)
+            slots, keys, hashes = slots[changed], keys[changed], hashes[changed]
+            stats.rescored += len(rows)
+
+            # Changed customers: drop the entry they had before this export (once), overwrite the slot
+            old = (slots >= 0) & (slots < n_old)
+            first = slots[old][~touched[slots[old]]]
+            first = first[self.alive[first]]
+            collect(removed, self.segment[first], sort_keys(self.proba[first], first))
+            touched[slots[old]] = True
+            self.hashes[slots[old]] = hashes[old]
+            self.proba[slots[old]] = proba[old]
+            self.segment[slots[old]] = segments[old]
+            self.alive[slots[old]] = True
+
+            # Customers added by an earlier chunk of this export: overwrite their pending row
+            again = slots >= n_old
+            if again.any():
+                starts = np.cumsum([n_old] + [len(a[0]) for a in appended])
+                for slot, values in zip(slots[again], zip(hashes[again], proba[again], segments[again])):
+                    i = int(np.searchsorted(starts, slot, side="right")) - 1
+                    for array, value in zip(appended[i][1:], values):
+                        array[slot - starts[i]] = value
+
+            # New customers get the next free slots
+            new = slots < 0
+            first = n_old + sum(len(a[0]) for a in appended)
+            slots[new] = np.arange(first, first + new.sum())
+            appended.append((keys[new], hashes[new], proba[new], segments[new]))
+            if self.key_column is not None:
+                new_slots.update(zip(keys[new].tolist(), slots[new].tolist()))
+            stats.added += int(new.sum())
+            if progress is not None:
+                stats.seconds = time.perf_counter() - start
+                progress(stats)
+
+        # Customers missing from this export
+        gone = np.flatnonzero(self.alive[:n_old] & ~seen)
+        collect(removed, self.segment[gone], sort_keys(self.proba[gone], gone))
+        self.alive[gone] = False
+        stats.removed = len(gone)
+
+        if appended:
+            self.keys = np.concatenate([self.keys] + [a[0] for a in appended])
+            self.hashes = np.concatenate([self.hashes] + [a[1] for a in appended])
+            self.proba = np.concatenate([self.proba] + [a[2] for a in appended])
+            self.segment = np.concatenate([self.segment] + [a[3] for a in appended])
+            self.alive = np.concatenate([self.alive, np.ones(sum(len(a[0]) for a in appended), dtype=bool)])
+        # The final entry of every rescored or new customer
+        fresh = np.r_[np.flatnonzero(touched), np.arange(n_old, len(self.keys))]
+        collect(added, self.segment[fresh], sort_keys(self.proba[fresh], fresh))
+        for seg in set(removed) | set(added):
+            self.index[seg] = _apply(self.index[seg],
+                                     np.concatenate(removed.get(seg, [np.empty(0, np.uint64)])),
+                                     np.concatenate(added.get(seg, [np.empty(0, np.uint64)])))
+        self.order = _apply(self.order,
+                            np.concatenate([k for keys in removed.values() for k in keys] or [np.empty(0, np.uint64)]),
+                            np.concatenate([k for keys in added.values() for k in keys] or [np.empty(0, np.uint64)]))
+        self.model_stamp = model_stamp
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    # ---------- queries ----------
+    def count(self, **filters):
+        return sum(len(self.index[s]) for s in self.segments(**filters))
+
+    def top(self, limit=50, offset=0, **filters):
+        """Customers ranked ``offset + 1`` .. ``offset + limit`` by churn probability within the filters.
+
+        ``limit`` is clamped to 1 .. MAX_LIMIT and ``offset`` to >= 0.
+        """
+        limit, offset = min(max(int(limit), 1), MAX_LIMIT), max(int(offset), 0)
+        segments, n = self.segments(**filters), offset + limit
+        sizes = [len(self.index[s]) for s in segments]
+        # Keys read by a merge of the segment heads vs a scan of the global order
+        merge, scan = sum(min(size, n) for size in sizes), n * len(self.order) / max(sum(sizes), 1)
+        if len(segments) == len(self.index):
+            keys = self.order[offset:n]
+        elif merge <= 2 * scan:
+            heads = [self.index[s][:n] for s in segments]
+            keys = np.sort(np.concatenate(heads or [np.empty(0, np.uint64)]))[offset:n]
+        else:
+            keys = self._scan(segments, n, int(scan * 1.25) + 1024)[offset:n]
+        proba, slots = decode_keys(keys)
+        segment = self.segment[slots]
+        return pd.DataFrame({
+            "Rank": np.arange(offset + 1, offset + 1 + len(keys)),
+            KEY_COLUMN: self.keys[slots],
+            "State": np.array(self.states, dtype=object)[segment // 4] if len(slots) else [],
+            "International_plan": np.where(segment // 2 % 2, "Yes", "No"),
+            "Voice_mail_plan": np.where(segment % 2, "Yes", "No"),
+            PROBA_COLUMN: proba.astype(np.float64),
+        })
+
+    def _scan(self, segments, n, block):
+        """The first ``n`` sort keys of ``segments``, read from the global order in doubling blocks."""
+        allowed = np.zeros(len(self.index), dtype=bool)
+        allowed[segments] = True
+        found, pos = [], 0
+        while pos < len(self.order) and sum(len(f) for f in found) < n:
+            chunk = self.order[pos:pos + block]
+            found.append(chunk[allowed[self.segment[(chunk & SLOT_MASK).astype(np.int64)]]])
+            pos, block = pos + block, block * 2
+        return np.concatenate(found or [np.empty(0, np.uint64)])[:n]
+
+    def check(self):
+        """Broken invariants as messages (empty when the leaderboard is consistent)."""
+        problems = []
+        if self.key_column is not None and pd.Index(self.keys).has_duplicates:
+            problems.append(f"{int(pd.Index(self.keys).duplicated().sum())} customer keys hold more than one slot")
+        live = np.flatnonzero(self.alive)
+        entries = np.concatenate(self.index or [np.empty(0, np.uint64)])
+        if not np.array_equal(np.sort(entries), np.sort(sort_keys(self.proba[live], live))):
+            problems.append(f"{len(entries):,} segment entries for {len(live):,} live customers, or stale probabilities")
+        if not np.array_equal(self.order, np.sort(entries)):
+            problems.append("the global order does not match the segments")
+        for seg, keys in enumerate(self.index):
+            if (keys[1:] < keys[:-1]).any():
+                problems.append(f"segment {seg} is not sorted")
+            if (self.segment[decode_keys(keys)[1]] != seg).any():
+                problems.append(f"segment {seg} holds customers of other segments")
+        return problems
+
+    # ---------- persistence ----------
+    def save(self, path=LEADERBOARD_PATH):
+        """Write the leaderboard to one ``.npz`` file (atomically)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sizes = np.array([len(s) for s in self.index], dtype=np.int64)
+        keys = self.keys if self.keys.dtype != object else self.keys.astype(str)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}.npz")
+        np.savez(tmp, key_column=np.array(self.key_column or ""), model_stamp=np.array(self.model_stamp),
+                 states=np.array(self.states, dtype=str), keys=keys, hashes=self.hashes, proba=self.proba,
+                 segment=self.segment, alive=self.alive, index=np.concatenate(self.index or [np.empty(0, np.uint64)]),
+                 sizes=sizes, order=self.order)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=LEADERBOARD_PATH):
+        with np.load(path) as f:
+            bounds = np.cumsum(np.r_[0, f["sizes"]])
+            index = f["index"]
+            return cls(key_column=str(f["key_column"]) or None, model_stamp=str(f["model_stamp"]),
+                       states=f["states"].tolist(), keys=f["keys"], hashes=f["hashes"], proba=f["proba"],
+                       segment=f["segment"], alive=f["alive"],
+                       index=[index[a:b] for a, b in zip(bounds[:-1], bounds[1:])],
+                       order=f["order"] if "order" in f.files else None)
+
+
+def load_leaderboard(path=LEADERBOARD_PATH):
+    """The saved leaderboard, read once per process and file version (None if never built)."""
+    path = Path(path).resolve()
+    if not path.exists():
+        return None
+    key = (path, path.stat().st_mtime_ns)
+    with _lock:
+        if key not in _boards:
+            _boards.clear()
+            _boards[key] = Leaderboard.load(path)
+        return _boards[key]
+
+
+def update_leaderboard(sources=None, path=LEADERBOARD_PATH, model_path=MODEL_PATH, key_column=None,
+                       chunksize=DEFAULT_CHUNKSIZE, progress=None):
+    """Load (or start) the saved leaderboard, fold ``sources`` into it and save it; returns UpdateStats."""
+    from churn import model_store
+
+    sources = sources or DEFAULT_SOURCES
+    with _lock:
+        board = Leaderboard.load(path) if Path(path).exists() else Leaderboard(key_column=key_column)
+    if board.key_column != key_column:
+        raise ValueError(f"Leaderboard at {path} is keyed by {board.key_column or 'row number'}, "
+                         f"not {key_column or 'row number'}")
+    stats = board.update(model_store.load_model(model_path), sources, chunksize,
+                         model_stamp=source_stamp([model_path]), progress=progress)
+    board.save(path)
+    return stats
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and query the customer risk leaderboard.")
+    parser.add_argument("--path", default=str(LEADERBOARD_PATH), help="leaderboard file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("update", help="rescore new or changed customers from an export")
+    p.add_argument("sources", nargs="*", help="export files read in order (default: the bigml CSVs)")
+    p.add_argument("--key", help="customer id column (default: row number)")
+    p.add_argument("--model", default=str(MODEL_PATH))
+    p.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+
+    sub.add_parser("check", help="verify the saved leaderboard's invariants (one slot per customer, sorted segments)")
+
+    p = sub.add_parser("top", help="print a page of the highest-risk customers")
+    p.add_argument("--state", nargs="*")
+    p.add_argument("--international-plan", choices=["Yes", "No"])
+    p.add_argument("--voice-mail-plan", choices=["Yes", "No"])
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--offset", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        stats = update_leaderboard(args.sources or None, args.path, args.model, args.key, args.chunksize)
+        print(f"{stats.rows:,} rows: {stats.rescored:,} rescored ({stats.added:,} new), "
+              f"{stats.removed:,} removed in {stats.seconds:.2f}s -> {args.path}")
+        return
+    board = load_leaderboard(args.path)
+    if board is None:
+        raise SystemExit(f"No leaderboard at {args.path}; run `python -m churn.leaderboard update` first")
+    if args.command == "check":
+        problems = board.check()
+        for problem in problems:
+            print(problem)
+        if problems:
+            raise SystemExit(1)
+        print(f"{len(board):,} customers in {sum(len(s) > 0 for s in board.index)} segments: consistent")
+        return
+    filters = {"states": args.state, "international_plan": args.international_plan,
+               "voice_mail_plan": args.voice_mail_plan}
+    start = time.perf_counter()
+    page = board.top(args.limit, args.offset, **filters)
+    elapsed = time.perf_counter() - start
+    print(page.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"{board.count(**filters):,} customers match; page served in {elapsed * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
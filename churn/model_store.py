@@ -0,0 +1,141 @@
+"""Process-wide model cache shared by the app pages, the batch scorer and the service.
+
+Models are cached per (resolved path, mtime), so Streamlit reruns never deserialize
+the pipeline again and a retrained file on disk is picked up on the next call.
+
+The interactive path uses the compiled forest (see ``churn.compiled_forest``)
+opened with ``mmap_mode="r"``: its node arrays are read-only mappings of the
+``.npy`` files, so every replica process on a host shares one physical copy through
+the page cache instead of holding a private unpickled forest.
+
+    python -m churn.model_store            # print resident memory per loaded model
+"""
+import argparse
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from churn.compiled_forest import ARRAY_NAMES, load_or_compile
+from churn.features import FEATURE_COLUMNS
+from churn.paths import MODEL_PATH
+
+_lock = threading.Lock()
+_pipelines = {}
+_forests = {}
+
+
+def _cache_key(path):
+    path = Path(path).resolve()
+    return path, path.stat().st_mtime_ns
+
+
+def _get(cache, path, loader):
+    key = _cache_key(path)
+    with _lock:
+        if key not in cache:
+            # Drop older versions of the same file so a retrain doesn't leak the old model.
+            for old in [k for k in cache if k[0] == key[0]]:
+                del cache[old]
+            cache[key] = loader(key[0])
+        return cache[key]
+
+
+def load_model(path=MODEL_PATH):
+    """The fitted sklearn/imblearn pipeline, deserialized once per process and file version."""
+    import joblib  # unpickling imports sklearn and imblearn; only paths that need the pipeline pay for it
+
+    return _get(_pipelines, path, joblib.load)
+
+
+def load_forest(path=MODEL_PATH):
+    """The memory-mapped compiled forest for ``path``, exported on first use if needed."""
+    def loader(resolved):
+        key = _cache_key(resolved)
+        return load_or_compile(resolved, pipeline=_pipelines.get(key), mmap_mode="r")
+
+    return _get(_forests, path, loader)
+
+
+def clear():
+    with _lock:
+        _pipelines.clear()
+        _forests.clear()
+
+
+# ========== MEMORY REPORT ==========
+def _mapped_memory():
+    """Rss/Pss in bytes per mapped file of this process, from /proc/self/smaps (Linux only)."""
+    usage = {}
+    try:
+        lines = Path("/proc/self/smaps").read_text().splitlines()
+    except OSError:
+        return usage
+    current = None
+    for line in lines:
+        parts = line.split()
+        if not parts:
+            continue
+        if not parts[0].endswith(":"):
+            current = parts[5] if len(parts) > 5 else None
+            continue
+        if current and parts[0] in ("Rss:", "Pss:"):
+            entry = usage.setdefault(current, {"rss": 0, "pss": 0})
+            entry[parts[0][:-1].lower()] += int(parts[1]) * 1024
+    return usage
+
+
+def _pipeline_bytes(pipeline):
+    """Approximate heap bytes held by the forest's node and value arrays."""
+    forest = pipeline.steps[-1][1]
+    total = 0
+    for est in getattr(forest, "estimators_", []):
+        tree = est.tree_
+        total += tree.value.nbytes + tree.node_count * 64  # sizeof(Node) in sklearn's Tree
+    return total
+
+
+def memory_report():
+    """One dict per loaded model: path, kind, heap bytes, and mapped Rss/Pss.
+
+    Pss divides shared pages between the processes mapping them, so with N
+    replicas the forest's Pss is roughly its Rss / N.
+    """
+    mapped = _mapped_memory()
+    report = []
+    with _lock:
+        for (path, mtime), pipeline in _pipelines.items():
+            report.append({"path": str(path), "mtime_ns": mtime, "kind": "pipeline",
+                           "heap_bytes": _pipeline_bytes(pipeline), "mapped_bytes": 0,
+                           "rss_bytes": None, "pss_bytes": None})
+        for (path, mtime), forest in _forests.items():
+            # The export this forest was loaded from (memory-mapped arrays carry their file name)
+            files = [str(getattr(getattr(forest, name), "filename", "")) for name in ARRAY_NAMES]
+            report.append({
+                "path": str(path),
+                "mtime_ns": mtime,
+                "kind": "compiled_forest",
+                "heap_bytes": 0,
+                "mapped_bytes": sum(getattr(forest, name).nbytes for name in ARRAY_NAMES),
+                "rss_bytes": sum(mapped.get(f, {}).get("rss", 0) for f in files),
+                "pss_bytes": sum(mapped.get(f, {}).get("pss", 0) for f in files),
+            })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the model through the store and print its memory use.")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="path to the saved pipeline")
+    parser.add_argument("--pipeline", action="store_true", help="also load the full sklearn pipeline")
+    args = parser.parse_args(argv)
+
+    if args.pipeline:
+        load_model(args.model)
+    # Score one row so the mapped pages the traversal touches show up as resident.
+    load_forest(args.model).predict_proba(np.zeros((1, len(FEATURE_COLUMNS))))
+    for entry in memory_report():
+        print(", ".join(f"{k}={v}" for k, v in entry.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+from pathlib import Path
+
+# Paths are resolved against the repo root so scripts work from any working directory.
+ROOT = Path(__file__).resolve().parent.parent
+
+MODEL_PATH = ROOT / "model" / "Telecome_Churn_Prediction.joblib"
+TRAIN_PATH = ROOT / "data" / "churn-bigml-80.csv"
+TEST_PATH = ROOT / "data" / "churn-bigml-20.csv"
+VERSIONS_DIR = ROOT / "model" / "versions"
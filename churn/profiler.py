@@ -0,0 +1,329 @@
+"""Single-pass, mergeable data profile for the Data Information page.
+
+The notebook profiled the data with many full scans (``describe``, null counts,
+``value_counts``, ``nunique``, IQR outlier counts, the correlation matrix).
+Here every chunk of the raw CSVs is reduced once to a ``DataProfile`` of
+mergeable summaries:
+
+- per numeric column: Welford moments (count, mean, M2, merged with Chan's
+  formula), a quantile sketch for min / quartiles / max and for outlier counts
+  against the 1.5 IQR fences, and a HyperLogLog distinct count;
+- per categorical column: a HyperLogLog distinct count;
+- per column with at most ``MAX_EXACT_VALUES`` distinct values: exact value
+  counts (dropped once a column has more);
+- null counts, and rows per source file;
+- the co-moment matrix of the numeric columns plus Churn (as 0/1) over rows
+  with no missing numeric value, for the correlation matrix.
+
+Profiles merge associatively, so chunks can be reduced in a process pool and
+combined in any order; memory is bounded by ``chunksize`` and the number of
+columns, whatever the export size.
+
+    python -m churn.profiler --workers 2 --check
+"""
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from churn.dataset import source_stamp
+from churn.sketches import DistinctSketch, QuantileSketch
+from churn.streaming import DEFAULT_CHUNKSIZE, DEFAULT_SOURCES, prepare_chunk
+
+MAX_EXACT_VALUES = 64  # value_counts are kept exactly up to this many distinct values per column
+TARGET = "Churn"
+OUTLIER_IQR = 1.5  # Tukey fences, as datasist's detect_outliers in the notebook
+
+_lock = threading.Lock()
+_profiles = {}
+
+
+# ========== MERGEABLE SUMMARIES ==========
+@dataclass
+class Moments:
+    """Count, mean and sum of squared deviations (M2) of one column."""
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    @classmethod
+    def of(cls, values):
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def merge(self, other):
+        n = self.n + other.n
+        if other.n:
+            delta = other.mean - self.mean
+            self.mean += delta * other.n / n
+            self.m2 += other.m2 + delta * delta * self.n * other.n / n
+            self.n = n
+        return self
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1), as ``DataFrame.describe``."""
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+
+@dataclass
+class CoMoments:
+    """Count, mean vector and co-moment matrix sum((x - mean)(x - mean)^T) of several columns."""
+    n: int = 0
+    mean: np.ndarray = None
+    c: np.ndarray = None
+
+    @classmethod
+    def of(cls, X):
+        mean = X.mean(axis=0)
+        centered = X - mean
+        return cls(len(X), mean, centered.T @ centered)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.c = other.n, other.mean.copy(), other.c.copy()
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.c = self.c + other.c + np.outer(delta, delta) * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.n = n
+        return self
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.c))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.c / np.outer(std, std)
+
+
+@dataclass
+class ColumnProfile:
+    kind: str  # "numeric" or "categorical"
+    count: int = 0  # non-null values
+    nulls: int = 0
+    moments: Moments = None
+    sketch: QuantileSketch = None
+    distinct: DistinctSketch = field(default_factory=DistinctSketch)
+    values: dict = field(default_factory=dict)  # value -> count; None once past MAX_EXACT_VALUES
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        if self.kind == "numeric":
+            self.moments.merge(other.moments)
+            self.sketch.merge(other.sketch)
+        self.distinct.merge(other.distinct)
+        if self.values is not None and other.values is not None:
+            for value, n in other.values.items():
+                self.values[value] = self.values.get(value, 0) + n
+            if len(self.values) > MAX_EXACT_VALUES:
+                self.values = None
+        else:
+            self.values = None
+        return self
+
+
+def _hashes(values):
+    return pd.util.hash_array(values.to_numpy(), categorize=False)
+
+
+def profile_column(series, kind):
+    present = series.dropna()
+    column = ColumnProfile(kind=kind, count=len(present), nulls=len(series) - len(present))
+    if kind == "numeric":
+        values = present.to_numpy(dtype=np.float64)
+        column.moments = Moments.of(values)
+        column.sketch = QuantileSketch().add(values)
+    counts = present.value_counts(sort=False)
+    # HyperLogLog ignores repeats, so only the chunk's distinct values need hashing.
+    uniques = counts.index.to_series()
+    if kind == "numeric":
+        uniques = uniques.astype(np.float64)  # so 3 and 3.0 hash alike across chunks
+    column.distinct.add_hashes(_hashes(uniques))
+    column.values = counts.to_dict() if len(counts) <= MAX_EXACT_VALUES else None
+    return column
+
+
+# ========== PROFILE ==========
+@dataclass
+class DataProfile:
+    columns: dict = field(default_factory=dict)  # name -> ColumnProfile, in file order
+    rows: dict = field(default_factory=dict)  # source name -> row count
+    correlated: list = field(default_factory=list)  # column order of ``comoments``
+    comoments: CoMoments = field(default_factory=CoMoments)
+
+    def merge(self, other):
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = column
+        for source, n in other.rows.items():
+            self.rows[source] = self.rows.get(source, 0) + n
+        self.correlated = self.correlated or other.correlated
+        self.comoments.merge(other.comoments)
+        return self
+
+    @property
+    def n_rows(self):
+        return sum(self.rows.values())
+
+    def numeric_columns(self):
+        return [name for name, c in self.columns.items() if c.kind == "numeric"]
+
+    def describe(self):
+        """``DataFrame.describe`` rows for the numeric columns, plus nulls, distinct and outlier counts."""
+        records = {}
+        for name in self.numeric_columns():
+            c = self.columns[name]
+            q1, q3 = c.sketch.quantile(0.25), c.sketch.quantile(0.75)
+            lower, upper = q1 - OUTLIER_IQR * (q3 - q1), q3 + OUTLIER_IQR * (q3 - q1)
+            below = c.sketch.rank(np.nextafter(lower, -np.inf))
+            records[name] = {
+                "count": c.count,
+                "mean": c.moments.mean,
+                "std": c.moments.std,
+                "min": c.sketch.min,
+                "25%": q1,
+                "50%": c.sketch.quantile(0.5),
+                "75%": q3,
+                "max": c.sketch.max,
+                "nulls": c.nulls,
+                "distinct": self.distinct(name),
+                "outliers": below + c.count - c.sketch.rank(upper),
+            }
+        return pd.DataFrame.from_dict(records, orient="index")
+
+    def overview(self):
+        """One row per column: type, non-null count, nulls, distinct count and most frequent value."""
+        records = []
+        for name, c in self.columns.items():
+            top = max(c.values.items(), key=lambda item: item[1]) if c.values else (None, None)
+            records.append({"column": name, "type": c.kind, "non-null": c.count, "nulls": c.nulls,
+                            "distinct": self.distinct(name), "top": None if top[0] is None else str(top[0]),
+                            "top count": top[1]})
+        return pd.DataFrame(records)
+
+    def distinct(self, name):
+        """Exact when the value counts are still kept, else the HyperLogLog estimate."""
+        c = self.columns[name]
+        return len(c.values) if c.values is not None else int(round(c.distinct.estimate()))
+
+    def value_counts(self, name):
+        """Exact counts, most frequent first, or None for a high-cardinality column."""
+        values = self.columns[name].values
+        if values is None:
+            return None
+        return pd.Series(values, name="count").rename_axis(name).sort_values(ascending=False, kind="stable")
+
+    def correlation(self):
+        return pd.DataFrame(self.comoments.correlation(), index=self.correlated, columns=self.correlated)
+
+    def churn_correlation(self):
+        """Correlation of every numeric column with Churn, highest first (the notebook's ranking)."""
+        return self.correlation()[TARGET].drop(TARGET).sort_values(ascending=False)
+
+
+def profile_chunk(chunk, source):
+    """Reduce one raw chunk to a partial DataProfile."""
+    chunk = prepare_chunk(chunk)
+    profile = DataProfile(rows={source: len(chunk)})
+    for name in chunk.columns:
+        series = chunk[name]
+        numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+        profile.columns[name] = profile_column(series, "numeric" if numeric else "categorical")
+    profile.correlated = profile.numeric_columns() + [TARGET]
+    X = chunk[profile.correlated].astype(np.float64).dropna().to_numpy()
+    if len(X):
+        profile.comoments = CoMoments.of(X)
+    return profile
+
+
+def profile_sources(sources=None, chunksize=DEFAULT_CHUNKSIZE, workers=0):
+    """Profile every source in one chunked pass; ``workers > 0`` reduces chunks in a process pool."""
+    sources = sources or DEFAULT_SOURCES
+    profile = DataProfile()
+    chunks = ((chunk, name) for name, path in sources.items() for chunk in pd.read_csv(path, chunksize=chunksize))
+    if not workers:
+        for chunk, name in chunks:
+            profile.merge(profile_chunk(chunk, name))
+        return profile
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk, name in chunks:
+            in_flight.append(pool.submit(profile_chunk, chunk, name))
+            # Bound the chunks held in memory (queued + being reduced) to 2 per worker.
+            if len(in_flight) >= 2 * workers:
+                profile.merge(in_flight.popleft().result())
+        while in_flight:
+            profile.merge(in_flight.popleft().result())
+    return profile
+
+
+def load_profile(sources=None, chunksize=DEFAULT_CHUNKSIZE, workers=None):
+    """Profile of the sources, computed once per process and source version."""
+    sources = sources or DEFAULT_SOURCES
+    key = source_stamp(list(sources.values()))
+    if workers is None:
+        workers = int(os.environ.get("CHURN_ANALYSIS_WORKERS", 0))
+    with _lock:
+        if key not in _profiles:
+            _profiles.clear()
+            _profiles[key] = profile_sources(sources, chunksize, workers)
+        return _profiles[key]
+
+
+# ========== CHECK ==========
+def exact_profile(sources=None):
+    """The notebook's full scans on the concatenated sources (reference for ``--check``)."""
+    df = pd.concat([prepare_chunk(pd.read_csv(p)) for p in (sources or DEFAULT_SOURCES).values()],
+                   ignore_index=True)
+    numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+    describe = df[numeric].describe().T
+    q1, q3 = describe["25%"], describe["75%"]
+    lower, upper = q1 - OUTLIER_IQR * (q3 - q1), q3 + OUTLIER_IQR * (q3 - q1)
+    describe["outliers"] = ((df[numeric] < lower) | (df[numeric] > upper)).sum()
+    describe["distinct"] = df[numeric].nunique()
+    corr = df[numeric + [TARGET]].astype(np.float64).corr()
+    return describe, corr
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the churn exports in one streaming pass.")
+    parser.add_argument("--train", default=str(DEFAULT_SOURCES["train"]))
+    parser.add_argument("--test", default=str(DEFAULT_SOURCES["test"]))
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="compare against exact pandas scans")
+    args = parser.parse_args(argv)
+
+    sources = {"train": args.train, "test": args.test}
+    start = time.perf_counter()
+    profile = profile_sources(sources, args.chunksize, args.workers)
+    print(f"{profile.n_rows:,} rows, {len(profile.columns)} columns in {time.perf_counter() - start:.2f}s")
+    print(profile.describe().to_string(float_format=lambda v: f"{v:.4g}"))
+    print(f"\nCorrelation with {TARGET}\n{profile.churn_correlation().to_string(float_format=lambda v: f'{v:+.3f}')}")
+    if args.check:
+        describe, corr = exact_profile(sources)
+        ours = profile.describe()
+        for stat in ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]:
+            err = ((ours[stat] - describe[stat]).abs() / describe[stat].abs().clip(lower=1e-12)).max()
+            print(f"max relative error {stat:<6} {err:.2e}")
+        print(f"max |distinct - nunique|        {(ours['distinct'] - describe['distinct']).abs().max()}")
+        print(f"max |outliers - exact|          {(ours['outliers'] - describe['outliers']).abs().max()}")
+        print(f"max |corr - pandas corr|        {(profile.correlation() - corr).abs().max().max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Incremental refresh of the saved model from a new batch of labelled rows.
+
+Instead of rerunning the full search (``churn.train``), a refresh:
+
+1. folds the batch into per-column quantile sketches kept on the fitted
+   RobustScaler (``sketches_``) and moves ``center_`` / ``scale_`` to the
+   median / IQR of all data seen so far. The existing trees' split thresholds
+   are remapped to the new scale, so they keep making the same decisions;
+2. grows the forest with ``warm_start``: new trees are fitted on the batch only,
+   after the same preprocessing and SMOTETomek resampling as in training;
+3. optionally retires the oldest trees so at most ``max_trees`` remain
+   (sliding window);
+4. gates on the batch itself, which neither model has trained on. The current
+   model scores the batch rows directly. The refresh is scored out of fold:
+   each of 5 stratified folds of the batch is scored by the same refresh grown
+   on the other folds. It is published only when its recall does not drop by
+   more than ``tolerance`` against the current model (and meets
+   ``min_recall``). The bigml CSVs can't serve as a gate, because every model
+   is trained on both of them.
+
+The out-of-fold probabilities are saved with the version (``<model>.oof.npz``),
+so ``churn.thresholds`` tunes a refreshed model on them. They cover the batch
+rows only, not the bigml CSVs.
+
+Work grows with the batch, not the history: the sketches summarize past rows
+and only the new trees are fitted. The first refresh of a model trained
+without sketches seeds them once from the training sources.
+
+    python -m churn.refresh new-month.csv --trees 30 --max-trees 300
+    python -m churn.refresh new-month.csv --challenger    # shadow-score it before publishing
+"""
+import argparse
+import copy
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from imblearn.combine import SMOTETomek
+from imblearn.over_sampling import SMOTE
+from sklearn.metrics import accuracy_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold
+
+from churn.compiled_forest import _fold_scaler_thresholds, _split_pipeline
+from churn.dataset import as_bool, source_stamp
+from churn.features import normalize_columns, to_model_frame
+from churn.paths import MODEL_PATH, TEST_PATH, TRAIN_PATH
+from churn.sketches import QuantileSketch
+from churn.train import CV_SEED, CV_SPLITS, SMOTE_SEED, _stage, new_version, save_version
+
+DEFAULT_NEW_TREES = 30
+DEFAULT_TOLERANCE = 0.01
+# Training resamples churners to 1820 against ~2280 non-churners per fold; batches use the same ratio.
+SMOTE_RATIO = 0.8
+MIN_CHURNERS_FOR_SMOTE = 6  # SMOTE needs k_neighbors + 1 minority rows
+
+
+def read_labelled(paths):
+    """(X, y) from one or more raw bigml-style CSVs with a Churn column."""
+    df = normalize_columns(pd.concat([pd.read_csv(p) for p in paths], ignore_index=True))
+    y = as_bool(df["Churn"]).astype(np.int64).to_numpy()
+    return to_model_frame(df).reset_index(drop=True), y
+
+
+def _scaler(preprocessor):
+    name = next(name for name, _, _ in preprocessor.transformers_ if name == "num_scaling")
+    return preprocessor.named_transformers_[name], preprocessor.output_indices_[name]
+
+
+# ========== SCALER STATISTICS ==========
+def seed_sketches(scaler, X):
+    """Per-column sketches for the scaler's columns, built from ``X`` (the training rows)."""
+    scaler.sketches_ = [QuantileSketch().add(X[col].to_numpy()) for col in scaler.feature_names_in_]
+
+
+def update_scaler(scaler, X):
+    """Fold ``X`` into the sketches and return (old center, old scale, new center, new scale)."""
+    for sketch, col in zip(scaler.sketches_, scaler.feature_names_in_):
+        sketch.add(X[col].to_numpy())
+    old_center, old_scale = scaler.center_.copy(), scaler.scale_.copy()
+    q_lo, q_hi = scaler.quantile_range
+    center = np.array([s.quantile(0.5) for s in scaler.sketches_])
+    scale = np.array([s.quantile(q_hi / 100) - s.quantile(q_lo / 100) for s in scaler.sketches_])
+    scale[scale == 0] = 1.0  # as RobustScaler does for constant columns
+    if scaler.with_centering:
+        scaler.center_ = center
+    if scaler.with_scaling:
+        scaler.scale_ = scale
+    return old_center, old_scale, scaler.center_, scaler.scale_
+
+
+def remap_thresholds(forest, columns, old_center, old_scale, new_center, new_scale):
+    """Rewrite the splits on the scaled ``columns`` so every tree keeps its decisions.
+
+    Each split is taken back to the raw boundary it tests (the largest raw value
+    that goes left, as in ``churn.compiled_forest``) and replaced by that value's
+    float32 image on the new scale, which is what the tree compares inputs against.
+    Only inputs within float32 rounding of a split (e.g. next to a SMOTE sample that
+    the split separated from a real one) can change branch.
+    """
+    trees = [est.tree_ for est in forest.estimators_]
+    thresholds = [tree.threshold for tree in trees]  # views of the node arrays; written in place
+    for col, c0, s0, c1, s1 in zip(columns, old_center, old_scale, new_center, new_scale):
+        if (c0, s0) == (c1, s1):
+            continue
+        masks = [(tree.children_left != -1) & (tree.feature == col) for tree in trees]
+        # One bisection over the splits of every tree on this column.
+        raw = _fold_scaler_thresholds(np.concatenate([t[m] for t, m in zip(thresholds, masks)]), c0, s0)
+        moved = ((raw - c1) / s1).astype(np.float32)
+        offsets = np.cumsum([0] + [int(m.sum()) for m in masks])
+        for t, m, start, stop in zip(thresholds, masks, offsets[:-1], offsets[1:]):
+            t[m] = moved[start:stop]
+
+
+# ========== FOREST ==========
+def _resample(X, y):
+    if np.bincount(y, minlength=2)[1] < MIN_CHURNERS_FOR_SMOTE:
+        return X, y
+    sampler = SMOTETomek(smote=SMOTE(sampling_strategy=SMOTE_RATIO, random_state=SMOTE_SEED))
+    try:
+        return sampler.fit_resample(X, y)
+    except ValueError:  # batch already has more churners than the target ratio
+        return X, y
+
+
+def grow_forest(forest, X, y, n_new, max_trees=None, random_state=None):
+    """Add ``n_new`` trees fitted on (X, y); then keep only the newest ``max_trees``."""
+    if len(np.unique(y)) < 2:
+        raise ValueError("The new batch needs both churners and non-churners")
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + n_new)
+    if random_state is not None:
+        forest.set_params(random_state=random_state)
+    forest.fit(X, y)
+    forest.set_params(warm_start=False)
+    retired = 0
+    if max_trees and len(forest.estimators_) > max_trees:
+        retired = len(forest.estimators_) - max_trees
+        forest.estimators_ = forest.estimators_[retired:]
+        forest.n_estimators = len(forest.estimators_)
+    return retired
+
+
+def batch_oof(model, X, y, n_new, max_trees=None, random_state=None):
+    """Churn probability of every batch row from a refresh grown without it (stratified folds).
+
+    ``model`` already has its scaler updated and its splits remapped. Each fold
+    copies the forest and grows ``n_new`` trees on the other folds, as the refresh does.
+    """
+    preprocessor, forest = _split_pipeline(model)
+    X = preprocessor.transform(X)
+    n_splits = min(CV_SPLITS, int(np.bincount(y, minlength=2).min()))
+    if n_splits < 2:
+        raise ValueError("The new batch needs at least 2 churners and 2 non-churners")
+    proba = np.empty(len(y))
+    for train_idx, test_idx in StratifiedKFold(n_splits, shuffle=True, random_state=CV_SEED).split(X, y):
+        fold_forest = copy.deepcopy(forest)
+        grow_forest(fold_forest, *_resample(X[train_idx], y[train_idx]), n_new, max_trees, random_state)
+        proba[test_idx] = fold_forest.predict_proba(X[test_idx])[:, 1]
+    return proba
+
+
+def gate_scores(y, proba):
+    """Recall, accuracy and precision with churn flagged above 0.5 (as ``predict`` does)."""
+    pred = proba > 0.5
+    return {
+        "recall": recall_score(y, pred),
+        "accuracy": accuracy_score(y, pred),
+        "precision": precision_score(y, pred, zero_division=0),
+    }
+
+
+# ========== REFRESH ==========
+def refresh(batch_paths, model_path=MODEL_PATH, n_new=DEFAULT_NEW_TREES,
+            max_trees=None, tolerance=DEFAULT_TOLERANCE, min_recall=None, publish=True,
+            history_paths=(TRAIN_PATH, TEST_PATH), random_state=None, challenger=False):
+    """Warm-start the model at ``model_path`` on the batch; returns the version record.
+
+    ``record["accepted"]`` tells whether the recall gate passed; a rejected
+    candidate is still written to ``model/versions`` but never published.
+    With ``challenger`` the candidate is not published but registered for shadow
+    scoring, whatever the gate said (see ``churn.registry``).
+    """
+    timings = {}
+    with _stage(timings, "load"):
+        current = joblib.load(model_path)
+        model = copy.deepcopy(current)
+        X_new, y_new = read_labelled(batch_paths)
+    preprocessor, forest = _split_pipeline(model)
+    scaler, out_slice = _scaler(preprocessor)
+    columns = range(out_slice.start, out_slice.stop)
+
+    if not hasattr(scaler, "sketches_"):
+        with _stage(timings, "seed_sketches"):
+            seed_sketches(scaler, read_labelled(history_paths)[0])
+    with _stage(timings, "scaler"):
+        stats = update_scaler(scaler, X_new)
+        remap_thresholds(forest, columns, *stats)
+    with _stage(timings, "gate"):
+        oof = batch_oof(model, X_new, y_new, n_new, max_trees, random_state)
+        before = gate_scores(y_new, current.predict_proba(X_new)[:, 1])
+        after = gate_scores(y_new, oof)
+    with _stage(timings, "grow"):
+        X_fit, y_fit = _resample(preprocessor.transform(X_new), y_new)
+        retired = grow_forest(forest, X_fit, y_fit, n_new, max_trees, random_state)
+
+    accepted = after["recall"] >= before["recall"] - tolerance
+    if min_recall is not None:
+        accepted = accepted and after["recall"] >= min_recall
+    record = {
+        "version": new_version(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "kind": "refresh",
+        "parent": source_stamp([model_path]),
+        "batch": source_stamp(batch_paths),
+        "batch_rows": int(len(y_new)),
+        "trees_added": n_new,
+        "trees_retired": retired,
+        "trees": len(forest.estimators_),
+        "gate": {"rows": int(len(y_new)), "before": before, "after": after},
+        "tolerance": tolerance,
+        "min_recall": min_recall,
+        "accepted": bool(accepted),
+    }
+    return save_version(model, record, timings, publish and accepted and not challenger, model_path, challenger,
+                        oof=(y_new, oof))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm-start the churn model on a new labelled batch.")
+    parser.add_argument("batch", nargs="+", help="new labelled CSV file(s), bigml column layout")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--trees", type=int, default=DEFAULT_NEW_TREES, help="trees to add")
+    parser.add_argument("--max-trees", type=int, default=None, help="retire the oldest trees beyond this")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed recall drop on the batch (out of fold)")
+    parser.add_argument("--min-recall", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--no-publish", action="store_true")
+    parser.add_argument("--challenger", action="store_true", help="don't publish; shadow-score next to the champion")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    record = refresh(args.batch, args.model, args.trees, args.max_trees, args.tolerance,
+                     args.min_recall, not args.no_publish, random_state=args.seed, challenger=args.challenger)
+    before, after = record["gate"]["before"], record["gate"]["after"]
+    print(f"version {record['version']}: +{record['trees_added']} / -{record['trees_retired']} trees "
+          f"-> {record['trees']} ({record['batch_rows']:,} new rows) in {time.perf_counter() - start:.2f}s")
+    for metric in before:
+        print(f"  batch {metric:<12}{before[metric]:.4f} -> {after[metric]:.4f}")
+    print("published" if record["published"] else "registered as a challenger" if args.challenger
+          else ("rejected by the recall gate" if not record["accepted"] else "not published"))
+    for stage, seconds in record["timings"].items():
+        print(f"  {stage:<14}{seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+"""Model-version registry and champion/challenger shadow scoring.
+
+The registry (``model/versions/registry.json``) names the champion and any
+number of challengers. The champion is the version published at
+``MODEL_PATH``, which the pages, the batch scorer and the service answer with.
+Challengers are other versions from ``model/versions``. ``promote`` publishes a
+version atomically and makes it the champion. ``churn.train`` and
+``churn.refresh`` record the versions they publish, and their
+``--challenger`` flag registers a new version without publishing it.
+
+Callers score with the champion as before, then hand the batch to ``shadow``,
+which only queues it. A small pool of daemon threads scores the batch with every
+challenger's memory-mapped compiled forest, so batches run concurrently with
+each other and with the caller. It appends one JSON line per batch and
+challenger to ``SHADOW_LOG``. Each line holds:
+
+- rows, label agreement with the champion and the summed |Δp|, each model's
+  labels at its own tuned threshold (``churn.thresholds``);
+- predicted churners of both models and both latencies;
+- true positives of both models and the positive count, when the batch carries
+  its ``Churn`` labels (labelled exports scored in batch), which gives recall.
+
+The caller gets nothing back, and a full queue drops the batch (``dropped``).
+A challenger that raises is logged via ``logging`` and counted (``failed``).
+The user-facing latency therefore only pays for one queue put per batch.
+
+``version_report`` compares the champion and the challengers on out-of-fold
+predictions over both bigml CSVs (every version is fitted on both, so neither
+is a holdout). It reports recall, precision, accuracy, F1 and agreement with
+the champion, plus single-row latency and batch throughput.
+
+    python -m churn.registry list
+    python -m churn.registry challenge 20260101-120000      # add a challenger (--remove to drop it)
+    python -m churn.registry promote 20260101-120000        # publish it and make it the champion
+    python -m churn.registry report                         # out-of-fold comparison
+    python -m churn.registry log                            # shadow log summary
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from churn import thresholds
+from churn.dataset import CACHE_DIR, source_stamp
+from churn.features import churn_labels
+from churn.paths import MODEL_PATH, TEST_PATH, VERSIONS_DIR
+
+REGISTRY_PATH = VERSIONS_DIR / "registry.json"
+SHADOW_LOG = Path(os.environ.get("CHURN_SHADOW_LOG", CACHE_DIR / "shadow.jsonl"))
+SHADOW_WORKERS = int(os.environ.get("CHURN_SHADOW_WORKERS", 2))
+SHADOW_NICE = 19
+MAX_PENDING = 256  # batches waiting for a shadow thread before new ones are dropped
+PUBLISHED = "published"  # champion label while the registry has not recorded a version
+LATENCY_ROWS = 200  # holdout rows scored one at a time for the single-row latency
+
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+_registry = {}
+_reports = {}
+_pending = queue.Queue(maxsize=MAX_PENDING)
+_workers = []
+_dropped = 0
+_failed = 0
+
+logger = logging.getLogger(__name__)
+
+
+# ========== REGISTRY ==========
+def version_path(version):
+    return VERSIONS_DIR / f"{version}.joblib"
+
+
+def load_registry(path=REGISTRY_PATH):
+    """``{"champion": version or None, "challengers": [...]}``, re-read only when the file changes."""
+    path = Path(path)
+    try:
+        stamp = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {"champion": None, "challengers": []}
+    with _lock:
+        if _registry.get("stamp") != (path, stamp):
+            _registry.update(stamp=(path, stamp), value=json.loads(path.read_text()))
+        return _registry["value"]
+
+
+def _save_registry(registry, path=REGISTRY_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps(registry, indent=2))
+    os.replace(tmp, path)
+
+
+def _require(version):
+    if not version_path(version).exists():
+        raise FileNotFoundError(f"No model version {version} in {VERSIONS_DIR}")
+
+
+def champion():
+    return load_registry()["champion"] or PUBLISHED
+
+
+def challengers():
+    return list(load_registry()["challengers"])
+
+
+def model_record(model_path=MODEL_PATH):
+    """The saved record of the version at ``model_path`` (a version file or the champion's), or None."""
+    path = Path(model_path).resolve()
+    if path.parent == VERSIONS_DIR.resolve():
+        version = path.stem
+    else:
+        version = champion() if path == Path(MODEL_PATH).resolve() else None
+    meta = VERSIONS_DIR / f"{version}.json"
+    return json.loads(meta.read_text()) if version is not None and meta.exists() else None
+
+
+def set_champion(version):
+    """Record ``version`` as the model now published at MODEL_PATH (it stops being a challenger)."""
+    registry = dict(load_registry())
+    registry["champion"] = version
+    registry["challengers"] = [v for v in registry["challengers"] if v != version]
+    _save_registry(registry)
+
+
+def add_challenger(version):
+    """Register ``version`` for shadow scoring, exporting its compiled forest now rather than on the first batch."""
+    from churn import model_store
+
+    _require(version)
+    model_store.load_forest(version_path(version))
+    registry = dict(load_registry())
+    if version != registry["champion"] and version not in registry["challengers"]:
+        registry["challengers"] = registry["challengers"] + [version]
+        _save_registry(registry)
+
+
+def remove_challenger(version):
+    registry = dict(load_registry())
+    registry["challengers"] = [v for v in registry["challengers"] if v != version]
+    _save_registry(registry)
+
+
+def promote(version, model_path=MODEL_PATH):
+    """Publish ``version`` to ``model_path`` atomically and make it the champion.
+
+    A threshold tuned for the version (``churn.thresholds``) and its out-of-fold
+    scores carry over to the published model.
+    """
+    _require(version)
+    setting = thresholds.load_setting(version_path(version))
+    oof = thresholds.load_oof(version_path(version))
+    model_path = Path(model_path)
+    tmp = model_path.with_name(f"{model_path.name}.tmp{os.getpid()}")
+    shutil.copyfile(version_path(version), tmp)
+    os.replace(tmp, model_path)
+    if setting is not None:
+        thresholds.save_threshold(setting["threshold"], model_path, setting["contact_cost"], setting["churn_cost"])
+    else:
+        thresholds.reset_threshold(model_path)
+    if oof is not None:
+        thresholds.save_oof(model_path, *oof)
+    set_champion(version)
+
+
+def list_versions():
+    """One row per saved version: its record's summary and its role in the registry."""
+    import pandas as pd
+
+    registry = load_registry()
+    rows = []
+    for meta in sorted(VERSIONS_DIR.glob("*.json")):
+        if meta == REGISTRY_PATH or meta.name.endswith(".threshold.json"):
+            continue
+        record = json.loads(meta.read_text())
+        version = record["version"]
+        gate = record.get("gate", {}).get("after", {})
+        rows.append({
+            "version": version,
+            "created": record.get("created"),
+            "kind": record.get("kind"),
+            "role": ("champion" if version == registry["champion"]
+                     else "challenger" if version in registry["challengers"] else ""),
+            "cv_recall": record.get("cv", {}).get("mean_test_recall"),
+            "gate_recall": gate.get("recall"),
+            "artifact": version_path(version).exists(),
+        })
+    return pd.DataFrame(rows, columns=["version", "created", "kind", "role", "cv_recall", "gate_recall", "artifact"])
+
+
+# ========== SHADOW SCORING ==========
+def _log(entry):
+    line = json.dumps(entry) + "\n"
+    with _log_lock:
+        SHADOW_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(SHADOW_LOG, "a") as f:
+            f.write(line)
+
+
+def _score_challenger(version, frame, proba, seconds, source, labels, model_path):
+    from churn import model_store
+
+    forest = model_store.load_forest(version_path(version))  # cached after the first batch; not part of the latency
+    start = time.perf_counter()
+    shadow_proba = forest.predict_proba_frame(frame)
+    shadow_seconds = time.perf_counter() - start
+    served = churn_labels(proba, thresholds.load_threshold(model_path))  # the threshold the caller answered with
+    shadowed = churn_labels(shadow_proba, thresholds.load_threshold(version_path(version)))
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "source": source,
+        "champion": champion() if Path(model_path) == MODEL_PATH else Path(model_path).stem,
+        "challenger": version,
+        "rows": len(frame),
+        "agree": int((served == shadowed).sum()),
+        "abs_diff": float(np.abs(proba[:, 1] - shadow_proba[:, 1]).sum()),
+        "champion_churn": int(served.sum()),
+        "challenger_churn": int(shadowed.sum()),
+        "champion_ms": seconds * 1e3,
+        "challenger_ms": shadow_seconds * 1e3,
+    }
+    if labels is not None:
+        entry.update(positives=int(labels.sum()), champion_tp=int((served & labels).sum()),
+                     challenger_tp=int((shadowed & labels).sum()))
+    _log(entry)
+
+
+def _warm_up():
+    """Load every challenger's forest before the first batch is scored."""
+    from churn import model_store
+
+    for version in challengers():
+        try:
+            model_store.load_forest(version_path(version))
+        except Exception:  # its batches fail, and are logged and counted, in _drain
+            logger.exception("could not load challenger %s", version)
+
+
+def _drain():
+    try:  # per-thread nice on Linux: the challengers get the CPU the serving threads leave idle
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), SHADOW_NICE)
+    except (AttributeError, OSError):
+        pass
+    _warm_up()
+    global _failed
+    while True:
+        versions, *job = _pending.get()
+        for version in versions:
+            try:
+                _score_challenger(version, *job)
+            except Exception:  # a missing or broken challenger must not stop the others
+                logger.exception("shadow scoring with challenger %s failed", version)
+                with _lock:
+                    _failed += 1
+        _pending.task_done()
+
+
+def shadow(frame, proba, seconds, source, labels=None, model_path=MODEL_PATH):
+    """Queue challenger scoring of a batch the champion has just answered.
+
+    ``proba`` is the predict_proba matrix of the model at ``model_path`` and
+    ``seconds`` its scoring time; its labels use that model's threshold.
+    ``labels`` (0/1 per row) adds recall counts to the log. Returns at once.
+    The batch is dropped and counted in ``dropped()`` when ``MAX_PENDING`` batches
+    are already waiting. ``frame`` must not be modified afterwards.
+    """
+    global _dropped
+    versions = challengers()
+    if not versions:
+        return
+    if len(_workers) < SHADOW_WORKERS:
+        with _lock:
+            while len(_workers) < SHADOW_WORKERS:
+                worker = threading.Thread(target=_drain, name=f"churn-shadow-{len(_workers)}", daemon=True)
+                worker.start()
+                _workers.append(worker)
+    if labels is not None:
+        labels = np.asarray(labels, dtype=bool)
+    try:
+        _pending.put_nowait((versions, frame, proba, seconds, source, labels, model_path))
+    except queue.Full:
+        _dropped += 1
+
+
+def flush():
+    """Wait until every queued batch has been scored by the challengers and logged."""
+    _pending.join()
+
+
+def dropped():
+    return _dropped
+
+
+def failed():
+    """Batch and challenger pairs that raised while scoring; each one is logged via ``logging``."""
+    return _failed
+
+
+def read_log(path=SHADOW_LOG):
+    import pandas as pd
+
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return pd.DataFrame()
+    return pd.read_json(path, lines=True)
+
+
+def summarize_log(log=None):
+    """Per champion and challenger: rows, agreement, mean |Δp|, p50/p99 batch latencies and labelled recall."""
+    import pandas as pd
+
+    log = read_log() if log is None else log
+    if log.empty:
+        return pd.DataFrame()
+    for col in ("positives", "champion_tp", "challenger_tp"):
+        if col not in log:
+            log[col] = np.nan
+    rows = []
+    for (champ, challenger), group in log.groupby(["champion", "challenger"], sort=False):
+        n, positives = group["rows"].sum(), group["positives"].sum()
+        rows.append({
+            "champion": champ,
+            "challenger": challenger,
+            "batches": len(group),
+            "rows": int(n),
+            "agreement": group["agree"].sum() / n,
+            "mean_abs_diff": group["abs_diff"].sum() / n,
+            "champion_churn_rate": group["champion_churn"].sum() / n,
+            "challenger_churn_rate": group["challenger_churn"].sum() / n,
+            "champion_p50_ms": group["champion_ms"].median(),
+            "challenger_p50_ms": group["challenger_ms"].median(),
+            "champion_p99_ms": group["champion_ms"].quantile(0.99),
+            "challenger_p99_ms": group["challenger_ms"].quantile(0.99),
+            "labelled_rows": int(group.loc[group["positives"].notna(), "rows"].sum()),
+            "champion_recall": group["champion_tp"].sum() / positives if positives else np.nan,
+            "challenger_recall": group["challenger_tp"].sum() / positives if positives else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+# ========== VERSION REPORT ==========
+def _latency_rows(path):
+    import pandas as pd
+
+    from churn.features import to_model_frame
+
+    return to_model_frame(pd.read_csv(path, nrows=LATENCY_ROWS))
+
+
+def _scores(y, pred):
+    tp = int((pred & y).sum())
+    predicted, positives = int(pred.sum()), int(y.sum())
+    recall = tp / positives if positives else 0.0
+    precision = tp / predicted if predicted else 0.0
+    return {
+        "recall": recall,
+        "precision": precision,
+        "accuracy": float((pred == y).mean()),
+        "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+
+def version_report(versions=None, latency_path=TEST_PATH):
+    """Champion and challengers (or ``versions``) compared, one row per model.
+
+    Every version is fitted on both bigml CSVs, so quality comes from out-of-fold
+    probabilities (``churn.thresholds.oof_scores``), labelled at each version's own
+    threshold. A refreshed version's are over its batch only ("scored_on"). Its
+    metrics are not comparable with the others', so its agreement is left empty.
+    Versions without out-of-fold scores get no metrics. Latency and throughput
+    are timed on rows of ``latency_path``. Cached per version files, so the page
+    only pays once.
+    """
+    import pandas as pd
+
+    from churn import model_store
+
+    entries = [(champion(), "champion", Path(MODEL_PATH))] if versions is None else []
+    for version in (challengers() if versions is None else versions):
+        entries.append((version, "challenger" if versions is None else "", version_path(version)))
+    key = source_stamp([p for _, _, p in entries] + [latency_path])
+    with _lock:
+        if key in _reports:
+            return _reports[key]
+
+    X = _latency_rows(latency_path)
+    rows, reference = [], None
+    for version, role, path in entries:
+        threshold = thresholds.load_threshold(path)
+        scores = thresholds.oof_scores(path)
+        quality = dict.fromkeys(["recall", "precision", "accuracy", "f1", "agreement", "predicted_churn"], np.nan)
+        scored_on = None
+        if scores is not None:
+            y, oof = scores
+            pred = oof >= (thresholds.ARGMAX_THRESHOLD if threshold is None else threshold)
+            scored_on = "refresh batch" if (model_record(path) or {}).get("kind") == "refresh" else "bigml CSVs"
+            reference = reference or (scored_on, y, pred)
+            comparable = scored_on == reference[0] and np.array_equal(y, reference[1])
+            quality.update(_scores(y, pred), predicted_churn=int(pred.sum()),
+                           agreement=float((pred == reference[2]).mean()) if comparable else np.nan)
+        forest = model_store.load_forest(path)
+        start = time.perf_counter()
+        forest.predict_proba_frame(X)
+        batch_seconds = time.perf_counter() - start
+        single = []
+        for i in range(len(X)):
+            start = time.perf_counter()
+            forest.predict_proba_frame(X.iloc[i:i + 1])
+            single.append(time.perf_counter() - start)
+        rows.append({
+            "version": version,
+            "role": role,
+            "trees": forest.n_trees,
+            "threshold": 0.5 if threshold is None else threshold,
+            "scored_on": scored_on,
+            **quality,
+            "single_row_ms": float(np.median(single)) * 1e3,
+            "batch_rows_per_sec": len(X) / batch_seconds,
+        })
+    report = pd.DataFrame(rows)
+    with _lock:
+        _reports.clear()
+        _reports[key] = report
+    return report
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage model versions and compare champion and challengers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="saved versions and their roles")
+    challenge = sub.add_parser("challenge", help="add (or --remove) a challenger")
+    challenge.add_argument("version")
+    challenge.add_argument("--remove", action="store_true")
+    promote_cmd = sub.add_parser("promote", help=f"publish a version to {MODEL_PATH.name} as champion")
+    promote_cmd.add_argument("version")
+    report = sub.add_parser("report", help="compare the champion and challengers out of fold")
+    report.add_argument("versions", nargs="*", help="versions to compare instead (the first is the reference)")
+    sub.add_parser("log", help="summarize the shadow log")
+    args = parser.parse_args(argv)
+
+    if args.command == "challenge":
+        (remove_challenger if args.remove else add_challenger)(args.version)
+    elif args.command == "promote":
+        promote(args.version)
+    if args.command in ("list", "challenge", "promote"):
+        print(f"champion: {champion()}; challengers: {', '.join(challengers()) or 'none'}")
+        if args.command == "list":
+            print(list_versions().to_string(index=False))
+    elif args.command == "report":
+        table = version_report(args.versions or None)
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    elif args.command == "log":
+        summary = summarize_log()
+        print(summary.to_string(index=False, float_format=lambda v: f"{v:.4f}") if not summary.empty
+              else f"No shadow traffic logged in {SHADOW_LOG}")
+
+
+if __name__ == "__main__":
+    main()
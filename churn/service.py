@@ -0,0 +1,420 @@
+"""Local HTTP scoring service with micro-batching.
+
+Concurrent requests are queued and flushed as one vectorized ``predict_proba``
+call when ``max_batch`` rows are waiting or the oldest request has waited
+``max_wait_ms``. Scoring runs on a thread pool so the event loop only parses
+requests and routes results; when ``max_queue`` requests are already waiting new
+ones get ``503`` with ``Retry-After`` instead of piling up.
+
+    python -m churn.service serve --port 8502 --max-batch 64 --max-wait-ms 5
+    python -m churn.service loadtest --url http://localhost:8502 --concurrency 64
+    python -m churn.service bench            # micro-batching vs one row per call
+
+``POST /predict`` takes the 13 inputs the prediction page builds (the two
+derived ones, ``Total_charge`` and ``High_service_calls``, are optional and are
+always recomputed), either one JSON object or a list of them, and answers
+``{"churn_probability": p, "churn": 0|1}`` per row, ``churn`` at the threshold tuned
+for the model (``churn.thresholds``; 0.5 by default). Plans must be Yes/No (any case)
+and the other inputs finite numbers; anything else gets ``400`` before it is queued, and
+a batch that still fails is rescored request by request so only the bad one errors. ``GET /health`` and
+``GET /stats`` report liveness and batching counters; ``GET /metrics`` gives
+frame-building and scoring latencies in the Prometheus text format (see
+``churn.instrument``). ``GET /leaderboard?state=WV&international_plan=Yes&offset=0&limit=50``
+pages through the highest-risk customers of the saved risk leaderboard (see
+``churn.leaderboard``; ``state`` may repeat). Every scored batch also feeds the
+drift monitor (``churn.drift``), whose PSI / KS gauges appear on ``/metrics``,
+and is shadow-scored by the registry's challengers (``churn.registry``).
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import tornado.httpclient
+import tornado.httpserver
+import tornado.web
+
+from churn import drift, instrument, model_store, registry, thresholds
+from churn.features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS, RAW_FEATURE_COLUMNS, churn_labels, derive_features
+from churn.leaderboard import LEADERBOARD_PATH, MAX_LIMIT, load_leaderboard
+from churn.paths import MODEL_PATH
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ========== MICRO-BATCHER ==========
+class MicroBatcher:
+    """Coalesces single-row requests into batched calls of ``score_batch(DataFrame) -> proba``."""
+
+    def __init__(self, score_batch, max_batch=64, max_wait_ms=5.0, max_queue=1024, workers=4):
+        self.score_batch = score_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score")
+        self._slots = asyncio.Semaphore(workers)
+        self._queue = None
+        self._flusher = None
+        self.stats = {"requests": 0, "rows": 0, "batches": 0, "rejected": 0}
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._flusher = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._flusher.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, rows):
+        """Queue a list of row dicts; resolves to their rows of ``score_batch``'s result."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((rows, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise QueueFull from None
+        self.stats["requests"] += 1
+        return await future
+
+    async def _collect(self):
+        items = [await self._queue.get()]
+        n_rows = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n_rows < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            n_rows += len(item[0])
+        return items
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self._collect()
+            # Bound in-flight batches to the pool size; extra requests wait in the queue.
+            await self._slots.acquire()
+            loop.create_task(self._score(loop, items))
+
+    async def _score(self, loop, items):
+        try:
+            rows = [row for batch, _ in items for row in batch]
+            try:
+                proba = await loop.run_in_executor(self.executor, self.score_batch, rows)
+            except Exception as exc:
+                if len(items) == 1:
+                    if not items[0][1].done():
+                        items[0][1].set_exception(exc)
+                    return
+                # Score the coalesced requests one by one so only the failing one gets the error
+                for batch, future in items:
+                    try:
+                        result = await loop.run_in_executor(self.executor, self.score_batch, batch)
+                    except Exception as exc:
+                        if not future.done():
+                            future.set_exception(exc)
+                    else:
+                        self.stats["batches"] += 1
+                        self.stats["rows"] += len(batch)
+                        if not future.done():
+                            future.set_result(result)
+                return
+            self.stats["batches"] += 1
+            self.stats["rows"] += len(rows)
+            start = 0
+            for batch, future in items:
+                if not future.done():
+                    future.set_result(proba[start:start + len(batch)])
+                start += len(batch)
+        finally:
+            self._slots.release()
+
+
+def clean_row(row):
+    """The row's raw inputs with plans as "Yes"/"No" and numbers as floats; ValueError on bad values."""
+    clean = {}
+    for col in RAW_FEATURE_COLUMNS:
+        value = row[col]
+        if col in CATEGORICAL_COLUMNS:
+            choice = {"yes": "Yes", "no": "No", "true": "Yes", "false": "No"}.get(str(value).strip().lower())
+            if choice is None:
+                raise ValueError(f"{col} must be Yes or No, got {value!r}")
+            clean[col] = choice
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = math.nan
+            if isinstance(value, bool) or not math.isfinite(number):
+                raise ValueError(f"{col} must be a finite number, got {value!r}")
+            clean[col] = number
+    return clean
+
+
+def rows_to_frame(rows):
+    """Validate request rows and build the model input frame (derived columns recomputed)."""
+    missing = sorted({c for row in rows for c in RAW_FEATURE_COLUMNS if c not in row})
+    if missing:
+        raise ValueError(f"Missing fields: {missing}")
+    df = pd.DataFrame({c: [row[c] for row in rows] for c in RAW_FEATURE_COLUMNS})
+    return derive_features(df)[FEATURE_COLUMNS]
+
+
+def make_scorer(model_path=MODEL_PATH, engine="forest"):
+    """Batch scoring function for the batcher: compiled forest or the sklearn pipeline.
+
+    Each batch is scored by the model file as it is now (``model_store`` caches it
+    per file version), so a retrain or promotion is picked up without a restart. The
+    function returns (n, 3) rows: P(stay), P(churn) and the churn label. The label
+    uses the threshold tuned for that same model version.
+    """
+    def load(path):
+        if engine == "forest":
+            return model_store.load_forest(path).predict_proba_frame
+        return model_store.load_model(path).predict_proba
+
+    def resolve():
+        # Stat around the load so the model and its threshold belong to one file version
+        while True:
+            stamp = thresholds.model_stamp(model_path)
+            predict = load(model_path)
+            if thresholds.model_stamp(model_path) == stamp:
+                return predict, thresholds.load_threshold(model_path, stamp)
+
+    load(model_path)  # fail at start-up, not on the first request, when the model is missing
+
+    def score(rows):
+        with instrument.timed("input_frame", page="service"):
+            df = rows_to_frame(rows)
+        predict, threshold = resolve()
+        start = time.perf_counter()
+        with instrument.timed("predict_proba", page="service"):
+            proba = predict(df)
+        drift.observe(df, proba[:, 1], model_path)  # queued; binned off the request path
+        registry.shadow(df, proba, time.perf_counter() - start, "service", model_path=model_path)  # challengers, off the request path
+        return np.column_stack([proba, churn_labels(proba, threshold)])
+
+    return score
+
+
+# ========== HTTP ==========
+class PredictHandler(tornado.web.RequestHandler):
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    async def post(self):
+        try:
+            payload = json.loads(self.request.body)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Body must be JSON")
+        single = isinstance(payload, dict)
+        rows = [payload] if single else payload
+        if not rows or not all(isinstance(r, dict) for r in rows):
+            raise tornado.web.HTTPError(400, reason="Expected an object or a non-empty list of objects")
+        missing = sorted({c for row in rows for c in RAW_FEATURE_COLUMNS if c not in row})
+        if missing:
+            raise tornado.web.HTTPError(400, reason=f"Missing fields: {', '.join(missing)}")
+        # Reject bad values here: once coalesced, a bad row would fail its whole batch
+        try:
+            rows = [clean_row(row) for row in rows]
+        except ValueError as exc:
+            raise tornado.web.HTTPError(400, reason=str(exc))
+
+        try:
+            scored = await self.batcher.submit(rows)
+        except QueueFull:
+            self.set_header("Retry-After", "1")
+            raise tornado.web.HTTPError(503, reason="Scoring queue is full")
+        except ValueError as exc:  # input the forest cannot encode; only this request's rows
+            raise tornado.web.HTTPError(400, reason=str(exc))
+
+        results = [{"churn_probability": float(p), "churn": int(label)} for _, p, label in scored]
+        self.write(json.dumps(results[0] if single else results))
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.write({"status": "ok"})
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    def initialize(self, batcher):
+        self.batcher = batcher
+
+    def get(self):
+        stats = dict(self.batcher.stats)
+        stats["queued"] = self.batcher._queue.qsize()
+        stats["avg_batch_rows"] = stats["rows"] / stats["batches"] if stats["batches"] else 0.0
+        self.write(stats)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.write(instrument.prometheus_text())
+
+
+class LeaderboardHandler(tornado.web.RequestHandler):
+    def initialize(self, path):
+        self.path = path
+
+    def get(self):
+        board = load_leaderboard(self.path)  # re-read only when an update has rewritten the file
+        if board is None:
+            raise tornado.web.HTTPError(404, reason="No leaderboard yet; run `python -m churn.leaderboard update`")
+        try:
+            limit = min(max(int(self.get_argument("limit", "50")), 1), MAX_LIMIT)
+            offset = max(int(self.get_argument("offset", "0")), 0)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="limit and offset must be integers")
+        filters = {
+            "states": self.get_arguments("state") or None,
+            "international_plan": self.get_argument("international_plan", None),
+            "voice_mail_plan": self.get_argument("voice_mail_plan", None),
+        }
+        with instrument.timed("leaderboard_page", page="service"):
+            try:
+                page = board.top(limit, offset, **filters)
+                total = board.count(**filters)
+            except ValueError as exc:
+                raise tornado.web.HTTPError(400, reason=str(exc))
+        self.write({"total": total, "offset": offset, "limit": limit,
+                    "customers": json.loads(page.to_json(orient="records"))})
+
+
+def make_app(batcher, leaderboard_path=LEADERBOARD_PATH):
+    return tornado.web.Application([
+        (r"/predict", PredictHandler, {"batcher": batcher}),
+        (r"/health", HealthHandler),
+        (r"/stats", StatsHandler, {"batcher": batcher}),
+        (r"/metrics", MetricsHandler),
+        (r"/leaderboard", LeaderboardHandler, {"path": leaderboard_path}),
+    ])
+
+
+async def start_server(port, batcher, address="127.0.0.1", leaderboard_path=LEADERBOARD_PATH):
+    batcher.start()
+    server = tornado.httpserver.HTTPServer(make_app(batcher, leaderboard_path))
+    server.listen(port, address=address)
+    return server
+
+
+# ========== LOAD GENERATOR ==========
+def sample_payloads(n, seed=0):
+    """Request bodies drawn from the holdout data, with raw bigml columns renamed."""
+    from churn.features import normalize_columns
+    from churn.paths import TEST_PATH
+
+    df = normalize_columns(pd.read_csv(TEST_PATH))[RAW_FEATURE_COLUMNS]
+    rows = df.sample(n, replace=True, random_state=seed).to_dict(orient="records")
+    return [json.dumps(r).encode() for r in rows]
+
+
+async def load_test(url, total=2000, concurrency=64):
+    """Fire ``total`` single-row requests with ``concurrency`` in flight; returns a summary dict."""
+    client = tornado.httpclient.AsyncHTTPClient(max_clients=concurrency)
+    bodies = sample_payloads(total)
+    latencies, errors = [], 0
+    pending = iter(bodies)
+
+    async def worker():
+        nonlocal errors
+        for body in pending:
+            start = time.perf_counter()
+            try:
+                await client.fetch(f"{url}/predict", method="POST", body=body,
+                                   headers={"Content-Type": "application/json"})
+            except tornado.httpclient.HTTPClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": total,
+        "errors": errors,
+        "seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else None,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else None,
+    }
+
+
+def _print_summary(name, result):
+    print(f"{name:<14} {result['throughput_rps']:>9,.0f} req/s   p50 {result['p50_ms']:.2f} ms   "
+          f"p95 {result['p95_ms']:.2f} ms   p99 {result['p99_ms']:.2f} ms   errors {result['errors']}")
+
+
+async def _bench(args):
+    scorer = make_scorer(args.model, args.engine)
+    configs = [("one-row/call", 1, 0.0), ("micro-batch", args.max_batch, args.max_wait_ms)]
+    for i, (name, max_batch, max_wait) in enumerate(configs):
+        batcher = MicroBatcher(scorer, max_batch=max_batch, max_wait_ms=max_wait,
+                               max_queue=args.max_queue, workers=args.workers)
+        port = args.port + i
+        server = await start_server(port, batcher)
+        result = await load_test(f"http://127.0.0.1:{port}", args.requests, args.concurrency)
+        _print_summary(name, result)
+        server.stop()
+        await batcher.stop()
+
+
+async def _serve(args):
+    batcher = MicroBatcher(make_scorer(args.model, args.engine), max_batch=args.max_batch,
+                           max_wait_ms=args.max_wait_ms, max_queue=args.max_queue, workers=args.workers)
+    await start_server(args.port, batcher, args.host, args.leaderboard)
+    print(f"Scoring service on http://{args.host}:{args.port} (max_batch={args.max_batch}, "
+          f"max_wait_ms={args.max_wait_ms}, max_queue={args.max_queue}, engine={args.engine})")
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching churn scoring service.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name in ("serve", "bench"):
+        p = sub.add_parser(name)
+        p.add_argument("--model", default=str(MODEL_PATH))
+        p.add_argument("--engine", choices=["forest", "pipeline"], default="forest")
+        p.add_argument("--port", type=int, default=8502)
+        p.add_argument("--max-batch", type=int, default=64)
+        p.add_argument("--max-wait-ms", type=float, default=5.0)
+        p.add_argument("--max-queue", type=int, default=1024)
+        p.add_argument("--workers", type=int, default=4)
+        if name == "serve":
+            p.add_argument("--host", default="127.0.0.1")
+            p.add_argument("--leaderboard", default=str(LEADERBOARD_PATH), help="leaderboard file for /leaderboard")
+        else:
+            p.add_argument("--requests", type=int, default=2000)
+            p.add_argument("--concurrency", type=int, default=64)
+
+    p = sub.add_parser("loadtest")
+    p.add_argument("--url", default="http://127.0.0.1:8502")
+    p.add_argument("--requests", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=64)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        asyncio.run(_serve(args))
+    elif args.command == "bench":
+        asyncio.run(_bench(args))
+    else:
+        _print_summary("load test", asyncio.run(load_test(args.url, args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
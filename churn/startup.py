@@ -0,0 +1,217 @@
+"""Cold start of an app replica: background warm-up and first-paint / first-prediction times.
+
+The pages draw their shell (title, form) before anything heavy is imported or
+loaded. ``warm_up()`` starts one daemon thread per process that waits until the
+shell is drawn (``mark_first_paint``), so it does not compete with it for the
+CPU, and then, while the user fills in the form:
+
+1. opens the memory-mapped compiled forest (exporting it first if stale, which
+   is the only step that imports scikit-learn);
+2. imports pandas and the plotting code behind the prediction, explanation and
+   what-if figures;
+3. builds the drift monitor's reference histograms (``churn.drift``);
+4. loads the shared dataset and its churn cube (or the streaming summary) used
+   by the Data and Analysis pages, the Data page's column profile and the
+   cross-filter bitmap index.
+
+Callers that need one of these just call the usual loader: the model store and
+the dataset cache are locked, so a request that arrives mid-warm-up waits for
+that step instead of doing it twice. ``CHURN_STARTUP=eager`` runs the same steps
+in the foreground before the form, as the app did before, for comparison.
+
+``mark_first_paint()`` / ``mark_first_prediction()`` record, once per process,
+the seconds since the process started (from ``/proc/self/stat``). Each step's
+warm-up time is recorded as well, all under the "startup" page of
+``churn.instrument``, so they appear in the panel and on ``/metrics``.
+
+    python -m churn.startup            # time a cold start: eager vs background warm-up
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from churn import instrument
+from churn.paths import MODEL_PATH
+
+PAGE = "startup"
+PAINT_WAIT = 5.0  # seconds the warm-up waits for the first shell before starting anyway
+
+_lock = threading.Lock()
+_started = False
+_painted = threading.Event()
+_done = threading.Event()
+_marks = {}  # "first_paint" / "first_prediction" -> seconds since process start
+
+
+def _process_start():
+    """Wall-clock time the process was created (module import time where /proc is unavailable)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime, in clock ticks since boot); the command name before it may contain spaces.
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_START = _process_start()
+
+
+def mode():
+    """ "background" (default) or "eager", from CHURN_STARTUP."""
+    return "eager" if os.environ.get("CHURN_STARTUP", "background").lower() == "eager" else "background"
+
+
+# ========== WARM-UP ==========
+def _warm_forest(model_path):
+    from churn import model_store
+
+    model_store.load_forest(model_path)
+
+
+def _warm_drift(model_path):
+    from churn import drift
+
+    drift.get_monitor(model_path)
+
+
+def _warm_figures():
+    import pandas  # noqa: F401
+    import plotly.express  # noqa: F401
+
+    import churn.batch  # noqa: F401
+    import churn.explain  # noqa: F401
+    import churn.whatif  # noqa: F401
+
+
+def _warm_dataset():
+    from churn.bitmaps import load_index
+    from churn.profiler import load_profile
+    from churn.streaming import analysis_mode, load_summary
+
+    if analysis_mode() == "memory":
+        from churn.cube import load_cube
+        from churn.dataset import load_dataset
+
+        df = load_dataset()
+        load_cube(df)
+    else:
+        df = None
+        load_summary()
+    load_profile()
+    load_index(df=df)
+
+
+def steps(model_path=MODEL_PATH):
+    """(name, callable) for every warm-up step, in the order they run."""
+    return [
+        ("forest", lambda: _warm_forest(model_path)),
+        ("figures", _warm_figures),
+        ("drift", lambda: _warm_drift(model_path)),
+        ("dataset", _warm_dataset),
+    ]
+
+
+def _run_steps(model_path, wait=0.0):
+    _painted.wait(wait)
+    for name, step in steps(model_path):
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:  # the page's own call will raise (and show) the same error
+            continue
+        instrument.observe(PAGE, f"warmup_{name}", time.perf_counter() - start)
+    _done.set()
+
+
+def warm_up(model_path=MODEL_PATH):
+    """Start the warm-up once per process: inline in eager mode, else on a daemon thread."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    if mode() == "eager":
+        _run_steps(model_path)
+    else:
+        threading.Thread(target=_run_steps, args=(model_path, PAINT_WAIT), name="churn-warmup", daemon=True).start()
+
+
+def is_warm():
+    return _done.is_set()
+
+
+# ========== COLD-START TIMES ==========
+def _mark(name):
+    if name == "first_paint":
+        _painted.set()
+    with _lock:
+        if name in _marks:
+            return None
+        _marks[name] = time.time() - PROCESS_START
+    instrument.observe(PAGE, f"time_to_{name}", _marks[name])
+    return _marks[name]
+
+
+def mark_first_paint():
+    """Record the seconds from process start to the first drawn page shell (first call only)."""
+    return _mark("first_paint")
+
+
+def mark_first_prediction():
+    """Record the seconds from process start to the first prediction shown (first call only)."""
+    return _mark("first_prediction")
+
+
+def report():
+    return {"mode": mode(), "warm": is_warm(), **{f"time_to_{k}": v for k, v in _marks.items()}}
+
+
+# ========== COMPARISON ==========
+_PROBE = """
+import warnings; warnings.filterwarnings("ignore")
+import json
+from streamlit.testing.v1 import AppTest
+from churn import startup
+at = AppTest.from_file("Main_prediction.py", default_timeout=300).run()
+at.button[0].click().run()
+print(json.dumps(startup.report()))
+"""
+
+
+def compare(repeat=3):
+    """Cold-start times of the prediction page in fresh processes, per start-up mode."""
+    import numpy as np
+
+    from churn.paths import ROOT
+
+    results = {}
+    for startup_mode in ("eager", "background"):
+        runs = []
+        for _ in range(repeat):
+            env = {**os.environ, "CHURN_STARTUP": startup_mode, "PYTHONPATH": str(ROOT)}
+            out = subprocess.run([sys.executable, "-c", _PROBE], cwd=ROOT, env=env, capture_output=True,
+                                 text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        results[startup_mode] = {k: float(np.median([r[k] for r in runs]))
+                                 for k in ("time_to_first_paint", "time_to_first_prediction")}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the prediction page's cold start per start-up mode.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    for startup_mode, times in compare(args.repeat).items():
+        print(f"{startup_mode:<11} first paint {times['time_to_first_paint']:6.2f}s   "
+              f"first prediction {times['time_to_first_prediction']:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
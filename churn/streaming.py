@@ -0,0 +1,178 @@
+"""Out-of-core execution of the Analysis & Insights aggregations.
+
+For exports too large for one DataFrame, the raw CSVs are read in fixed-size
+chunks and each chunk is reduced to a small partial summary: churn cube cells
+(exact counts and churner sums, see ``churn.cube``) and one quantile sketch per
+box plot and Churn value (see ``churn.sketches``). Partials merge associatively,
+so chunks can be reduced in a process pool and combined in any order. Memory is
+bounded by ``chunksize`` times the number of chunks in flight.
+
+``analysis_mode()`` picks between the in-memory dataset and this path from the
+size of the source files; override with ``CHURN_ANALYSIS_MODE=memory|streaming``
+or move the cut-off with ``CHURN_IN_MEMORY_LIMIT_MB``.
+
+    python -m churn.streaming --workers 4 --chunksize 200000
+"""
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from churn.charts import BOX_METRICS
+from churn.cube import ChurnCube
+from churn.dataset import as_bool, source_stamp
+from churn.features import normalize_columns
+from churn.paths import TEST_PATH, TRAIN_PATH
+from churn.sketches import QuantileSketch
+
+DEFAULT_SOURCES = {"train": TRAIN_PATH, "test": TEST_PATH}
+DEFAULT_CHUNKSIZE = 200_000
+DEFAULT_IN_MEMORY_LIMIT_MB = 512
+
+_lock = threading.Lock()
+_summaries = {}
+
+
+def analysis_mode(sources=None):
+    """ "memory" or "streaming", from CHURN_ANALYSIS_MODE or the total size of the sources."""
+    mode = os.environ.get("CHURN_ANALYSIS_MODE", "auto").lower()
+    if mode in ("memory", "streaming"):
+        return mode
+    limit = float(os.environ.get("CHURN_IN_MEMORY_LIMIT_MB", DEFAULT_IN_MEMORY_LIMIT_MB)) * 2**20
+    total = sum(Path(p).stat().st_size for p in (sources or DEFAULT_SOURCES).values())
+    return "memory" if total <= limit else "streaming"
+
+
+@dataclass
+class StreamingSummary:
+    cube: ChurnCube = None
+    boxes: dict = field(default_factory=dict)  # (metric, churn) -> QuantileSketch
+    rows: dict = field(default_factory=dict)  # source name -> row count
+    columns: list = field(default_factory=list)
+
+    def merge(self, other):
+        self.cube = other.cube if self.cube is None else self.cube.merge(other.cube)
+        for key, sketch in other.boxes.items():
+            if key in self.boxes:
+                self.boxes[key].merge(sketch)
+            else:
+                self.boxes[key] = sketch
+        for name, n in other.rows.items():
+            self.rows[name] = self.rows.get(name, 0) + n
+        self.columns = self.columns or other.columns
+        return self
+
+    def box_stats(self, metric):
+        """Quartiles, whisker fences (1.5 IQR, clipped to min/max), mean and count per Churn value."""
+        records = []
+        for churn in (False, True):
+            sketch = self.boxes.get((metric, churn))
+            if sketch is None or sketch.count == 0:
+                continue
+            q1, median, q3 = sketch.quantile(0.25), sketch.quantile(0.5), sketch.quantile(0.75)
+            iqr = q3 - q1
+            records.append({
+                "Churn": churn,
+                "count": sketch.count,
+                "min": sketch.min,
+                "q1": q1,
+                "median": median,
+                "q3": q3,
+                "max": sketch.max,
+                "lowerfence": max(sketch.min, q1 - 1.5 * iqr),
+                "upperfence": min(sketch.max, q3 + 1.5 * iqr),
+                "mean": sketch.mean,
+            })
+        return pd.DataFrame(records)
+
+
+# ========== CHUNK REDUCTION ==========
+def prepare_chunk(chunk):
+    chunk = normalize_columns(chunk)
+    chunk["Churn"] = as_bool(chunk["Churn"])
+    return chunk
+
+
+def iter_prepared(sources=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield typed chunks of every source in order (for exports of row slices)."""
+    for path in (sources or DEFAULT_SOURCES).values():
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            yield prepare_chunk(chunk)
+
+
+def summarize_chunk(chunk, source):
+    """Reduce one raw chunk to a partial StreamingSummary."""
+    chunk = prepare_chunk(chunk)
+    boxes = {}
+    for metric, (column, plan) in BOX_METRICS.items():
+        rows = chunk if plan is None else chunk[chunk[plan].astype(str).str.lower() == "yes"]
+        for churn, values in rows.groupby("Churn")[column]:
+            boxes[(metric, bool(churn))] = QuantileSketch().add(values.to_numpy())
+    return StreamingSummary(
+        cube=ChurnCube.from_frame(chunk),
+        boxes=boxes,
+        rows={source: len(chunk)},
+        columns=list(chunk.columns),
+    )
+
+
+def stream_summary(sources=None, chunksize=DEFAULT_CHUNKSIZE, workers=0):
+    """Summarize every source in chunks; ``workers > 0`` reduces chunks in a process pool."""
+    sources = sources or DEFAULT_SOURCES
+    summary = StreamingSummary()
+    chunks = ((chunk, name) for name, path in sources.items() for chunk in pd.read_csv(path, chunksize=chunksize))
+    if not workers:
+        for chunk, name in chunks:
+            summary.merge(summarize_chunk(chunk, name))
+        return summary
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for chunk, name in chunks:
+            in_flight.append(pool.submit(summarize_chunk, chunk, name))
+            # Bound the chunks held in memory (queued + being reduced) to 2 per worker.
+            if len(in_flight) >= 2 * workers:
+                summary.merge(in_flight.popleft().result())
+        while in_flight:
+            summary.merge(in_flight.popleft().result())
+    return summary
+
+
+def load_summary(sources=None, chunksize=DEFAULT_CHUNKSIZE, workers=None):
+    """Streaming summary of the sources, computed once per process and source version."""
+    sources = sources or DEFAULT_SOURCES
+    key = source_stamp(list(sources.values()))
+    if workers is None:
+        workers = int(os.environ.get("CHURN_ANALYSIS_WORKERS", 0))
+    with _lock:
+        if key not in _summaries:
+            _summaries.clear()
+            _summaries[key] = stream_summary(sources, chunksize, workers)
+        return _summaries[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the analysis aggregations in streaming mode.")
+    parser.add_argument("--train", default=str(TRAIN_PATH))
+    parser.add_argument("--test", default=str(TEST_PATH))
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--workers", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = stream_summary({"train": args.train, "test": args.test}, args.chunksize, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"{sum(summary.rows.values()):,} rows in {elapsed:.2f}s ({len(summary.cube.cells):,} cube cells)")
+    print(summary.cube.rollup(["State"], "sum").sort_values("_churn_num", ascending=False).head(10).to_string(index=False))
+    for metric in BOX_METRICS:
+        print(f"\n{metric}\n{summary.box_stats(metric).to_string(index=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Synthetic bigml-style subscribers for benchmarks at production scale.
+
+``SubscriberModel.fit`` learns from the real exports:
+
+- the joint frequency of (International plan, Voice mail plan, Customer
+  service calls) cells and the churn rate in each cell. Thin cells are shrunk
+  towards a prior that adds the plan and service-call effects on the log-odds
+  scale, so a rare cell such as "both plans, 7 calls" keeps both effects;
+- per-churn-class normal fits (clipped to the observed range) for account
+  length, minutes, calls and voice-mail messages;
+- the per-minute tariff of each period, so charges stay consistent with
+  minutes as in the source data;
+- State and Area code frequencies.
+
+``sample(n)`` draws every column with vectorized NumPy calls and returns the
+raw CSV layout (spaced headers, boolean Churn), so every loader and page reads
+it like the real files. ``write_csv`` emits large files in chunks.
+
+    python -m churn.synthetic 1000000 data/synthetic-1m.csv
+"""
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from churn.dataset import as_bool
+from churn.paths import TEST_PATH, TRAIN_PATH
+
+PERIODS = ["day", "eve", "night", "intl"]
+CELL_COLUMNS = ["International plan", "Voice mail plan", "Customer service calls"]
+CHURN_PRIOR_WEIGHT = 5  # pseudo-rows pulling a cell's churn rate towards its additive prior
+DEFAULT_CHUNKSIZE = 500_000
+
+
+def _logit(p):
+    p = np.clip(p, 1e-3, 1 - 1e-3)
+    return np.log(p / (1 - p))
+
+
+def _additive_prior(df, cells):
+    """Per-cell churn rate from the plan-pair and service-call margins, combined in log-odds."""
+    overall = _logit(df["Churn"].mean())
+    plans = df.groupby(CELL_COLUMNS[:2])["Churn"].mean().rename("plans")
+    calls = df.groupby(CELL_COLUMNS[2])["Churn"].mean().rename("calls")
+    merged = cells.join(plans, on=CELL_COLUMNS[:2]).join(calls, on=CELL_COLUMNS[2])
+    return 1 / (1 + np.exp(-(_logit(merged["plans"]) + _logit(merged["calls"]) - overall)))
+
+
+def _normal_fit(values):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return (0.0, 0.0, 0.0, 0.0)
+    return (values.mean(), values.std(), values.min(), values.max())
+
+
+@dataclass
+class SubscriberModel:
+    columns: list
+    cells: pd.DataFrame  # CELL_COLUMNS + p (cell frequency) + churn_rate
+    numeric: dict  # (column, churn) -> (mean, std, min, max)
+    tariffs: dict  # period -> charge per minute
+    states: pd.Series  # State -> frequency
+    area_codes: pd.Series  # Area code -> frequency
+
+    @classmethod
+    def fit(cls, df):
+        df = df.copy()
+        df["Churn"] = as_bool(df["Churn"])
+        grouped = df.groupby(CELL_COLUMNS)["Churn"]
+        cells = pd.DataFrame({"n": grouped.size(), "churners": grouped.sum()}).reset_index()
+        cells["p"] = cells["n"] / cells["n"].sum()
+        prior = _additive_prior(df, cells)
+        cells["churn_rate"] = (cells["churners"] + CHURN_PRIOR_WEIGHT * prior) / (cells["n"] + CHURN_PRIOR_WEIGHT)
+
+        numeric = {}
+        for churn, rows in df.groupby("Churn"):
+            for column in ["Account length"] + [f"Total {p} {kind}" for p in PERIODS for kind in ("minutes", "calls")]:
+                numeric[(column, bool(churn))] = _normal_fit(rows[column])
+            with_vm = rows[rows["Voice mail plan"] == "Yes"]
+            numeric[("Number vmail messages", bool(churn))] = _normal_fit(with_vm["Number vmail messages"])
+
+        tariffs = {}
+        for period in PERIODS:
+            minutes, charge = df[f"Total {period} minutes"], df[f"Total {period} charge"]
+            tariffs[period] = float((charge[minutes > 0] / minutes[minutes > 0]).median())
+
+        return cls(
+            columns=list(df.columns),
+            cells=cells[CELL_COLUMNS + ["p", "churn_rate"]],
+            numeric=numeric,
+            tariffs=tariffs,
+            states=df["State"].value_counts(normalize=True),
+            area_codes=df["Area code"].value_counts(normalize=True),
+        )
+
+    def _numeric(self, rng, column, churn, decimals):
+        out = np.empty(len(churn))
+        for label in (False, True):
+            mask = churn == label
+            mean, std, lo, hi = self.numeric[(column, label)]
+            out[mask] = np.clip(rng.normal(mean, std, mask.sum()), lo, hi)
+        return np.round(out, decimals)
+
+    def sample(self, n, seed=0):
+        """``n`` synthetic subscribers in the raw CSV layout."""
+        rng = np.random.default_rng(seed)
+        cell = rng.choice(len(self.cells), size=n, p=self.cells["p"].to_numpy())
+        cells = self.cells.iloc[cell]
+        churn = rng.random(n) < cells["churn_rate"].to_numpy()
+
+        out = {
+            "State": rng.choice(self.states.index.to_numpy(), size=n, p=self.states.to_numpy()),
+            "Account length": self._numeric(rng, "Account length", churn, 0).astype(np.int64),
+            "Area code": rng.choice(self.area_codes.index.to_numpy(), size=n, p=self.area_codes.to_numpy()),
+            "International plan": cells["International plan"].to_numpy(),
+            "Voice mail plan": cells["Voice mail plan"].to_numpy(),
+        }
+        vm = self._numeric(rng, "Number vmail messages", churn, 0).astype(np.int64)
+        out["Number vmail messages"] = np.where(out["Voice mail plan"] == "Yes", vm, 0)
+        for period in PERIODS:
+            minutes = self._numeric(rng, f"Total {period} minutes", churn, 1)
+            out[f"Total {period} minutes"] = minutes
+            out[f"Total {period} calls"] = self._numeric(rng, f"Total {period} calls", churn, 0).astype(np.int64)
+            out[f"Total {period} charge"] = np.round(minutes * self.tariffs[period], 2)
+        out["Customer service calls"] = cells["Customer service calls"].to_numpy()
+        out["Churn"] = churn
+        return pd.DataFrame(out)[self.columns]
+
+
+def fit_sources(paths=(TRAIN_PATH, TEST_PATH)):
+    return SubscriberModel.fit(pd.concat([pd.read_csv(p) for p in paths], ignore_index=True))
+
+
+def write_csv(model, path, n, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """Write ``n`` rows to ``path`` in chunks (each chunk with its own derived seed)."""
+    for i, start in enumerate(range(0, n, chunksize)):
+        chunk = model.sample(min(chunksize, n - start), seed=(seed, i))
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic subscribers fitted on the bigml exports.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    write_csv(fit_sources(), args.output, args.rows, args.seed)
+    print(f"{args.rows:,} rows -> {args.output} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
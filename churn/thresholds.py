@@ -0,0 +1,284 @@
+"""Decision threshold tuning on out-of-fold predictions.
+
+The forest answers with a churn probability, and by default a customer is
+flagged when it is above 0.5 (the classifier's argmax). The model was tuned for
+recall, so the retention budget may call for another operating point.
+
+The published model is fitted on both bigml CSVs, so neither file is a holdout:
+scored in-sample it looks perfect (precision 1.0) and a threshold picked there
+is optimistic. The curve is built from out-of-fold probabilities instead. Every
+row is scored by the 5-fold forest (``churn.train``'s StratifiedKFold, with the
+model's hyperparameters) that did not train on it. ``churn.train`` saves them
+next to each version it writes (``<model>.oof.npz``). For other models (the
+shipped one) they are computed once on first use (five forest fits) and saved
+the same way. ``churn.refresh`` saves its own out-of-fold scores over the batch.
+A refreshed version without them can't be tuned, because refitting its
+hyperparameters would not reproduce its warm-started trees.
+
+``load_curve`` builds the whole threshold curve in one pass, once per model
+version. The probabilities are sorted in descending
+order and the labels are cumulatively summed. The end of each run of equal
+probabilities is one candidate threshold ``t`` ("flag when p >= t"), with its
+true and false positives read straight off the cumsums. Precision, recall, F1,
+accuracy and the expected cost for any contact / churn cost are then
+vectorized over those counts, so moving the threshold or the costs is a lookup.
+
+The cost model is ``contact_cost`` per flagged customer plus ``churn_cost`` per
+churner missed. Contacted churners are assumed to be retained.
+
+The chosen threshold is saved next to the model
+(``model/Telecome_Churn_Prediction.threshold.json``) with the model file's size
+and mtime. ``churn_labels`` then applies it on the prediction page, in batch
+scoring and in the scoring service. A retrained or promoted model falls back
+to 0.5 until a threshold is tuned for it.
+
+    python -m churn.thresholds                                  # curve summary and the current threshold
+    python -m churn.thresholds --contact-cost 5 --churn-cost 120 --apply
+    python -m churn.thresholds --set 0.35                       # or --reset
+"""
+import argparse
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from churn.dataset import source_stamp
+from churn.paths import MODEL_PATH
+
+DEFAULT_CONTACT_COST = 10.0  # retention offer / call per flagged customer
+DEFAULT_CHURN_COST = 100.0  # revenue lost per churner not contacted
+ARGMAX_THRESHOLD = float(np.nextafter(0.5, 1.0))  # the default flags p > 0.5, i.e. p >= this
+
+_lock = threading.Lock()
+_curves = {}
+_chosen = {}
+
+
+# ========== CURVE ==========
+class ThresholdCurve:
+    """Confusion counts at every distinct (out-of-fold) probability, highest threshold first.
+
+    Row 0 is "flag nobody" (threshold +inf); row i > 0 flags every customer with
+    probability >= ``thresholds[i]``.
+    """
+
+    def __init__(self, thresholds, tp, fp, positives, rows):
+        self.thresholds = thresholds
+        self.tp = tp
+        self.fp = fp
+        self.positives = positives
+        self.rows = rows
+
+    @classmethod
+    def from_scores(cls, y, proba):
+        order = np.argsort(-proba, kind="stable")
+        p, y = proba[order], np.asarray(y, dtype=np.int64)[order]
+        tp = np.cumsum(y)
+        fp = np.arange(1, len(y) + 1) - tp
+        last = np.r_[p[1:] != p[:-1], True]  # last row of each run of equal probabilities
+        return cls(np.r_[np.inf, p[last]], np.r_[0, tp[last]], np.r_[0, fp[last]], int(y.sum()), len(y))
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def index(self, threshold):
+        """Curve row that ``p >= threshold`` selects."""
+        # thresholds are descending; count those >= threshold on the ascending reversal
+        ascending = self.thresholds[::-1]
+        return int(len(ascending) - np.searchsorted(ascending, threshold, side="left")) - 1
+
+    def metrics(self):
+        """Per-row precision, recall, F1, accuracy and flagged share (arrays)."""
+        flagged = self.tp + self.fp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(flagged > 0, self.tp / flagged, 1.0)
+            recall = self.tp / self.positives if self.positives else np.zeros(len(self))
+            f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        fn = self.positives - self.tp
+        tn = self.rows - self.positives - self.fp
+        return {
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+            "accuracy": (self.tp + tn) / self.rows,
+            "flagged": flagged / self.rows,
+        } | {"tp": self.tp, "fp": self.fp, "fn": fn, "tn": tn}
+
+    def cost(self, contact_cost=DEFAULT_CONTACT_COST, churn_cost=DEFAULT_CHURN_COST):
+        """Expected cost per customer at every row."""
+        return (contact_cost * (self.tp + self.fp) + churn_cost * (self.positives - self.tp)) / self.rows
+
+    def at(self, threshold, contact_cost=DEFAULT_CONTACT_COST, churn_cost=DEFAULT_CHURN_COST):
+        """Metrics of one threshold as a dict of scalars."""
+        i = self.index(threshold)
+        row = {k: v[i].item() for k, v in self.metrics().items()}
+        row["cost"] = float(self.cost(contact_cost, churn_cost)[i])
+        return row
+
+    def best_cost(self, contact_cost=DEFAULT_CONTACT_COST, churn_cost=DEFAULT_CHURN_COST):
+        """Threshold with the lowest expected cost (the highest one among ties)."""
+        return float(self.thresholds[int(np.argmin(self.cost(contact_cost, churn_cost)))])
+
+    def best_f1(self):
+        return float(self.thresholds[int(np.argmax(self.metrics()["f1"]))])
+
+    def frame(self, contact_cost=DEFAULT_CONTACT_COST, churn_cost=DEFAULT_CHURN_COST):
+        """The curve as a DataFrame (without the "flag nobody" row), for charts."""
+        import pandas as pd
+
+        df = pd.DataFrame({"threshold": self.thresholds, **self.metrics(),
+                           "cost": self.cost(contact_cost, churn_cost)})
+        return df.iloc[1:].reset_index(drop=True)
+
+
+# ========== OUT-OF-FOLD SCORES ==========
+def oof_path(model_path=MODEL_PATH):
+    return Path(model_path).with_suffix(".oof.npz")
+
+
+def save_oof(model_path, y, proba):
+    """Save (labels, out-of-fold probabilities) for the current version of ``model_path``."""
+    path = oof_path(model_path)
+    stamp = model_stamp(model_path)
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        np.savez(f, y=np.asarray(y, dtype=np.int8), proba=np.asarray(proba, dtype=np.float64),
+                 mtime_ns=stamp["mtime_ns"], size=stamp["size"])
+    os.replace(tmp, path)
+
+
+def load_oof(model_path=MODEL_PATH):
+    """Saved (labels, out-of-fold probabilities) for ``model_path``, or None when missing or for another version."""
+    try:
+        with np.load(oof_path(model_path)) as saved:
+            if {"mtime_ns": int(saved["mtime_ns"]), "size": int(saved["size"])} != model_stamp(model_path):
+                return None
+            return saved["y"].astype(bool), saved["proba"]
+    except FileNotFoundError:
+        return None
+
+
+def oof_scores(model_path=MODEL_PATH):
+    """(labels, out-of-fold probabilities) for ``model_path``, or None for a refreshed model without them.
+
+    Read from ``<model>.oof.npz``. When missing, the fold forests are fitted once
+    over both CSVs with the model's hyperparameters, and saved.
+    """
+    saved = load_oof(model_path)
+    if saved is not None:
+        return saved
+    from churn import model_store, registry, train
+
+    if (registry.model_record(model_path) or {}).get("kind") == "refresh":
+        return None
+    X, y = train.load_training_data()
+    proba = train.out_of_fold(X, y, train.model_params(model_store.load_model(model_path)), n_jobs=-1)
+    save_oof(model_path, y, proba)
+    return y.astype(bool), proba
+
+
+def load_curve(model_path=MODEL_PATH):
+    """The out-of-fold threshold curve, computed once per model version (None without out-of-fold scores)."""
+    key = source_stamp([model_path])
+    with _lock:
+        entry = _curves.get(str(model_path))
+    if entry is None or entry[0] != key:
+        # Replaces the curve of an older version of the same model
+        scores = oof_scores(model_path)
+        entry = (key, None if scores is None else ThresholdCurve.from_scores(*scores))
+        with _lock:
+            _curves[str(model_path)] = entry
+    return entry[1]
+
+
+# ========== CHOSEN THRESHOLD ==========
+def threshold_path(model_path=MODEL_PATH):
+    return Path(model_path).with_suffix(".threshold.json")
+
+
+def model_stamp(model_path):
+    """Size and mtime of the model file: the version a threshold or out-of-fold scores belong to."""
+    stat = Path(model_path).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_setting(model_path=MODEL_PATH, stamp=None):
+    """The saved threshold record for ``model_path``, or None when unset or tuned for another model version.
+
+    ``stamp`` (``model_stamp``) pins the version to check against instead of the file as it is now.
+    """
+    path = threshold_path(model_path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        cached = _chosen.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _chosen[path] = (mtime, json.loads(path.read_text()))
+    setting = cached[1]
+    return setting if setting.get("model") == (stamp or model_stamp(model_path)) else None
+
+
+def load_threshold(model_path=MODEL_PATH, stamp=None):
+    """Threshold to flag churn at for ``model_path``; None means the default (argmax, i.e. 0.5)."""
+    setting = load_setting(model_path, stamp)
+    return None if setting is None else setting["threshold"]
+
+
+def save_threshold(threshold, model_path=MODEL_PATH, contact_cost=None, churn_cost=None):
+    """Apply ``threshold`` to ``model_path``'s predictions from now on."""
+    path = threshold_path(model_path)
+    setting = {
+        "threshold": float(threshold),
+        "model": model_stamp(model_path),
+        "contact_cost": contact_cost,
+        "churn_cost": churn_cost,
+        "set": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps(setting, indent=2))
+    os.replace(tmp, path)
+    return setting
+
+
+def reset_threshold(model_path=MODEL_PATH):
+    threshold_path(model_path).unlink(missing_ok=True)
+
+
+# ========== CLI ==========
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tune the churn decision threshold on out-of-fold predictions.")
+    parser.add_argument("--model", default=str(MODEL_PATH))
+    parser.add_argument("--contact-cost", type=float, default=DEFAULT_CONTACT_COST)
+    parser.add_argument("--churn-cost", type=float, default=DEFAULT_CHURN_COST)
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--apply", action="store_true", help="save the cost-optimal threshold for the model")
+    action.add_argument("--set", type=float, help="save this threshold for the model")
+    action.add_argument("--reset", action="store_true", help="go back to the default 0.5")
+    args = parser.parse_args(argv)
+
+    curve = load_curve(args.model)
+    if curve is None and not args.reset:
+        parser.error(f"{args.model} is a refreshed model without out-of-fold scores; its threshold can't be tuned")
+    costs = (args.contact_cost, args.churn_cost)
+    if curve is not None:
+        print(f"{len(curve) - 1} distinct thresholds on {curve.rows} out-of-fold rows ({curve.positives} churners)")
+        for name, t in [("default", ARGMAX_THRESHOLD), ("best F1", curve.best_f1()), ("lowest cost", curve.best_cost(*costs))]:
+            m = curve.at(t, *costs)
+            print(f"  {name:<12} t={t:.4f}  precision {m['precision']:.4f}  recall {m['recall']:.4f}  "
+                  f"F1 {m['f1']:.4f}  flagged {m['flagged']:.2%}  cost/customer {m['cost']:.2f}")
+
+    if args.apply or args.set is not None:
+        save_threshold(curve.best_cost(*costs) if args.apply else args.set, args.model, *costs)
+    elif args.reset:
+        reset_threshold(args.model)
+    current = load_threshold(args.model)
+    print(f"applied threshold: {'default (0.5)' if current is None else f'{current:.4f}'}")
+
+
+if __name__ == "__main__":
+    main()
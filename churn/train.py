@@ -0,0 +1,357 @@
+"""Headless retraining of the churn model, reproducing the notebook pipeline.
+
+Pipeline: OrdinalEncoder on the plan flags + RobustScaler on the numeric inputs,
+SMOTETomek (SMOTE to 1820 churners, random_state=24), RandomForest. Candidates
+are scored with 5-fold StratifiedKFold (shuffle, random_state=21) on recall,
+accuracy and precision, and the best mean test recall is refitted on all rows,
+as ``GridSearchCV(..., refit="recall")`` did in the notebook.
+
+The preprocessing and SMOTETomek steps do not depend on the forest's
+hyperparameters, so each fold is transformed and resampled once (and cached on
+disk under ``data/.cache/train``) and every candidate only fits a forest on the
+cached arrays. Candidate x fold fits run in parallel with joblib. ``--search
+halving`` runs successive halving instead of the full grid, with the number of
+trees as the budget: every rung keeps the best third of the candidates and
+triples their share of ``n_estimators``.
+
+Each run writes ``model/versions/<version>.joblib`` plus a JSON record of the
+search, and publishes the model to ``MODEL_PATH`` unless ``--no-publish``.
+``--challenger`` instead registers the version as a challenger, shadow-scored
+next to the published champion (see ``churn.registry``).
+
+    python -m churn.train --jobs -1
+    python -m churn.train --search halving --seed 0
+    python -m churn.train --search halving --challenger
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import imblearn
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from imblearn.combine import SMOTETomek
+from imblearn.over_sampling import SMOTE
+from imblearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold
+from sklearn.preprocessing import OrdinalEncoder, RobustScaler
+
+from churn import registry, thresholds
+from churn.dataset import as_bool, source_stamp
+from churn.features import FEATURE_COLUMNS, normalize_columns, to_model_frame
+from churn.paths import MODEL_PATH, ROOT, TEST_PATH, TRAIN_PATH, VERSIONS_DIR
+
+# ========== NOTEBOOK SETTINGS ==========
+PARAM_GRID = {
+    "RF__n_estimators": [250, 270, 300],
+    "RF__max_depth": [9, 10, 11],
+    "RF__min_samples_split": [14, 15, 16],
+    "RF__min_samples_leaf": [3, 4, 5],
+}
+# The notebook's encoder lists Voice_mail_plan first; keep it so artifacts match the shipped model.
+ENCODED_COLUMNS = ["Voice_mail_plan", "International_plan"]
+SCALED_COLUMNS = [c for c in FEATURE_COLUMNS if c not in ENCODED_COLUMNS]
+SMOTE_STRATEGY = {1: 1820}
+SMOTE_SEED = 24
+CV_SPLITS = 5
+CV_SEED = 21
+SCORERS = {
+    "recall": recall_score,
+    "accuracy": accuracy_score,
+    "precision": lambda y, pred: precision_score(y, pred, zero_division=0),
+}
+REFIT = "recall"
+HALVING_FACTOR = 3
+
+CACHE_DIR = ROOT / "data" / ".cache" / "train"
+
+
+# ========== PIPELINE ==========
+def build_preprocessor():
+    return ColumnTransformer(
+        transformers=[
+            ("cat", OrdinalEncoder(), ENCODED_COLUMNS),
+            ("num_scaling", RobustScaler(), SCALED_COLUMNS),
+        ],
+        remainder="passthrough",
+    )
+
+
+def build_sampler():
+    return SMOTETomek(smote=SMOTE(sampling_strategy=dict(SMOTE_STRATEGY), random_state=SMOTE_SEED))
+
+
+def build_pipeline(**params):
+    """Unfitted notebook pipeline; ``params`` use GridSearchCV names (``RF__max_depth``)."""
+    pipeline = Pipeline(steps=[
+        ("preprocessing", build_preprocessor()),
+        ("SmoteTomek", build_sampler()),
+        ("RF", RandomForestClassifier()),
+    ])
+    return pipeline.set_params(**params)
+
+
+def load_training_data(train_path=TRAIN_PATH, test_path=TEST_PATH):
+    """(X, y) over both CSVs, as the notebook concatenated them before the search."""
+    df = normalize_columns(pd.concat([pd.read_csv(train_path), pd.read_csv(test_path)], ignore_index=True))
+    y = as_bool(df["Churn"]).astype(np.int64).to_numpy()
+    return to_model_frame(df).reset_index(drop=True), y
+
+
+# ========== FOLDS ==========
+@dataclass
+class Fold:
+    X_fit: np.ndarray  # transformed + resampled training rows (what the forest is fitted on)
+    y_fit: np.ndarray
+    X_train: np.ndarray  # transformed training rows before resampling (train scores)
+    y_train: np.ndarray
+    X_test: np.ndarray
+    y_test: np.ndarray
+
+
+def prepare_fold(X, y, train_idx, test_idx):
+    """Fit the preprocessing and resample one fold, exactly as the pipeline's fit would."""
+    preprocessor = build_preprocessor()
+    X_train = preprocessor.fit_transform(X.iloc[train_idx])
+    X_fit, y_fit = build_sampler().fit_resample(X_train, y[train_idx])
+    return Fold(X_fit, y_fit, X_train, y[train_idx], preprocessor.transform(X.iloc[test_idx]), y[test_idx])
+
+
+def cv_splits(X, y):
+    return list(StratifiedKFold(n_splits=CV_SPLITS, shuffle=True, random_state=CV_SEED).split(X, y))
+
+
+def prepare_folds(X, y, n_jobs=None, cache=True):
+    prepare = joblib.Memory(CACHE_DIR, verbose=0).cache(prepare_fold) if cache else prepare_fold
+    return joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(prepare)(X, y, train_idx, test_idx) for train_idx, test_idx in cv_splits(X, y)
+    )
+
+
+def _rf_params(params, n_estimators=None, random_state=None):
+    rf = {name.split("__", 1)[1]: value for name, value in params.items()}
+    if n_estimators is not None:
+        rf["n_estimators"] = n_estimators
+    return {**rf, "random_state": random_state, "n_jobs": 1}
+
+
+def fit_and_score(fold, params, n_estimators=None, random_state=None):
+    """Fit one forest on a cached fold; returns {"test_<metric>": ..., "train_<metric>": ...}."""
+    forest = RandomForestClassifier(**_rf_params(params, n_estimators, random_state)).fit(fold.X_fit, fold.y_fit)
+    scores = {}
+    for split, X_, y_ in (("test", fold.X_test, fold.y_test), ("train", fold.X_train, fold.y_train)):
+        pred = forest.predict(X_)
+        for name, scorer in SCORERS.items():
+            scores[f"{split}_{name}"] = scorer(y_, pred)
+    return scores
+
+
+# ========== OUT-OF-FOLD ==========
+def _fold_proba(fold, params, random_state=None):
+    forest = RandomForestClassifier(**_rf_params(params, random_state=random_state)).fit(fold.X_fit, fold.y_fit)
+    return forest.predict_proba(fold.X_test)[:, 1]
+
+
+def out_of_fold(X, y, params, folds=None, n_jobs=None, random_state=None):
+    """Churn probability of every row from the fold forest that did not train on it.
+
+    Same folds as the search, so the result is an honest (not in-sample) view of a
+    model refitted on all rows with ``params``; ``churn.thresholds`` tunes on it.
+    """
+    folds = folds if folds is not None else prepare_folds(X, y, n_jobs)
+    probas = joblib.Parallel(n_jobs=n_jobs)(joblib.delayed(_fold_proba)(fold, params, random_state) for fold in folds)
+    proba = np.empty(len(y))
+    for (_, test_idx), fold_proba in zip(cv_splits(X, y), probas):
+        proba[test_idx] = fold_proba
+    return proba
+
+
+def model_params(pipeline):
+    """Search parameters (GridSearchCV names) of a fitted pipeline's forest."""
+    forest = pipeline.steps[-1][1]
+    return {name: (len(forest.estimators_) if name == "RF__n_estimators" else getattr(forest, name.split("__", 1)[1]))
+            for name in PARAM_GRID}
+
+
+# ========== SEARCH ==========
+def candidates(grid=PARAM_GRID):
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def evaluate(folds, params_list, n_jobs=None, tree_fraction=1.0, random_state=None):
+    """Mean/std CV scores per candidate (one row each, in ``params_list`` order)."""
+    trees = [
+        max(1, round(p["RF__n_estimators"] * tree_fraction)) if tree_fraction < 1 else None
+        for p in params_list
+    ]
+    scores = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(fit_and_score)(fold, params, n, random_state)
+        for params, n in zip(params_list, trees) for fold in folds
+    )
+    rows = []
+    for i, params in enumerate(params_list):
+        per_fold = pd.DataFrame(scores[i * len(folds):(i + 1) * len(folds)])
+        row = {"params": params, "n_trees": trees[i] or params["RF__n_estimators"]}
+        for column in per_fold:
+            split, name = column.split("_", 1)
+            row[f"mean_{split}_{name}"] = per_fold[column].mean()
+            row[f"std_{split}_{name}"] = per_fold[column].std(ddof=0)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _best(results):
+    """Index of the best mean test score for REFIT; ties go to the first candidate, as in GridSearchCV."""
+    return int(np.argmax(results[f"mean_test_{REFIT}"].to_numpy()))
+
+
+def grid_search(folds, params_list, n_jobs=None, random_state=None):
+    results = evaluate(folds, params_list, n_jobs, random_state=random_state)
+    results["rung"] = 0
+    return results, results["params"].iloc[_best(results)]
+
+
+def halving_search(folds, params_list, n_jobs=None, random_state=None, factor=HALVING_FACTOR):
+    """Successive halving with the forest size as the resource; the last rung fits full forests."""
+    n_rungs = max(1, math.ceil(math.log(len(params_list), factor)))
+    survivors = list(params_list)
+    frames = []
+    for rung in range(n_rungs):
+        fraction = float(factor) ** (rung - n_rungs + 1)
+        results = evaluate(folds, survivors, n_jobs, fraction, random_state).assign(rung=rung)
+        frames.append(results)
+        keep = max(1, math.ceil(len(survivors) / factor))
+        # Stable sort keeps grid order among ties, like GridSearchCV's rank.
+        order = np.argsort(-results[f"mean_test_{REFIT}"].to_numpy(), kind="stable")
+        survivors = [survivors[i] for i in order[:keep]]
+    last = frames[-1]
+    return pd.concat(frames, ignore_index=True), last["params"].iloc[_best(last)]
+
+
+# ========== RUN ==========
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    yield
+    timings[name] = time.perf_counter() - start
+
+
+def _dump_atomic(model, target):
+    tmp = target.with_name(f"{target.name}.tmp{os.getpid()}")
+    joblib.dump(model, tmp)
+    os.replace(tmp, target)
+
+
+def new_version():
+    return datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+
+
+def save_version(model, record, timings, publish=True, model_path=MODEL_PATH, challenger=False, oof=None):
+    """Write ``model/versions/<version>.joblib`` + ``.json`` and optionally publish to ``model_path``.
+
+    ``record`` must carry a "version"; artifact, published path, library
+    versions and the stage ``timings`` (including this save) are added to it.
+    A version published to MODEL_PATH becomes the registry's champion, an
+    unpublished one with ``challenger`` is registered as a challenger (see
+    ``churn.registry``). ``oof`` (labels, out-of-fold probabilities) is saved next to
+    the artifact and the published model for threshold tuning (``churn.thresholds``).
+    """
+    version, model_path = record["version"], Path(model_path)
+    with _stage(timings, "save"):
+        VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+        artifact = VERSIONS_DIR / f"{version}.joblib"
+        _dump_atomic(model, artifact)
+        if publish:
+            _dump_atomic(model, model_path)
+        if oof is not None:
+            thresholds.save_oof(artifact, *oof)
+            if publish:
+                thresholds.save_oof(model_path, *oof)
+    record.update({
+        "artifact": str(artifact.relative_to(ROOT)),
+        "published": str(model_path) if publish else None,
+        "oof": oof is not None,
+        "libraries": {"sklearn": sklearn.__version__, "imblearn": imblearn.__version__},
+        "timings": timings,
+    })
+    (VERSIONS_DIR / f"{version}.json").write_text(json.dumps(record, indent=2))
+    if publish and model_path.resolve() == MODEL_PATH.resolve():
+        registry.set_champion(version)
+    elif challenger and not publish:
+        registry.add_challenger(version)
+    return record
+
+
+def train(train_path=TRAIN_PATH, test_path=TEST_PATH, search="grid", n_jobs=None, random_state=None,
+          publish=True, model_path=MODEL_PATH, grid=PARAM_GRID, cache=True, challenger=False):
+    """Search, refit and save a new model version; returns (metadata record, CV results)."""
+    timings = {}
+    with _stage(timings, "load"):
+        X, y = load_training_data(train_path, test_path)
+    with _stage(timings, "folds"):
+        folds = prepare_folds(X, y, n_jobs, cache)
+    with _stage(timings, "search"):
+        run = halving_search if search == "halving" else grid_search
+        results, best_params = run(folds, candidates(grid), n_jobs, random_state)
+    with _stage(timings, "refit"):
+        model = build_pipeline(**best_params, RF__random_state=random_state).fit(X, y)
+    with _stage(timings, "oof"):
+        oof = y, out_of_fold(X, y, best_params, folds, n_jobs, random_state)
+
+    best = results[results["params"].map(lambda p: p == best_params)].iloc[-1]
+    record = {
+        "version": new_version(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "kind": "train",
+        "search": search,
+        "best_params": best_params,
+        "cv": {k: float(v) for k, v in best.items() if k.startswith(("mean_", "std_"))},
+        "candidates": len(candidates(grid)),
+        "fits": int(len(results) * len(folds)),
+        "rows": int(len(y)),
+        "sources": source_stamp([train_path, test_path]),
+        "random_state": random_state,
+    }
+    return save_version(model, record, timings, publish, model_path, challenger, oof), results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the churn model with the notebook's search.")
+    parser.add_argument("--train", default=str(TRAIN_PATH))
+    parser.add_argument("--test", default=str(TEST_PATH))
+    parser.add_argument("--search", choices=["grid", "halving"], default="grid")
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel fits (-1 = all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="RandomForest random_state (notebook: unset)")
+    parser.add_argument("--no-publish", action="store_true", help=f"only write model/versions, not {MODEL_PATH.name}")
+    parser.add_argument("--no-cache", action="store_true", help="recompute the preprocessed folds")
+    parser.add_argument("--challenger", action="store_true",
+                        help="don't publish; shadow-score the new version next to the champion (churn.registry)")
+    args = parser.parse_args(argv)
+
+    record, results = train(args.train, args.test, args.search, args.jobs, args.seed,
+                            publish=not (args.no_publish or args.challenger), cache=not args.no_cache,
+                            challenger=args.challenger)
+    top = results.sort_values(["rung", f"mean_test_{REFIT}"], ascending=False).head(5)
+    print(top[["params", "n_trees", "mean_test_recall", "mean_test_accuracy", "mean_test_precision"]].to_string(index=False))
+    print(f"\nversion {record['version']} ({record['fits']} forest fits) -> {record['artifact']}")
+    print("best:", record["best_params"])
+    print("cv:", {k: round(v, 4) for k, v in record["cv"].items() if k.startswith("mean_test")})
+    for stage, seconds in record["timings"].items():
+        print(f"  {stage:<8}{seconds:8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
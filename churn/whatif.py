@@ -0,0 +1,134 @@
+"""Counterfactual "what-if" sweeps around one customer profile.
+
+A sweep varies one or two raw inputs over their whole range (every value of an
+integer slider, evenly spaced points for a charge, both choices for a plan)
+while every other input keeps the customer's value. The derived features are
+recomputed for every point, and the grid is scored with a single
+``predict_proba`` call on the compiled forest.
+
+    python -m churn.whatif Customer_service_calls International_plan
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from churn.features import FEATURE_COLUMNS, INPUT_RANGES, build_input_frame, derive_features
+
+PROBA_COLUMN = "Churn_probability"
+DEFAULT_POINTS = 25  # per continuous feature; integer sliders with fewer values use all of them
+
+
+def sweep_values(feature, points=DEFAULT_POINTS):
+    """Values a sweep tries for ``feature``: choices, every integer, or ``points`` even steps."""
+    domain = INPUT_RANGES[feature]
+    if isinstance(domain, list):
+        return np.array(domain, dtype=object)
+    lo, hi = domain
+    if isinstance(lo, int):
+        if hi - lo + 1 <= max(points, 2) * 2:
+            return np.arange(lo, hi + 1)
+        return np.unique(np.linspace(lo, hi, points).round().astype(np.int64))
+    return np.round(np.linspace(lo, hi, points), 2)
+
+
+def counterfactual_grid(base, sweeps):
+    """Model-input rows for every combination of ``sweeps`` ({feature: values}) around ``base``.
+
+    ``base`` is a one-row model frame (see ``build_input_frame``); rows are in
+    C order over the sweep features, so a 2-D result reshapes to (len(a), len(b)).
+    """
+    shape = tuple(len(v) for v in sweeps.values())
+    index = np.indices(shape).reshape(len(shape), -1)
+    # Plain arrays until the end: derive_features only needs column access and arithmetic.
+    columns = {c: np.repeat(base[c].to_numpy(), index.shape[1]) for c in FEATURE_COLUMNS}
+    for (feature, values), idx in zip(sweeps.items(), index):
+        columns[feature] = np.asarray(values)[idx]
+    return pd.DataFrame(derive_features(columns), columns=FEATURE_COLUMNS)
+
+
+def sweep(forest, base, features, points=DEFAULT_POINTS):
+    """Churn probability over the counterfactual grid of ``features`` (one or two names).
+
+    Returns the swept columns plus ``Churn_probability``, one row per grid point.
+    """
+    sweeps = {f: sweep_values(f, points) for f in features}
+    grid = counterfactual_grid(base, sweeps)
+    proba = forest.predict_proba_frame(grid)[:, 1]
+    return grid[list(features)].assign(**{PROBA_COLUMN: proba})
+
+
+# ========== FIGURES ==========
+def _label(feature):
+    return feature.replace("_", " ")
+
+
+def response_figure(result, feature, current):
+    """Line of churn probability against one feature, with the customer's value marked."""
+    fig = px.line(result, x=feature, y=PROBA_COLUMN, markers=True,
+                  labels={feature: _label(feature), PROBA_COLUMN: "Churn probability"},
+                  title=f"Churn probability vs {_label(feature)}")
+    if isinstance(current, str):
+        fig.add_vline(x=current, line_dash="dash")  # annotations need a numeric axis
+    else:
+        fig.add_vline(x=current, line_dash="dash", annotation_text="current")
+    fig.add_hline(y=0.5, line_dash="dot", line_color="gray")
+    fig.update_yaxes(range=[0, 1], tickformat=".0%")
+    return fig
+
+
+def heatmap_figure(result, x, y, current):
+    """Heatmap of churn probability over two features, with the customer's point marked."""
+    table = result.pivot(index=y, columns=x, values=PROBA_COLUMN)
+    fig = go.Figure(go.Heatmap(
+        x=table.columns.astype(str) if table.columns.dtype == object else table.columns,
+        y=table.index.astype(str) if table.index.dtype == object else table.index,
+        z=table.to_numpy(),
+        zmin=0,
+        zmax=1,
+        colorscale="RdYlGn_r",
+        colorbar={"title": "Churn prob.", "tickformat": ".0%"},
+    ))
+    fig.add_trace(go.Scatter(x=[current[x]], y=[current[y]], mode="markers", name="current",
+                             marker={"symbol": "x", "size": 12, "color": "black"}))
+    fig.update_layout(title=f"Churn probability: {_label(x)} x {_label(y)}",
+                      xaxis_title=_label(x), yaxis_title=_label(y), showlegend=False)
+    return fig
+
+
+def main(argv=None):
+    from churn import model_store
+    from churn.paths import MODEL_PATH
+
+    parser = argparse.ArgumentParser(description="Time a counterfactual sweep against one prediction.")
+    parser.add_argument("features", nargs="+", choices=list(INPUT_RANGES))
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    forest = model_store.load_forest(MODEL_PATH)
+    pipeline = model_store.load_model(MODEL_PATH)
+    base = build_input_frame(
+        **{f: (d[0] if isinstance(d, list) else (d[0] + d[1]) / 2) for f, d in INPUT_RANGES.items()}
+    )
+    for label, fn in (("pipeline, one row", lambda: pipeline.predict_proba(base)),
+                      ("forest, one row", lambda: forest.predict_proba_frame(base)),
+                      ("sweep", lambda: sweep(forest, base, args.features, args.points))):
+        fn()
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            out = fn()
+            times.append(time.perf_counter() - start)
+        print(f"{label:<18} {len(out):>5} points  p50 {np.median(times) * 1e3:6.2f} ms")
+
+    grid = counterfactual_grid(base, {f: sweep_values(f, args.points) for f in args.features})
+    exact = np.array_equal(forest.predict_proba_frame(grid), pipeline.predict_proba(grid))
+    print(f"sweep probabilities identical to the pipeline: {exact}")
+
+
+if __name__ == "__main__":
+    main()
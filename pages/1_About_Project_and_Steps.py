@@ -1,6 +1,11 @@
 import streamlit as st
 
+from churn import instrument, startup
+
 st.set_page_config(page_title="About Project & Steps", layout="wide")
+instrument.start_run("about")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
 
 st.title(" About Project & Steps")
 st.markdown("---")
@@ -51,3 +56,5 @@ st.markdown("""
 - Machine Learning Algorithms: Random Forest, GridSearchCV  
 - Deployed using Streamlit for **interactive prediction & analysis**
 """)
+
+instrument.sidebar_panel()
@@ -1,44 +1,104 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
+
+from churn import instrument, startup
+from churn.dataset import data_columns, load_dataset, split
+from churn.paths import TEST_PATH, TRAIN_PATH
+from churn.profiler import load_profile
+from churn.streaming import analysis_mode, prepare_chunk
 
 # ---------- PAGE HEADER ----------
 st.markdown("<h1 style='color:#1E88E5; font-weight:700;'> Data Information & Feature Overview</h1>", unsafe_allow_html=True)
 st.markdown("<p style='color:#555;'>Quick overview of the training and testing data, along with feature explanations.</p>", unsafe_allow_html=True)
 st.write("---")
+instrument.start_run("data_information")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
 
 # ---------- LOAD DATA ----------
-train_path = "data/churn-bigml-80.csv"
-test_path = "data/churn-bigml-20.csv"
-
-@st.cache_data
-def load_data(train_path, test_path):
-    train_df = pd.read_csv(train_path)
-    test_df = pd.read_csv(test_path)
-    merged = pd.concat([train_df, test_df], ignore_index=True)
-    return train_df, test_df, merged
+if analysis_mode() == "memory":
+    with instrument.timed("load_dataset"):
+        merged = load_dataset()
+    train_df = split(merged, "train")
+    test_df = split(merged, "test")
+    columns = data_columns(merged)
+    n_train, n_test = len(train_df), len(test_df)
+else:
+    # Too large to load: row counts come from the profiling pass, previews from the first rows
+    with instrument.timed("read_preview"):
+        train_df = prepare_chunk(pd.read_csv(TRAIN_PATH, nrows=5))
+        test_df = prepare_chunk(pd.read_csv(TEST_PATH, nrows=5))
 
-train_df, test_df, merged = load_data(train_path, test_path)
+# One chunked pass over both CSVs in either mode, cached per source version (see churn.profiler)
+with instrument.timed("load_profile"):
+    profile = load_profile()
+if analysis_mode() != "memory":
+    columns = list(profile.columns)
+    n_train, n_test = profile.rows["train"], profile.rows["test"]
 
 # ---------- BASIC INFO ----------
 col1, col2, col3 = st.columns(3)
-col1.metric("Train shape", f"{train_df.shape[0]} rows × {train_df.shape[1]} cols")
-col2.metric("Test shape", f"{test_df.shape[0]} rows × {test_df.shape[1]} cols")
-col3.metric("Total merged rows", f"{merged.shape[0]}")
+col1.metric("Train shape", f"{n_train} rows × {len(columns)} cols")
+col2.metric("Test shape", f"{n_test} rows × {len(columns)} cols")
+col3.metric("Total merged rows", f"{n_train + n_test}")
 
 st.write("---")
 
 # ---------- PREVIEW ----------
 st.subheader(" Data Preview")
 
+col1, col2 = st.columns(2)
+with instrument.timed("preview_tables"):
+    with col1:
+        st.markdown("**Training Data (80%)**")
+        st.dataframe(train_df.head(5)[columns], use_container_width=True)
+    with col2:
+        st.markdown("**Testing Data (20%)**")
+        st.dataframe(test_df.head(5)[columns], use_container_width=True)
+
+st.info(f" Training dataset shape: {(n_train, len(columns))} | Testing dataset shape: {(n_test, len(columns))}")
+
+st.write("---")
+
+# ---------- DATA PROFILE ----------
+st.subheader(" Data Profile")
+st.caption("Computed in one streaming pass: exact counts, nulls, means and correlations; "
+           "quartiles within 1% and distinct counts of high-cardinality columns are approximate (≈).")
+
+with instrument.timed("profile_tables"):
+    st.markdown("**Numeric columns**")
+    st.dataframe(profile.describe().rename(columns={"distinct": "distinct ≈", "outliers": "outliers (1.5 IQR)"}),
+                 use_container_width=True,
+                 column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                for c in ["mean", "std", "min", "25%", "50%", "75%", "max"]})
+    st.markdown("**All columns**")
+    st.dataframe(profile.overview(), hide_index=True, use_container_width=True)
+
 col1, col2 = st.columns(2)
 with col1:
-    st.markdown("**Training Data (80%)**")
-    st.dataframe(train_df.head(5), use_container_width=True)
+    counted = [name for name, c in profile.columns.items() if c.values is not None]
+    name = st.selectbox("Value counts of", counted, index=counted.index("International_plan")
+                        if "International_plan" in counted else 0, key="profile_values")
+    with instrument.timed("figure_value_counts"):
+        counts = profile.value_counts(name).reset_index()
+        counts[name] = counts[name].astype(str)
+        fig = px.bar(counts, x=name, y="count", title=f"{name} value counts")
+    st.plotly_chart(fig, use_container_width=True)
 with col2:
-    st.markdown("**Testing Data (20%)**")
-    st.dataframe(test_df.head(5), use_container_width=True)
+    with instrument.timed("figure_churn_correlation"):
+        corr = profile.churn_correlation().rename("correlation").rename_axis("feature").reset_index()
+        fig = px.bar(corr, x="correlation", y="feature", orientation="h", title="Correlation with Churn",
+                     color="correlation", color_continuous_scale="RdBu_r", range_color=[-1, 1])
+        fig.update_layout(yaxis={"categoryorder": "total ascending"}, coloraxis_showscale=False)
+    st.plotly_chart(fig, use_container_width=True)
 
-st.info(f" Training dataset shape: {train_df.shape} | Testing dataset shape: {test_df.shape}")
+if st.checkbox("Show full correlation heatmap", key="profile_heatmap"):
+    with instrument.timed("figure_correlation_heatmap"):
+        fig = px.imshow(profile.correlation().round(2), text_auto=True, aspect="auto",
+                        color_continuous_scale="RdBu_r", zmin=-1, zmax=1, title="Correlation matrix")
+        fig.update_layout(height=700)
+    st.plotly_chart(fig, use_container_width=True)
 
 st.write("---")
 
@@ -63,3 +123,6 @@ st.markdown("""
 st.write("---")
 
 st.markdown("<p style='color:#777; font-size:15px;'>Tip: You can inspect the dataset further in the analysis section for detailed visuals and insights.</p>", unsafe_allow_html=True)
+
+# ---------- PERFORMANCE PANEL ----------
+instrument.sidebar_panel()
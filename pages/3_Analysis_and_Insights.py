@@ -1,31 +1,71 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
+from churn import exports, instrument, startup
+from churn.bitmaps import load_index
+from churn.charts import box_figure, frame_summaries, histogram_figure
+from churn.cube import load_cube
+from churn.dataset import CHURN_NUM, data_columns, load_dataset, source_stamp
+from churn.streaming import DEFAULT_SOURCES, analysis_mode, iter_prepared, load_summary
+
 # ================== PAGE SETUP ==================
 st.set_page_config(page_title="Analysis & Insights", layout="wide")
 st.title("📊 Telecom Churn Analysis & Insights")
+instrument.start_run("analysis")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
 
 # ================== LOAD DATA ==================
-@st.cache_data
-def load_data(train_path="data/churn-bigml-80.csv", test_path="data/churn-bigml-20.csv"):
-    train_df = pd.read_csv(train_path)
-    test_df = pd.read_csv(test_path)
-    df = pd.concat([train_df, test_df], ignore_index=True)
-    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
-    if df["Churn"].dtype == object:
-        df["_churn_num"] = df["Churn"].apply(lambda x: 1 if str(x).lower() in ("yes", "y", "true", "1") else 0)
-    else:
-        df["_churn_num"] = df["Churn"]
-    return df
+mode = analysis_mode()
+if mode == "memory":
+    # Shared typed dataset (read-only; one copy per process for every page and session)
+    with instrument.timed("load_dataset"):
+        df = load_dataset()
+    summary = None
+    # Pre-aggregated counts / churners per (State, plans, service calls, tenure bucket) cell
+    with instrument.timed("load_cube"):
+        cube = load_cube(df)
+    columns = list(df.columns)
+else:
+    # Exports too large for one DataFrame: chunked summaries (exact counts, sketched box plots)
+    df = None
+    with instrument.timed("load_summary"):
+        summary = load_summary()
+    cube = summary.cube
+    columns = summary.columns + [CHURN_NUM]
+
+# Exports are cached per analysis and dataset version
+data_version = exports.dataset_version(source_stamp(list(DEFAULT_SOURCES.values())))
+
+
+def download_export(name, chunks):
+    """Format picker and "Prepare download" button. Only the run of that click encodes the file
+    (or takes it from the export cache) and renders the download button, so other reruns
+    never read the file into the page."""
+    fmt_col, button_col = st.columns([2, 3])
+    fmt = fmt_col.radio("Format", list(exports.FORMATS), horizontal=True, key=f"fmt_{name}", label_visibility="collapsed")
+    cached = exports.is_ready(name, data_version, fmt)
+    if button_col.button("Prepare download", key=f"prepare_{name}",
+                         help="Already exported; served from the cache" if cached else None):
+        with instrument.timed(f"export_{name}"):
+            path = exports.get_export(name, data_version, fmt, chunks)
+        with open(path, "rb") as f:
+            button_col.download_button(
+                "📥 Download Data",
+                data=f,
+                file_name=f"{name}{exports.FORMATS[fmt][0]}",
+                mime=exports.FORMATS[fmt][1],
+                key=f"download_{name}",
+            )
 
-df = load_data()
 
 # ================== SIDEBAR ==================
+st.sidebar.caption(f"Data mode: {mode}")
 st.sidebar.header("📂 Select Analysis Category")
 category = st.sidebar.selectbox(
     "Choose Analysis Section:",
-    ["1️⃣ Customer Profile", "2️⃣ Service Plans", "3️⃣ Customer Service", "4️⃣ Usage & Charges", "5️⃣ Multivariate Analysis"]
+    ["1️⃣ Customer Profile", "2️⃣ Service Plans", "3️⃣ Customer Service", "4️⃣ Usage & Charges", "5️⃣ Multivariate Analysis",
+     "6️⃣ Cross-filter"]
 )
 
 # Sub-analysis for each category
@@ -42,21 +82,23 @@ if category == "1️⃣ Customer Profile" and sub == "1 - Churn Rate by State":
     st.markdown("### 1️⃣ Does churn rate vary by State?")
     st.markdown("#### We want to know: Are there specific geographic regions with higher churn?")
 
-    if "State" in df.columns and "_churn_num" in df.columns:
-        state_churn = df.groupby("State")["_churn_num"].sum().reset_index().sort_values("_churn_num", ascending=False).head(20)
+    if "State" in columns and "_churn_num" in columns:
+        with instrument.timed("rollup_state_churn"):
+            state_churn = cube.rollup(["State"], "sum").sort_values("_churn_num", ascending=False).head(20)
 
-        fig = px.bar(
-            state_churn,
-            x="State",
-            y="_churn_num",
-            title="Top 20 States by Churn Count",
-            labels={"_churn_num": "Churn Count"}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        with instrument.timed("figure_state_churn"):
+            fig = px.bar(
+                state_churn,
+                x="State",
+                y="_churn_num",
+                title="Top 20 States by Churn Count",
+                labels={"_churn_num": "Churn Count"}
+            )
+            st.plotly_chart(fig, use_container_width=True)
 
         st.markdown("**Insight:** States like WV, MN, and NY have the highest number of churners (over 80–100 each), while states like NJ and NC are lower (~68).")
         st.markdown("**Recommendation:** Investigate high-churn states for possible regional causes such as coverage issues, pricing, or customer service gaps.")
-        st.download_button("📥 Download Data (CSV)", data=state_churn.to_csv(index=False).encode("utf-8"), file_name="state_churn.csv")
+        download_export("state_churn", lambda: exports.frame_chunks(state_churn))
     else:
         st.warning("Columns 'State' or 'Churn' not found in the dataset.")
 
@@ -64,15 +106,23 @@ elif category == "1️⃣ Customer Profile" and sub == "2 - Account Length vs Ch
     st.markdown("### 2️⃣ Account Length vs Churn")
     st.markdown("#### We want to see if tenure (time with company) affects churn rate.")
 
-    if "Account_length" in df.columns and "_churn_num" in df.columns:
-        fig = px.box(
-            df,
-            x="Churn",
-            y="Account_length",
-            title="Account Length vs Churn",
-            labels={"Churn": "Churn (0=No, 1=Yes)", "Account_length": "Account Length (days)"}
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    if "Account_length" in columns and "_churn_num" in columns:
+        # Quartiles / whiskers / outlier sample are computed here; only the summary goes to the browser
+        with instrument.timed("box_summaries_account_length"):
+            if summary is None:
+                stats, hist = frame_summaries(df, "Account_length")
+            else:
+                stats, hist = summary.box_stats("Account_length"), None
+        with instrument.timed("figure_account_length"):
+            fig = box_figure(
+                stats,
+                title="Account Length vs Churn",
+                labels={"Churn": "Churn (0=No, 1=Yes)"},
+                y_label="Account Length (days)"
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        if hist is not None and st.checkbox("Show distribution", key="hist_account_length"):
+            st.plotly_chart(histogram_figure(hist, title="Account Length Distribution by Churn", labels={"Churn": "Churn"}, x_label="Account Length (days)"), use_container_width=True)
 
         st.markdown("**Insight:** Account length looks very similar for churners and non-churners. The median and spread overlap a lot, meaning tenure alone does not explain churn.")
         st.markdown("**Recommendation:** Customer loyalty is not guaranteed by tenure — focus on service quality and engagement to reduce churn.")
@@ -92,22 +142,24 @@ elif category == "2️⃣ Service Plans":
         st.markdown("### 3️⃣ Do customers with an International Plan churn more often?")
         st.markdown("#### High-value but also sensitive segment")
 
-        if "International_plan" in df.columns and "_churn_num" in df.columns:
-            intl_churn = df.groupby("International_plan")["_churn_num"].mean().reset_index()
-            fig = px.bar(
-                intl_churn,
-                x="International_plan",
-                y="_churn_num",
-                title="Churn Rate by International Plan",
-                labels={"_churn_num": "Churn Rate"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "International_plan" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_intl_plan_churn"):
+                intl_churn = cube.rollup(["International_plan"])
+            with instrument.timed("figure_intl_plan_churn"):
+                fig = px.bar(
+                    intl_churn,
+                    x="International_plan",
+                    y="_churn_num",
+                    title="Churn Rate by International Plan",
+                    labels={"_churn_num": "Churn Rate"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** Customers with an International Plan churn much more (~42%) compared to those without (~11%). This shows that international users are far more likely to leave.")
             st.markdown("**Recommendation:** Since international users are high-value but high-risk, the company should focus on competitive pricing, better support, or loyalty perks to reduce churn in this premium segment.")
 
-            st.download_button("📥 Download Data (CSV)", data=intl_churn.to_csv(index=False).encode("utf-8"), file_name="intl_plan_churn.csv")
+            download_export("intl_plan_churn", lambda: exports.frame_chunks(intl_churn))
         else:
             st.warning("Columns 'International_plan' or 'Churn' not found in the dataset.")
 
@@ -116,22 +168,24 @@ elif category == "2️⃣ Service Plans":
         st.markdown("### 4️⃣ Is there a difference in churn between customers with and without a Voice Mail Plan?")
         st.markdown("#### Want to know: Does having extra services reduce churn?")
 
-        if "Voice_mail_plan" in df.columns and "_churn_num" in df.columns:
-            vm_churn = df.groupby("Voice_mail_plan")["_churn_num"].mean().reset_index()
-            fig = px.bar(
-                vm_churn,
-                x="Voice_mail_plan",
-                y="_churn_num",
-                title="Churn Rate by Voice Mail Plan",
-                labels={"_churn_num": "Churn Rate"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "Voice_mail_plan" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_voice_mail_plan_churn"):
+                vm_churn = cube.rollup(["Voice_mail_plan"])
+            with instrument.timed("figure_voice_mail_plan_churn"):
+                fig = px.bar(
+                    vm_churn,
+                    x="Voice_mail_plan",
+                    y="_churn_num",
+                    title="Churn Rate by Voice Mail Plan",
+                    labels={"_churn_num": "Churn Rate"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** Customers with a Voice Mail Plan churn less (~9%) compared to those without (~17%). Extra services seem to increase loyalty.")
             st.markdown("**Recommendation:** Promoting Voice Mail Plans could help reduce churn and improve overall customer retention.")
 
-            st.download_button("📥 Download Data (CSV)", data=vm_churn.to_csv(index=False).encode("utf-8"), file_name="voice_mail_plan_churn.csv")
+            download_export("voice_mail_plan_churn", lambda: exports.frame_chunks(vm_churn))
         else:
             st.warning("Columns 'Voice_mail_plan' or 'Churn' not found in the dataset.")
 
@@ -148,24 +202,26 @@ elif category == "3️⃣ Customer Service":
         st.markdown("### 5️⃣ How does churn rate increase with Customer Service Calls?")
         st.markdown("#### We want to know: After how many calls does churn start to jump significantly?")
 
-        if "Customer_service_calls" in df.columns and "_churn_num" in df.columns:
-            service_churn = df.groupby("Customer_service_calls")["_churn_num"].mean().reset_index()
-
-            fig = px.line(
-                service_churn,
-                x="Customer_service_calls",
-                y="_churn_num",
-                markers=True,
-                title="Churn Rate vs Number of Customer Service Calls",
-                labels={"_churn_num": "Churn Rate", "Customer_service_calls": "Customer Service Calls"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "Customer_service_calls" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_service_calls_churn"):
+                service_churn = cube.rollup(["Customer_service_calls"])
+
+            with instrument.timed("figure_service_calls_churn"):
+                fig = px.line(
+                    service_churn,
+                    x="Customer_service_calls",
+                    y="_churn_num",
+                    markers=True,
+                    title="Churn Rate vs Number of Customer Service Calls",
+                    labels={"_churn_num": "Churn Rate", "Customer_service_calls": "Customer Service Calls"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** Churn rate stays low for 0–2 service calls but jumps sharply after 3+ calls, reaching above 40%, and hits nearly 100% for 9 calls. High service calls are a strong signal of dissatisfaction.")
             st.markdown("**Recommendation:** Customers who call support more than 3 times should be flagged as high-risk and prioritized for fast resolution, proactive outreach, or escalation to retention teams before they leave.")
 
-            st.download_button("📥 Download Data (CSV)", data=service_churn.to_csv(index=False).encode("utf-8"), file_name="service_calls_churn.csv")
+            download_export("service_calls_churn", lambda: exports.frame_chunks(service_churn))
         else:
             st.warning("Columns 'Customer_service_calls' or 'Churn' not found in the dataset.")
 
@@ -174,25 +230,27 @@ elif category == "3️⃣ Customer Service":
         st.markdown("### 6️⃣ Is the effect of Customer Service Calls stronger for International Plan users?")
         st.markdown("#### Exploring how churn behavior changes between customers with and without International Plans.")
 
-        if "Customer_service_calls" in df.columns and "International_plan" in df.columns and "_churn_num" in df.columns:
-            interaction = df.groupby(["International_plan", "Customer_service_calls"])["_churn_num"].mean().reset_index()
-
-            fig = px.line(
-                interaction,
-                x="Customer_service_calls",
-                y="_churn_num",
-                color="International_plan",
-                markers=True,
-                title="Churn by Service Calls (Split by International Plan)",
-                labels={"_churn_num": "Churn Rate", "Customer_service_calls": "Customer Service Calls"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "Customer_service_calls" in columns and "International_plan" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_intl_plan_service_calls_churn"):
+                interaction = cube.rollup(["International_plan", "Customer_service_calls"])
+
+            with instrument.timed("figure_intl_plan_service_calls_churn"):
+                fig = px.line(
+                    interaction,
+                    x="Customer_service_calls",
+                    y="_churn_num",
+                    color="International_plan",
+                    markers=True,
+                    title="Churn by Service Calls (Split by International Plan)",
+                    labels={"_churn_num": "Churn Rate", "Customer_service_calls": "Customer Service Calls"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** For customers with an International Plan, churn is much higher from the start (~40–45%) and rises faster with more service calls, reaching 100% after 5+ calls.")
             st.markdown("**Recommendation:** Dissatisfied premium customers (Intl Plan + repeated service calls) are the most at risk. They should get priority handling and special retention offers to avoid losing this high-value segment.")
 
-            st.download_button("📥 Download Data (CSV)", data=interaction.to_csv(index=False).encode("utf-8"), file_name="intl_plan_service_calls_churn.csv")
+            download_export("intl_plan_service_calls_churn", lambda: exports.frame_chunks(interaction))
         else:
             st.warning("Columns 'Customer_service_calls' or 'International_plan' not found in the dataset.")
 
@@ -208,22 +266,34 @@ elif category == "4️⃣ Usage & Charges":
         st.markdown("### 7️⃣ For international users, is churn linked to higher Total International Charges?")
         st.markdown("#### We want to know: Are competitors offering better international pricing?")
 
-        if "International_plan" in df.columns and "Total_intl_charge" in df.columns and "_churn_num" in df.columns:
-            intl_users = df[df["International_plan"].astype(str).str.lower() == "yes"]
-
-            fig = px.box(
-                intl_users,
-                x="Churn",
-                y="Total_intl_charge",
-                title="Total Intl Charges vs Churn (Only Intl Plan Users)",
-                labels={"Churn": "Churn (0=No, 1=Yes)", "Total_intl_charge": "Total International Charges"}
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        if "International_plan" in columns and "Total_intl_charge" in columns and "_churn_num" in columns:
+            with instrument.timed("box_summaries_intl_users_charges"):
+                if summary is None:
+                    stats, hist = frame_summaries(df, "Intl_users_Total_intl_charge")
+                else:
+                    stats, hist = summary.box_stats("Intl_users_Total_intl_charge"), None
+
+            with instrument.timed("figure_intl_users_charges"):
+                fig = box_figure(
+                    stats,
+                    title="Total Intl Charges vs Churn (Only Intl Plan Users)",
+                    labels={"Churn": "Churn (0=No, 1=Yes)"},
+                    y_label="Total International Charges"
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            if hist is not None and st.checkbox("Show distribution", key="hist_intl_charge"):
+                st.plotly_chart(histogram_figure(hist, title="Total Intl Charges Distribution by Churn (Only Intl Plan Users)", labels={"Churn": "Churn"}, x_label="Total International Charges"), use_container_width=True)
 
             st.markdown("**Insight:** Among international plan users, churners show slightly higher total international charges than non-churners. This suggests that heavy international spenders are more likely to leave.")
             st.markdown("**Recommendation:** Competitors offering cheaper international rates could be pulling away these high-spending customers. To reduce churn, the company should consider discounted international bundles or loyalty offers for heavy international users.")
             
-            st.download_button("📥 Download Data (CSV)", data=intl_users.to_csv(index=False).encode("utf-8"), file_name="intl_users_charges.csv")
+            # Row-level export: sliced lazily, in chunks (streamed from the CSVs in streaming mode)
+            def intl_users_chunks():
+                chunks = exports.frame_chunks(df[data_columns(df)]) if summary is None else iter_prepared()
+                for chunk in chunks:
+                    yield chunk[chunk["International_plan"].astype(str).str.lower() == "yes"]
+
+            download_export("intl_users_charges", intl_users_chunks)
         else:
             st.warning("Columns 'International_plan' or 'Total_intl_charge' not found in the dataset.")
 
@@ -239,31 +309,27 @@ elif category == "5️⃣ Multivariate Analysis":
         st.markdown("### 8️⃣ Churn by Account Length Bucket and International Plan")
         st.markdown("#### Does churn risk differ by tenure (New, Mid, Long) for customers with and without an International Plan?")
 
-        if "Account_length" in df.columns and "International_plan" in df.columns and "_churn_num" in df.columns:
-            df["Tenure_Bucket"] = pd.cut(
-                df["Account_length"],
-                bins=[1, 50, 150, df["Account_length"].max()],
-                labels=["New", "Mid", "Long"]
-            )
-
-            tenure_plan_churn = df.groupby(["Tenure_Bucket", "International_plan"])["_churn_num"].mean().reset_index()
-
-            fig = px.bar(
-                tenure_plan_churn,
-                x="Tenure_Bucket",
-                y="_churn_num",
-                color="International_plan",
-                barmode="group",
-                title="Churn Rate by Account Length Bucket and International Plan",
-                labels={"_churn_num": "Churn Rate", "Tenure_Bucket": "Account Length Bucket"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "Account_length" in columns and "International_plan" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_tenure_bucket_intl_plan"):
+                tenure_plan_churn = cube.rollup(["Tenure_Bucket", "International_plan"])
+
+            with instrument.timed("figure_tenure_bucket_intl_plan"):
+                fig = px.bar(
+                    tenure_plan_churn,
+                    x="Tenure_Bucket",
+                    y="_churn_num",
+                    color="International_plan",
+                    barmode="group",
+                    title="Churn Rate by Account Length Bucket and International Plan",
+                    labels={"_churn_num": "Churn Rate", "Tenure_Bucket": "Account Length Bucket"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** Across all tenure buckets (New, Mid, Long), customers with an International Plan have much higher churn rates (~30–45%) compared to those without (~10–12%). The gap is consistent, showing that plan type is a strong churn indicator. Despite being fewer in number, international plan users contribute disproportionately to churn.")
             st.markdown("**Recommendation:** These high-value but high-risk customers should receive targeted offers, better international pricing, and enhanced support to reduce churn.")
 
-            st.download_button("📥 Download Data (CSV)", data=tenure_plan_churn.to_csv(index=False).encode("utf-8"), file_name="tenure_bucket_intl_plan.csv")
+            download_export("tenure_bucket_intl_plan", lambda: exports.frame_chunks(tenure_plan_churn))
         else:
             st.warning("Required columns not found: 'Account_length', 'International_plan', '_churn_num'.")
 
@@ -272,34 +338,86 @@ elif category == "5️⃣ Multivariate Analysis":
         st.markdown("### 9️⃣ Churn by Account Length Bucket and Voice Mail Plan")
         st.markdown("#### Does churn risk differ by tenure for customers with and without a Voice Mail Plan?")
 
-        if "Tenure_Bucket" not in df.columns and "Account_length" in df.columns:
-            df["Tenure_Bucket"] = pd.cut(
-                df["Account_length"],
-                bins=[1, 50, 150, df["Account_length"].max()],
-                labels=["New", "Mid", "Long"]
-            )
-
-        if "Voice_mail_plan" in df.columns and "_churn_num" in df.columns:
-            tenure_vm_churn = df.groupby(["Tenure_Bucket", "Voice_mail_plan"])["_churn_num"].mean().reset_index()
-
-            fig = px.bar(
-                tenure_vm_churn,
-                x="Tenure_Bucket",
-                y="_churn_num",
-                color="Voice_mail_plan",
-                barmode="group",
-                title="Churn Rate by Account Length Bucket and Voice Mail Plan",
-                labels={"_churn_num": "Churn Rate", "Tenure_Bucket": "Account Length Bucket"}
-            )
-            fig.update_yaxes(tickformat=".0%")
-            st.plotly_chart(fig, use_container_width=True)
+        if "Account_length" in columns and "Voice_mail_plan" in columns and "_churn_num" in columns:
+            with instrument.timed("rollup_tenure_bucket_voicemail"):
+                tenure_vm_churn = cube.rollup(["Tenure_Bucket", "Voice_mail_plan"])
+
+            with instrument.timed("figure_tenure_bucket_voicemail"):
+                fig = px.bar(
+                    tenure_vm_churn,
+                    x="Tenure_Bucket",
+                    y="_churn_num",
+                    color="Voice_mail_plan",
+                    barmode="group",
+                    title="Churn Rate by Account Length Bucket and Voice Mail Plan",
+                    labels={"_churn_num": "Churn Rate", "Tenure_Bucket": "Account Length Bucket"}
+                )
+                fig.update_yaxes(tickformat=".0%")
+                st.plotly_chart(fig, use_container_width=True)
 
             st.markdown("**Insight:** Across all tenure buckets, customers with a Voice Mail Plan have much lower churn (~5–9%) compared to those without (~15–17%). The churn gap is consistent, meaning voicemail helps retain customers regardless of tenure.")
             st.markdown("**Recommendation:** Promoting Voice Mail Plans can be an effective retention strategy. It benefits both new and long-term customers, improving engagement and satisfaction.")
 
-            st.download_button("📥 Download Data (CSV)", data=tenure_vm_churn.to_csv(index=False).encode("utf-8"), file_name="tenure_bucket_voicemail.csv")
+            download_export("tenure_bucket_voicemail", lambda: exports.frame_chunks(tenure_vm_churn))
         else:
-            st.warning("Required columns not found: 'Voice_mail_plan' or 'Churn'.")
+            st.warning("Required columns not found: 'Account_length', 'Voice_mail_plan' or 'Churn'.")
+
+# ================== 6. Cross-filter ==================
+elif category == "6️⃣ Cross-filter":
+    sub = st.sidebar.selectbox("Select analysis:", ["10 - Ad-hoc Cross-filter"])
+
+    st.markdown("### 🔟 Ad-hoc Cross-filter")
+    st.markdown("#### Stack any filters and see churn update. Values within a filter are OR-ed, filters are AND-ed.")
+
+    # One bitmap per value / bin of each column, built once per dataset version (see churn.bitmaps)
+    with instrument.timed("load_bitmap_index"):
+        index = load_index(df=df)
+
+    filters = {}
+    widget_cols = st.columns(3)
+    for i, column in enumerate(index.spec):
+        labels = index.labels(column)
+        with widget_cols[i % 3]:
+            if column == "Customer_service_calls":
+                low, high = st.select_slider("Customer service calls", options=labels,
+                                             value=(labels[0], labels[-1]), key="xf_Customer_service_calls")
+                if (low, high) != (labels[0], labels[-1]):
+                    filters[column] = labels[labels.index(low):labels.index(high) + 1]
+            else:
+                filters[column] = st.multiselect(column.replace("_", " "), labels, key=f"xf_{column}",
+                                                 placeholder="Any")
+
+    with instrument.timed("crossfilter_query"):
+        mask = index.mask(filters)
+        selected = index.stats(mask=mask)
+        overall = index.stats()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Customers", f"{selected['rows']:,}", f"{selected['rows'] / overall['rows']:.1%} of all",
+                delta_color="off")
+    col2.metric("Churners", f"{selected['churn']:,}")
+    if selected["rows"]:
+        col3.metric("Churn rate", f"{selected['rate']:.1%}", f"{(selected['rate'] - overall['rate']) * 100:+.1f} pts vs all",
+                    delta_color="inverse")
+    else:
+        col3.metric("Churn rate", "–")
+
+    by = st.selectbox("Break down by", list(index.spec), index=list(index.spec).index("International_plan"),
+                      key="xf_breakdown")
+    with instrument.timed("crossfilter_breakdown"):
+        breakdown = index.breakdown(by, mask=mask)
+    with instrument.timed("figure_crossfilter"):
+        fig = px.bar(
+            breakdown,
+            x=by,
+            y="rate",
+            hover_data=["rows", "churn"],
+            title=f"Churn Rate by {by.replace('_', ' ')} (filtered customers)",
+            labels={"rate": "Churn Rate"}
+        )
+        fig.add_hline(y=overall["rate"], line_dash="dot", annotation_text="all customers")
+        fig.update_yaxes(tickformat=".0%")
+        st.plotly_chart(fig, use_container_width=True)
 
 # ================== FINAL INSIGHTS & RECOMMENDATIONS ==================
 
@@ -373,3 +491,6 @@ with st.expander(" ", expanded=False):  # نخلي العنوان فاضي لأ
     """, unsafe_allow_html=True)
 
     st.success("✅ This summary unifies insights and recommendations from all analyses for strategic decision-making.")
+
+# ================== PERFORMANCE PANEL ==================
+instrument.sidebar_panel()
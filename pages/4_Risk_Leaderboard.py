@@ -0,0 +1,62 @@
+import streamlit as st
+
+from churn import instrument, startup
+from churn.leaderboard import LEADERBOARD_PATH, load_leaderboard, update_leaderboard
+
+# ---------- PAGE HEADER ----------
+st.markdown("<h1 style='color:#1E88E5; font-weight:700;'> Customer Risk Leaderboard</h1>", unsafe_allow_html=True)
+st.markdown("<p style='color:#555;'>Highest-risk customers from the latest scored export, filterable by State and plans.</p>", unsafe_allow_html=True)
+st.write("---")
+instrument.start_run("leaderboard")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
+
+# ---------- UPDATE ----------
+# Only new or changed rows (by row hash) are rescored; see churn.leaderboard
+if st.button("Update from the bundled exports", key="lb_update"):
+    with st.spinner("Rescoring new and changed customers..."), instrument.timed("leaderboard_update"):
+        stats = update_leaderboard()
+    st.session_state["lb_stats"] = stats
+if "lb_stats" in st.session_state:
+    stats = st.session_state["lb_stats"]
+    st.success(f"{stats.rows:,} rows read: {stats.rescored:,} rescored ({stats.added:,} new), "
+               f"{stats.removed:,} removed in {stats.seconds:.2f}s")
+
+with instrument.timed("load_leaderboard"):
+    board = load_leaderboard()
+if board is None:
+    st.info(f"No leaderboard yet. Click **Update** above or run `python -m churn.leaderboard update` "
+            f"(saved to `{LEADERBOARD_PATH.relative_to(LEADERBOARD_PATH.parents[2])}`).")
+    instrument.sidebar_panel()
+    st.stop()
+
+# ---------- FILTERS ----------
+col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
+states = col1.multiselect("State", sorted(board.states), key="lb_states", placeholder="Any")
+intl = col2.radio("International plan", ["Any", "Yes", "No"], horizontal=True, key="lb_intl")
+voice_mail = col3.radio("Voice mail plan", ["Any", "Yes", "No"], horizontal=True, key="lb_vm")
+page_size = col4.selectbox("Page size", [25, 50, 100], key="lb_page_size")
+filters = {
+    "states": states or None,
+    "international_plan": None if intl == "Any" else intl,
+    "voice_mail_plan": None if voice_mail == "Any" else voice_mail,
+}
+
+with instrument.timed("leaderboard_count"):
+    total = board.count(**filters)
+pages = max(1, -(-total // page_size))
+page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, key="lb_page")
+
+# ---------- TABLE ----------
+with instrument.timed("leaderboard_page"):
+    ranked = board.top(page_size, (page - 1) * page_size, **filters)
+
+st.caption(f"{total:,} matching customers of {len(board):,}")
+st.dataframe(ranked, hide_index=True, use_container_width=True,
+             column_config={"Churn_probability": st.column_config.ProgressColumn(
+                 "Churn probability", format="%.3f", min_value=0.0, max_value=1.0)})
+
+st.markdown("<p style='color:#777; font-size:15px;'>Customer is the export's row number (or its key column when built with `--key`).</p>", unsafe_allow_html=True)
+
+# ---------- PERFORMANCE PANEL ----------
+instrument.sidebar_panel()
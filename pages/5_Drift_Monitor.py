@@ -0,0 +1,90 @@
+import streamlit as st
+import plotly.express as px
+
+from churn import drift, instrument, startup
+
+# ---------- PAGE HEADER ----------
+st.markdown("<h1 style='color:#1E88E5; font-weight:700;'> Drift Monitor</h1>", unsafe_allow_html=True)
+st.markdown("<p style='color:#555;'>Do the customers being scored still look like the bigml data the model was trained on?</p>", unsafe_allow_html=True)
+st.write("---")
+instrument.start_run("drift")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
+
+# Reference histograms are built once per model version; predictions made in this app process
+# (single, batch) are added to a sliding window in the background (see churn.drift)
+with instrument.timed("load_drift_monitor"):
+    monitor = drift.get_monitor()
+drift.flush()
+
+# ---------- REPLAY ----------
+with st.expander("Replay an export as live traffic"):
+    st.markdown("Score a raw export (same columns as `churn-bigml-*.csv`) and feed it to the monitor in 64-row batches, as the scoring service would.")
+    uploaded = st.file_uploader("Customer file", type=["csv", "parquet"], key="drift_upload")
+    col1, col2 = st.columns(2)
+    if uploaded is not None and col1.button("Replay", key="drift_replay"):
+        with st.spinner("Scoring and observing..."), instrument.timed("drift_replay"):
+            per_update = drift.replay(monitor, uploaded, fmt="parquet" if uploaded.name.endswith(".parquet") else "csv")
+        st.success(f"Replayed {uploaded.name}: {per_update * 1e6:.0f} µs per 64-row update")
+    if col2.button("Reset window", key="drift_reset"):
+        monitor.reset()
+
+# ---------- SUMMARY ----------
+with instrument.timed("drift_report"):
+    report = monitor.report()
+
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Rows in window", f"{monitor.rows:,}", f"window ≈ {monitor.block_rows * monitor.blocks:,}", delta_color="off")
+col2.metric("Rows observed", f"{monitor.observed:,}")
+col3.metric("Significant drift", int((report["status"] == "significant").sum()))
+col4.metric("Moderate drift", int((report["status"] == "moderate").sum()))
+if drift.dropped():
+    st.warning(f"{drift.dropped():,} scored batches were not monitored because the monitor queue was full.")
+if drift.failed():
+    st.error(f"{drift.failed():,} scored batches failed to bin and are missing from the window; see the app log for the errors.")
+
+if monitor.rows == 0:
+    st.info("No predictions in the window yet. Make predictions on the Prediction page, score a file, or replay an export above.")
+    instrument.sidebar_panel()
+    st.stop()
+
+st.write("---")
+
+# ---------- PER-FEATURE DRIFT ----------
+st.subheader(" Drift per Feature")
+st.caption(f"PSI < {drift.PSI_MODERATE} stable, {drift.PSI_MODERATE}–{drift.PSI_SIGNIFICANT} moderate, "
+           f"> {drift.PSI_SIGNIFICANT} significant. KS is the largest gap between the binned CDFs.")
+
+col1, col2 = st.columns([2, 3])
+with col1:
+    st.dataframe(report, hide_index=True, use_container_width=True,
+                 column_config={"psi": st.column_config.NumberColumn("PSI", format="%.4f"),
+                                "ks": st.column_config.NumberColumn("KS", format="%.4f")})
+    st.download_button("📥 Download Drift Report (CSV)", report.to_csv(index=False), file_name="churn_drift.csv",
+                       key="drift_download")
+with col2:
+    with instrument.timed("figure_drift_psi"):
+        fig = px.bar(report, x="psi", y="feature", orientation="h", color="status", title="PSI by Feature",
+                     color_discrete_map={"stable": "#43A047", "moderate": "#FB8C00", "significant": "#E53935"},
+                     labels={"psi": "PSI", "feature": ""})
+        fig.add_vline(x=drift.PSI_MODERATE, line_dash="dot")
+        fig.add_vline(x=drift.PSI_SIGNIFICANT, line_dash="dot")
+        fig.update_layout(yaxis={"categoryorder": "total ascending"})
+        st.plotly_chart(fig, use_container_width=True)
+
+# ---------- HISTOGRAMS ----------
+st.subheader(" Reference vs Live Distribution")
+feature = st.selectbox("Feature", report["feature"], index=len(report) - 1, key="drift_feature",
+                       format_func=lambda c: c.replace("_", " "))
+with instrument.timed("figure_drift_histogram"):
+    hist = monitor.histograms(feature).melt(id_vars="bin", var_name="data", value_name="share")
+    fig = px.bar(hist, x="bin", y="share", color="data", barmode="group",
+                 title=f"{feature.replace('_', ' ')}: training data vs sliding window",
+                 labels={"bin": "Bin", "share": "Share of rows"})
+    fig.update_yaxes(tickformat=".0%")
+    st.plotly_chart(fig, use_container_width=True)
+
+st.markdown("<p style='color:#777; font-size:15px;'>This page shows the app process's monitor. The scoring service keeps its own and exports it as <code>churn_drift_psi</code> / <code>churn_drift_ks</code> on <code>/metrics</code>.</p>", unsafe_allow_html=True)
+
+# ---------- PERFORMANCE PANEL ----------
+instrument.sidebar_panel()
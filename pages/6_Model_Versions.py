@@ -0,0 +1,71 @@
+import streamlit as st
+import plotly.express as px
+
+from churn import instrument, registry, startup
+
+# ---------- PAGE HEADER ----------
+st.markdown("<h1 style='color:#1E88E5; font-weight:700;'> Model Versions</h1>", unsafe_allow_html=True)
+st.markdown("<p style='color:#555;'>The champion answers every prediction; challengers score the same traffic in the background for comparison.</p>", unsafe_allow_html=True)
+st.write("---")
+instrument.start_run("versions")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
+
+# ---------- REGISTRY ----------
+champion, challengers = registry.champion(), registry.challengers()
+col1, col2 = st.columns(2)
+col1.metric("Champion", champion)
+col2.metric("Challengers", len(challengers))
+
+versions = registry.list_versions()
+if versions.empty:
+    st.info("No saved versions yet. `python -m churn.train --challenger` or `python -m churn.refresh ... --challenger` "
+            "writes one to `model/versions` and shadow-scores it next to the champion.")
+else:
+    st.dataframe(versions, hide_index=True, use_container_width=True)
+st.caption("Change roles with `python -m churn.registry challenge VERSION` (`--remove` to drop it) and "
+           "`python -m churn.registry promote VERSION`.")
+
+# ---------- OUT-OF-FOLD COMPARISON ----------
+st.write("---")
+st.subheader(" Out-of-Fold Comparison")
+# Scored once per set of model files; cached in the process (see churn.registry)
+with st.spinner("Comparing versions on out-of-fold predictions..."), instrument.timed("version_report"):
+    report = registry.version_report()
+st.dataframe(report, hide_index=True, use_container_width=True,
+             column_config={c: st.column_config.NumberColumn(format="%.4f")
+                            for c in ["recall", "precision", "accuracy", "f1", "agreement"]}
+             | {"single_row_ms": st.column_config.NumberColumn("single row (ms)", format="%.2f"),
+                "batch_rows_per_sec": st.column_config.NumberColumn("batch rows/sec", format="%.0f")})
+st.caption("Every version is fitted on both bigml CSVs, so quality is measured on out-of-fold predictions "
+           "(5-fold, at each version's threshold). A refreshed version is scored on its own batch, so its metrics "
+           "are not comparable with the others' and it has no agreement. Latency and throughput are timed on "
+           "churn-bigml-20.csv rows.")
+comparable = report.dropna(subset=["agreement"])  # scored on the same rows as the first version
+if len(comparable) > 1:
+    with instrument.timed("figure_versions"):
+        metrics = comparable.melt(id_vars="version", value_vars=["recall", "precision", "f1"], var_name="metric")
+        fig = px.bar(metrics, x="metric", y="value", color="version", barmode="group",
+                     title="Out-of-Fold Metrics by Version", labels={"value": "", "metric": ""})
+        st.plotly_chart(fig, use_container_width=True)
+
+# ---------- SHADOW TRAFFIC ----------
+st.write("---")
+st.subheader(" Shadow Traffic")
+with instrument.timed("shadow_summary"):
+    summary = registry.summarize_log()
+if summary.empty:
+    st.info("No shadow traffic logged yet. Predictions and batch scoring are shadow-scored once a challenger is registered.")
+else:
+    st.dataframe(summary, hide_index=True, use_container_width=True)
+    st.caption("Latencies are per scored batch, as served: the champion on the prediction page and in the "
+               "service uses the compiled forest, and in batch scoring the sklearn pipeline. Recall counts "
+               "only labelled batches, i.e. exports with a Churn column. Batches still queued for the "
+               "challengers appear on the next rerun.")
+if registry.dropped():
+    st.warning(f"{registry.dropped():,} batches were not shadow-scored because the shadow queue was full.")
+if registry.failed():
+    st.error(f"{registry.failed():,} challenger scorings failed and were not logged; see the server log for the errors.")
+
+# ---------- PERFORMANCE PANEL ----------
+instrument.sidebar_panel()
@@ -0,0 +1,108 @@
+import math
+
+import streamlit as st
+import plotly.express as px
+
+from churn import instrument, registry, startup, thresholds
+from churn.paths import MODEL_PATH
+
+# ---------- PAGE HEADER ----------
+st.markdown("<h1 style='color:#1E88E5; font-weight:700;'> Threshold Tuning</h1>", unsafe_allow_html=True)
+st.markdown("<p style='color:#555;'>Choose the churn probability from which a customer is flagged, from out-of-fold predictions and what a contact and a lost customer cost.</p>", unsafe_allow_html=True)
+st.write("---")
+instrument.start_run("thresholds")
+startup.warm_up()  # model and shared dataset, in the background once the header is drawn (see churn.startup)
+startup.mark_first_paint()
+
+# ---------- MODEL ----------
+models = {f"Champion ({registry.champion()})": MODEL_PATH}
+models.update({f"Challenger {v}": registry.version_path(v) for v in registry.challengers()})
+model_path = models[st.selectbox("Model", list(models), key="tt_model")]
+
+# Out-of-fold scores are computed once per model version; every control below only reads the cached curve
+with st.spinner("Scoring out of fold..."), instrument.timed("threshold_curve"):
+    curve = thresholds.load_curve(model_path)
+if curve is None:
+    st.info("This refreshed version was saved without out-of-fold scores, and refitting its hyperparameters would "
+            "not reproduce its warm-started trees, so its threshold can't be tuned here. Refresh it again with "
+            "`python -m churn.refresh`, which saves them.")
+    instrument.sidebar_panel()
+    st.stop()
+setting = thresholds.load_setting(model_path)
+applied = thresholds.ARGMAX_THRESHOLD if setting is None else setting["threshold"]
+
+# ---------- COSTS ----------
+col1, col2 = st.columns(2)
+contact_cost = col1.number_input("Cost of contacting a customer", min_value=0.0,
+                                 value=float((setting or {}).get("contact_cost") or thresholds.DEFAULT_CONTACT_COST),
+                                 step=1.0, key="tt_contact_cost")
+churn_cost = col2.number_input("Cost of losing a churner", min_value=0.0,
+                               value=float((setting or {}).get("churn_cost") or thresholds.DEFAULT_CHURN_COST),
+                               step=5.0, key="tt_churn_cost")
+best_cost, best_f1 = curve.best_cost(contact_cost, churn_cost), curve.best_f1()
+
+
+def move_to(value):
+    # Slider values are rounded down, so the snapped threshold still flags the optimum's customers
+    st.session_state["tt_threshold"] = min(math.floor(value * 1000) / 1000, 1.0)
+
+
+# ---------- THRESHOLD ----------
+if "tt_threshold" not in st.session_state:
+    move_to(0.5 if setting is None else applied)
+threshold = st.slider("Flag churn from probability", 0.0, 1.0, step=0.001, format="%.3f", key="tt_threshold")
+col1, col2, col3 = st.columns(3)
+col1.button(f"Lowest cost ({best_cost:.3f})", on_click=move_to, args=(best_cost,), key="tt_best_cost")
+col2.button(f"Best F1 ({best_f1:.3f})", on_click=move_to, args=(best_f1,), key="tt_best_f1")
+col3.button("Default (0.5)", on_click=move_to, args=(0.5,), key="tt_default")
+
+with instrument.timed("threshold_lookup"):
+    chosen = curve.at(threshold, contact_cost, churn_cost)
+    current = curve.at(applied, contact_cost, churn_cost)
+
+col1, col2, col3, col4, col5 = st.columns(5)
+col1.metric("Precision", f"{chosen['precision']:.3f}", f"{chosen['precision'] - current['precision']:+.3f}")
+col2.metric("Recall", f"{chosen['recall']:.3f}", f"{chosen['recall'] - current['recall']:+.3f}")
+col3.metric("F1", f"{chosen['f1']:.3f}", f"{chosen['f1'] - current['f1']:+.3f}")
+col4.metric("Flagged", f"{chosen['flagged']:.1%}", f"{chosen['flagged'] - current['flagged']:+.1%}", delta_color="off")
+col5.metric("Cost per customer", f"{chosen['cost']:.2f}", f"{chosen['cost'] - current['cost']:+.2f}", delta_color="inverse")
+st.caption(f"On {curve.rows} customers scored out of fold ({curve.positives} churners): {chosen['tp']} churners flagged, "
+           f"{chosen['fn']} missed, {chosen['fp']} loyal customers contacted. Deltas are against the applied threshold "
+           f"({'default 0.5' if setting is None else f'{applied:.3f}'}).")
+
+# ---------- APPLY ----------
+# Rerun after saving so the deltas above compare against the new setting
+col1, col2 = st.columns(2)
+if col1.button("Apply this threshold", type="primary", key="tt_apply"):
+    thresholds.save_threshold(threshold, model_path, contact_cost, churn_cost)
+    st.session_state["tt_message"] = f"Predictions and batch scoring with this model now flag churn from {threshold:.3f}."
+    st.rerun()
+if col2.button("Reset to default (0.5)", key="tt_reset"):
+    thresholds.reset_threshold(model_path)
+    st.session_state["tt_message"] = "Back to the default 0.5."
+    st.rerun()
+if "tt_message" in st.session_state:
+    st.success(st.session_state.pop("tt_message"))
+
+# ---------- CURVES ----------
+st.write("---")
+with instrument.timed("figure_thresholds"):
+    frame = curve.frame(contact_cost, churn_cost)
+    col1, col2 = st.columns(2)
+    with col1:
+        scores = frame.melt(id_vars="threshold", value_vars=["precision", "recall", "f1"], var_name="metric")
+        fig = px.line(scores, x="threshold", y="value", color="metric", line_shape="hv",
+                      title="Precision, Recall and F1 by Threshold", labels={"value": "", "threshold": "Threshold"})
+        fig.add_vline(x=threshold, line_dash="dot")
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        fig = px.line(frame, x="threshold", y="cost", line_shape="hv", title="Expected Cost per Customer",
+                      labels={"cost": "Cost", "threshold": "Threshold"})
+        fig.add_vline(x=threshold, line_dash="dot")
+        fig.add_vline(x=best_cost, line_dash="dash", line_color="#43A047")
+        st.plotly_chart(fig, use_container_width=True)
+
+st.markdown("<p style='color:#777; font-size:15px;'>The model is fitted on both bigml CSVs, so every customer is scored by a 5-fold model that did not train on it. Cost assumes every contacted churner is retained: contact cost × flagged customers + churn cost × missed churners. A threshold is saved per model file, so a retrained or promoted model starts again from 0.5 unless its version was tuned before promotion.</p>", unsafe_allow_html=True)
+
+# ---------- PERFORMANCE PANEL ----------
+instrument.sidebar_panel()